@@ -41,7 +41,7 @@ except ImportError:
 # Standard library
 import sys
 import os
-from copy import deepcopy
+from copy import copy, deepcopy
 from io import StringIO, TextIOWrapper
 import random
 import re
@@ -58,6 +58,7 @@ from Bio.SeqRecord import SeqRecord
 from Bio.SeqFeature import SeqFeature, FeatureLocation, CompoundLocation
 from Bio.Alphabet import IUPAC
 from Bio.Nexus.Nexus import NexusError
+import numpy as np
 
 # ##################################################### WISH LIST #################################################### #
 # - Map features from a sequence file over to the alignment
@@ -86,6 +87,7 @@ class AlignBuddy(object):
         raw_seq = None
         in_file = None
         self.hash_map = OrderedDict()  # This variable is only filled if the hash_ids() fuction is called.
+        self.partitions = OrderedDict()  # Only filled by concat_alignments(), as {name: (first column, last column)}
 
         # Handles
         if str(type(_input)) == "<class '_io.TextIOWrapper'>":
@@ -177,6 +179,25 @@ class AlignBuddy(object):
         self.memory_footprint = sum([len(rec) for rec in self.records()])
 
     def __str__(self):
+        output = StringIO()
+        self.write_to(output)
+        return output.getvalue()
+
+    def write_to(self, handle, out_format=None):
+        """
+        Serialize the alignments straight into an open file-like object (e.g., sys.stdout), without first building the
+        full output in a temp file or string.
+        :param handle: Writable file-like object
+        :param out_format: Use this format instead of self.out_format
+        :return: None
+        """
+        if out_format:
+            out_format_save = str(self.out_format)
+            self.set_format(out_format)
+            self.write_to(handle)
+            self.set_format(out_format_save)
+            return
+
         empty_alignments = []
         for indx, alignment in enumerate(self.alignments):
             if not len(alignment):
@@ -186,8 +207,21 @@ class AlignBuddy(object):
             del self.alignments[indx]
 
         if len(self.alignments) == 0:
-            return "AlignBuddy object contains no alignments.\n"
+            handle.write("AlignBuddy object contains no alignments.\n")
+            return
 
+        ofile = br.RStripWriter(handle)
+        self._write_alignments(ofile)
+        ofile.close("\n\n" if self.out_format == "clustal" else "\n")
+        return
+
+    def _write_alignments(self, ofile):
+        """
+        Format the alignments into an RStripWriter, leaving it open. Formatting several AlignBuddy objects one after
+        the other into the same writer gives the same output as formatting all of their alignments in one go.
+        :param ofile: br.RStripWriter object
+        :return: None
+        """
         # There is a weird bug in genbank write() that concatenates dots to the organism name (if set).
         # The following is a work around...
         if self.out_format in ["gb", "genbank"]:
@@ -204,34 +238,31 @@ class AlignBuddy(object):
             raise ValueError("%s format does not support multiple alignments in one file.\n" % self.out_format)
 
         if self.out_format == "phylipsr":
-            output = br.phylip_sequential_out(self)
+            ofile.write(br.phylip_sequential_out(self))
 
         elif self.out_format == "phylipss":
-            output = br.phylip_sequential_out(self, relaxed=False)
+            ofile.write(br.phylip_sequential_out(self, relaxed=False))
 
         else:
-            tmp_file = br.TempFile()
-            with open(tmp_file.path, "w", encoding="utf-8") as ofile:
-                try:
-                    AlignIO.write(self.alignments, ofile, self.out_format)
-                except ValueError as e:
-                    if "Sequences must all be the same length" in str(e):
-                        br._stderr("Warning: Alignment format detected but sequences are different lengths. "
-                                   "Format changed to fasta to accommodate proper printing of records.\n\n")
-                        AlignIO.write(self.alignments, ofile, "fasta")
-                    elif "Repeated name" in str(e) and self.out_format == "phylip":
-                        br._stderr("Warning: Phylip format returned a 'repeat name' error, probably due to truncation. "
-                                   "Format changed to phylip-relaxed.\n")
-                        AlignIO.write(self.alignments, ofile, "phylip-relaxed")
-                    else:
-                        raise e
-
-            with open(tmp_file.path, "r", encoding="utf-8") as ifile:
-                output = ifile.read()
-        if self.out_format == "clustal":
-            return "%s\n\n" % output.rstrip()
-        else:
-            return "%s\n" % output.rstrip()
+            # AlignIO writes a few characters at a time, which is slow through the RStripWriter, and a fallback below
+            # could leave partial output behind if there are several alignments. So render into memory first.
+            out = StringIO()
+            try:
+                AlignIO.write(self.alignments, out, self.out_format)
+            except ValueError as e:
+                out = StringIO()
+                if "Sequences must all be the same length" in str(e):
+                    br._stderr("Warning: Alignment format detected but sequences are different lengths. "
+                               "Format changed to fasta to accommodate proper printing of records.\n\n")
+                    AlignIO.write(self.alignments, out, "fasta")
+                elif "Repeated name" in str(e) and self.out_format == "phylip":
+                    br._stderr("Warning: Phylip format returned a 'repeat name' error, probably due to truncation. "
+                               "Format changed to phylip-relaxed.\n")
+                    AlignIO.write(self.alignments, out, "phylip-relaxed")
+                else:
+                    raise e
+            ofile.write(out.getvalue())
+        return
 
     def set_format(self, in_format):
         self.out_format = br.parse_format(in_format)
@@ -261,13 +292,28 @@ class AlignBuddy(object):
 
     def write(self, file_path, out_format=None):
         with open(file_path, "w", encoding="utf-8") as ofile:
-            if out_format:
-                out_format_save = str(self.out_format)
-                self.set_format(out_format)
-                ofile.write(str(self))
-                self.set_format(out_format_save)
-            else:
-                ofile.write(str(self))
+            self.write_to(ofile, out_format)
+        return
+
+    def write_partitions(self, file_path):
+        """
+        Save the partition table filled in by concat_alignments() in RAxML style (e.g., 'DNA, gene1 = 1-500'), or as a
+        NEXUS sets block if file_path ends in .nex or .nexus. IQ-TREE reads either one.
+        :param file_path: Where to write the table
+        :return: None
+        """
+        names = [re.sub("[^A-Za-z0-9_.]", "_", name) for name in self.partitions]
+        if os.path.splitext(file_path)[1].lower() in [".nex", ".nexus"]:
+            output = "#nexus\nbegin sets;\n"
+            for name, (start, end) in zip(names, self.partitions.values()):
+                output += "    charset %s = %s-%s;\n" % (name, start, end)
+            output += "end;\n"
+        else:
+            data_type = "LG" if self.alpha == IUPAC.protein else "DNA"
+            output = "".join(["%s, %s = %s-%s\n" % (data_type, name, start, end)
+                              for name, (start, end) in zip(names, self.partitions.values())])
+        with open(file_path, "w", encoding="utf-8") as ofile:
+            ofile.write(output)
         return
 
 
@@ -287,16 +333,26 @@ def guess_alphabet(alignments):
     for alignment in align_list:
         seq_list += [str(x.seq) for x in alignment]
 
-    sequence = "".join(seq_list).upper()
-    sequence = re.sub("[NX\-?]", "", sequence)
-
-    if len(sequence) == 0:
+    sequence = "".join(seq_list)
+    try:
+        # Tally every character in one pass over the bytes (as long as the sequences are plain ascii)
+        counts = np.bincount(np.frombuffer(sequence.encode("ascii").upper(), dtype=np.uint8), minlength=128)
+        num_residues = len(sequence) - sum(int(counts[ord(char)]) for char in "NX-?")
+        has_uracil = counts[ord("U")] > 0
+        num_dna = sum(int(counts[ord(char)]) for char in "ATCG")
+    except UnicodeEncodeError:
+        sequence = re.sub("[NX\-?]", "", sequence.upper())
+        num_residues = len(sequence)
+        has_uracil = 'U' in sequence
+        num_dna = len(re.findall("[ATCG]", sequence))
+
+    if num_residues == 0:
         return None
 
-    if 'U' in sequence:  # U is unique to RNA
+    if has_uracil:  # U is unique to RNA
         return IUPAC.ambiguous_rna
 
-    percent_dna = len(re.findall("[ATCG]", sequence)) / float(len(sequence))
+    percent_dna = num_dna / float(num_residues)
     if percent_dna > 0.85:  # odds that a sequence with no Us and such a high ATCG count be anything but DNA is low
         return IUPAC.ambiguous_dna
     else:
@@ -319,13 +375,14 @@ def guess_format(_input):  # _input can be list, SeqBuddy object, file handle, o
     if str(type(_input)) == "<class '_io.TextIOWrapper'>" or isinstance(_input, StringIO):
         if not _input.seekable():  # Deal with input streams (e.g., stdout pipes)
             _input = StringIO(_input.read().decode("utf-8"))
-        if _input.read() == "":
+        if _input.read(1) == "":
             return "empty file"
         _input.seek(0)
 
         possible_formats = ["gb", "phylipss", "phylipsr", "phylip", "phylip-relaxed",
                             "stockholm", "fasta", "nexus", "clustal"]
-        for next_format in possible_formats:
+        # Formats matching the head of the file go first, so usually only one parser is ever run
+        for next_format in br.sniff_format(_input, possible_formats):
             try:
                 _input.seek(0)
                 if next_format in ["phylip", "phylipsr", "phylipss"]:
@@ -353,7 +410,27 @@ def guess_format(_input):  # _input can be list, SeqBuddy object, file handle, o
         raise br.GuessError("Unsupported _input argument in guess_format(). %s" % type(_input))
 
 
-def make_copy(alignbuddy):
+def make_copy(alignbuddy, shallow=False):
+    """
+    Deepcopy an AlignBuddy object, restoring the alphabets that deepcopy does not handle properly.
+    Set shallow=True for a much cheaper copy (see br.copy_record()) that shares the Seq payloads with the original.
+    :param alignbuddy: AlignBuddy object
+    :param shallow: Only copy the parts of each record that get edited in place
+    :return: AlignBuddy object
+    """
+    if shallow:
+        _copy = copy(alignbuddy)
+        _copy.alignments = []
+        for alignment in alignbuddy.alignments:
+            # Fill the records in directly, so mixed alphabets get through just like they do with deepcopy
+            alignment_copy = copy(alignment)
+            alignment_copy._records = [br.copy_record(rec) for rec in alignment]
+            alignment_copy.annotations = copy(alignment.annotations)
+            alignment_copy.column_annotations = dict(alignment.column_annotations)
+            _copy.alignments.append(alignment_copy)
+        _copy.hash_map = OrderedDict(alignbuddy.hash_map)
+        return _copy
+
     alphabet_list = [rec.seq.alphabet for rec in alignbuddy.records()]
     _copy = deepcopy(alignbuddy)
     _copy.alpha = alignbuddy.alpha
@@ -394,6 +471,18 @@ class FeatureReMapper(object):
                 self.position_map.append((self.position_map[-1][0], False))
         return
 
+    def extend_mask(self, mask):
+        """
+        Same as calling extend() for every column, from a boolean array of the columns that still exist
+        :param mask: np.array of bools, one per original column
+        """
+        mask = np.asarray(mask, dtype=bool)
+        offset = self.position_map[-1][0] + 1 if self.starting_position_filled else 0
+        positions = np.maximum(np.cumsum(mask) - 1 + offset, 0)
+        self.position_map += list(zip(positions.tolist(), mask.tolist()))
+        self.starting_position_filled = self.starting_position_filled or bool(mask.any())
+        return
+
     def remap_features(self, old_alignment, new_alignment):
         """
         Add all the features from old_alignment that still exist onto new_alignment
@@ -448,6 +537,150 @@ class FeatureReMapper(object):
         return
 
 
+class ColumnMatrix(object):
+    """
+    Compact, column-oriented view of a single alignment. The residues are held in a 2-D NumPy array of character codes
+    (one row per record, one column per alignment position), so whole columns can be counted, masked and gathered at
+    once. SeqRecords are only rebuilt (see to_alignment()) when the work on the columns is done.
+    Codes are uint8 when the sequences are plain ascii (i.e., almost always), and uint32 code points otherwise.
+    :usage: matrix = ColumnMatrix(alignment)
+            alignment = matrix.to_alignment(matrix.count("-") <= 2)
+    """
+    def __init__(self, alignment):
+        self.records = list(alignment)
+        self.alphabet = alignment._alphabet
+        self.column_annotations = alignment.column_annotations
+        seqs = [str(rec.seq) for rec in self.records]
+        num_columns = len(seqs[0]) if seqs else 0
+        if any(len(seq) != num_columns for seq in seqs):
+            raise ValueError("Sequences must all be the same length")
+        seqs = "".join(seqs)
+        try:
+            self.codec = "ascii"
+            matrix = np.frombuffer(seqs.encode(self.codec), dtype=np.uint8)
+        except UnicodeEncodeError:
+            self.codec = "utf-32-le"
+            matrix = np.frombuffer(seqs.encode(self.codec), dtype="<u4")
+        self.matrix = matrix.reshape(len(self.records), num_columns)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def num_columns(self):
+        return self.matrix.shape[1]
+
+    def codes(self, chars):
+        """
+        :param chars: The characters to look up (str or list)
+        :return: np.array of the codes used for those characters (any that cannot be in the matrix are left out)
+        """
+        codes = [ord(char) for char in chars]
+        if self.codec == "ascii":
+            codes = [code for code in codes if code < 128]
+        return np.array(codes, dtype=self.matrix.dtype)
+
+    def column_blocks(self, cells=2 ** 24):
+        """
+        Split the columns into contiguous blocks, so temporary arrays built over the rows stay a manageable size
+        :param cells: Rough number of cells per block
+        :return: Generator of slice objects
+        """
+        width = max(1, cells // max(len(self), 1))
+        for start in range(0, self.num_columns, width):
+            yield slice(start, start + width)
+
+    def count(self, chars="-"):
+        """
+        Count the rows holding any of the given characters, in every column
+        :param chars: The characters to count (str or list)
+        :return: np.array of counts, one per column
+        """
+        codes = self.codes(chars)
+        counts = np.zeros(self.num_columns, dtype=np.int64)
+        for block in self.column_blocks():
+            if len(codes) == 1:
+                counts[block] = np.count_nonzero(self.matrix[:, block] == codes[0], axis=0)
+            else:
+                counts[block] = np.count_nonzero(np.isin(self.matrix[:, block], codes), axis=0)
+        return counts
+
+    def histogram(self):
+        """
+        Count every residue in every column, with a single bincount over each block of columns
+        :return: Tuple of (np.array of the residue codes present, np.array of counts with one row per residue and one
+        column per alignment position)
+        """
+        if self.codec == "ascii":
+            residues = np.flatnonzero(np.bincount(self.matrix.ravel(), minlength=256)).astype(self.matrix.dtype)
+            lookup = np.zeros(256, dtype=np.intp)
+            lookup[residues] = np.arange(len(residues))
+        else:
+            residues = np.unique(self.matrix)
+        counts = np.zeros((len(residues), self.num_columns), dtype=np.int64)
+        # Blocks are narrow enough that neither the index array nor the bincount bins get out of hand
+        cells = 2 ** 22 * len(self) // max(len(self), len(residues), 1)
+        for block in self.column_blocks(cells):
+            codes = self.matrix[:, block]
+            width = codes.shape[1]
+            index = lookup[codes] if self.codec == "ascii" else np.searchsorted(residues, codes)
+            index = index * width + np.arange(width)
+            counts[:, block] = np.bincount(index.ravel(),
+                                           minlength=len(residues) * width).reshape(len(residues), width)
+        return residues, counts
+
+    def rows(self, columns=None):
+        """
+        Decode the matrix, or just some of its columns, back into strings
+        :param columns: Column indices or a boolean column mask (all columns by default)
+        :return: list of strings, one per record
+        """
+        if columns is None:
+            matrix = self.matrix
+        elif np.asarray(columns).dtype == bool:
+            matrix = np.compress(columns, self.matrix, axis=1)
+        else:
+            matrix = np.take(self.matrix, columns, axis=1)  # Much quicker than fancy indexing for big matrices
+        return decode_rows(matrix, self.codec)
+
+    def to_alignment(self, columns=None):
+        """
+        Build a new MultipleSeqAlignment from the matrix, or a selection of its columns. IDs, names, descriptions and
+        per-letter annotations are carried over; features, annotations and dbxrefs are left for the caller to remap.
+        :param columns: Column indices or a boolean column mask (all columns by default)
+        :return: MultipleSeqAlignment
+        """
+        index = None if columns is None else np.arange(self.num_columns)[columns].tolist()
+
+        def select(annotation):
+            if index is None:
+                return copy(annotation)
+            selected = [annotation[indx] for indx in index]
+            return "".join(selected) if type(annotation) == str else selected
+
+        new_records = []
+        for rec, seq in zip(self.records, self.rows(columns)):
+            letter_annotations = {key: select(value) for key, value in rec.letter_annotations.items()}
+            new_records.append(SeqRecord(Seq(seq, alphabet=rec.seq.alphabet), id=rec.id, name=rec.name,
+                                         description=rec.description, letter_annotations=letter_annotations))
+        column_annotations = {key: select(value) for key, value in self.column_annotations.items()}
+        return MultipleSeqAlignment(new_records, alphabet=self.alphabet, column_annotations=column_annotations)
+
+
+def decode_rows(matrix, codec):
+    """
+    Turn a 2-D array of character codes back into one string per row
+    :param matrix: np.array (see ColumnMatrix)
+    :param codec: 'ascii' for uint8 codes or 'utf-32-le' for uint32 code points
+    :return: list of strings
+    """
+    num_rows, width = matrix.shape
+    if not width:
+        return ["" for _ in range(num_rows)]
+    text = np.ascontiguousarray(matrix).tobytes().decode(codec)
+    return [text[start:start + width] for start in range(0, num_rows * width, width)]
+
+
 # ################################################ MAIN API FUNCTIONS ################################################ #
 def alignment_lengths(alignbuddy):
     """
@@ -463,43 +696,128 @@ def alignment_lengths(alignbuddy):
     return output
 
 
-def bootstrap(alignbuddy, num_bootstraps=1, r_seed=None):
+def _bootstrap_columns(rand_gen, num_columns):
+    """
+    Draw num_columns column indices, with replacement. The generator carries on from a random.Random() stream, and
+    the draws (and how far along the stream they go) match what random.Random().randint(0, num_columns - 1) gives.
+    :param rand_gen: np.random.RandomState
+    :param num_columns: Number of columns in the alignment
+    :return: np.array of column indices
+    """
+    if not num_columns:
+        return np.zeros(0, dtype=np.int64)
+    # randint() takes the top bits of a 32-bit draw, and simply draws again if the value is too large
+    shift = 32 - int(num_columns).bit_length()
+    columns = []
+    needed = num_columns
+    while needed:
+        state = rand_gen.get_state()
+        draws = rand_gen.randint(0, 2 ** 32, size=2 * needed + 64, dtype=np.uint32) >> shift
+        accepted = np.flatnonzero(draws < num_columns)
+        if len(accepted) >= needed:
+            # Rewind, and only use up as much of the stream as random.Random() would have
+            rand_gen.set_state(state)
+            rand_gen.randint(0, 2 ** 32, size=accepted[needed - 1] + 1, dtype=np.uint32)
+            accepted = accepted[:needed]
+        columns.append(draws[accepted])
+        needed -= len(accepted)
+    return np.concatenate(columns).astype(np.int64)
+
+
+def _bootstrap_rows(columns, args):
+    matrix = args[0]
+    return matrix.rows(columns)
+
+
+def bootstrap(alignbuddy, num_bootstraps=1, r_seed=None, max_processes=1, out_handle=None):
     """
     Sample len(alignbuddy) columns with replacement, and make new alignment(s)
     :param alignbuddy: The AlignBuddy object to be bootstrapped
     :type alignbuddy: AlignBuddy
     :param num_bootstraps: The number of new alignments to be generated
     :param r_seed: Set a seed value so 'random' numbers are reproducible
+    :param max_processes: Number of CPUs to use (0 = br.usable_cpu_count())
+    :param out_handle: Write each replicate to this file-like object as soon as it is built, instead of collecting
+    them all into a new AlignBuddy object (only a batch of replicates is held in memory at any time)
+    :return: AlignBuddy object of the replicates, or None if they were written to out_handle
     :rtype: AlignBuddy
     """
     rand_gen = random.Random() if not r_seed else random.Random(r_seed)
+    # Continue the Mersenne Twister stream of rand_gen, so r_seed gives the same columns that random.Random() would
+    state = rand_gen.getstate()[1]
+    rand_gen = np.random.RandomState()
+    rand_gen.set_state(("MT19937", np.array(state[:624], dtype=np.uint32), state[624]))
+
+    max_processes = br.usable_cpu_count() if max_processes == 0 else max(max_processes, 1)
+    out_format = alignbuddy.out_format.lower()
+    out_format = "phylip-relaxed" if out_format == "nexus" else out_format
+    if out_handle is not None and out_format in ["fasta", "gb", "genbank"] and \
+            len([alignment for alignment in alignbuddy.alignments if len(alignment)]) * num_bootstraps > 1:
+        raise ValueError("%s format does not support multiple alignments in one file.\n" % out_format)
+
+    def replicates(_alignment):
+        matrix = ColumnMatrix(_alignment)
+        # Replicates are built in batches, so the parallel workers have something to do and memory stays in check
+        batch_size = max_processes * 4 if max_processes > 1 else 1
+        for batch_start in range(0, num_bootstraps, batch_size):
+            batch = [_bootstrap_columns(rand_gen, matrix.num_columns)
+                     for _ in range(min(batch_size, num_bootstraps - batch_start))]
+            if max_processes > 1:
+                batch = br.run_multicore_function(batch, _bootstrap_rows, [matrix], max_processes=max_processes,
+                                                  quiet=True)
+            else:
+                batch = [matrix.rows(columns) for columns in batch]
+
+            for seqs in batch:
+                new_records = []
+                for rec, seq in zip(_alignment, seqs):
+                    rec = br.copy_record(rec)
+                    rec.seq = Seq(seq, alphabet=rec.seq.alphabet)
+                    rec.features = []
+                    new_records.append(rec)
+                yield MultipleSeqAlignment(new_records, alphabet=alignbuddy.alpha)
+
+    if out_handle is None:
+        new_alignments = [new_alignment for alignment in alignbuddy.alignments
+                          for new_alignment in replicates(alignment)]
+        alignbuddy = AlignBuddy(new_alignments, out_format=alignbuddy.out_format)
+        if alignbuddy.out_format == "nexus":
+            alignbuddy.out_format = "phylip-relaxed"
+        return alignbuddy
 
-    new_alignments = []
-    for align_indx, alignment in enumerate(alignbuddy.alignments):
-        alignment = [[res for res in str(seq.seq)] for seq in alignment]
-        align_length = len(alignment[0])
-        num_seqs = len(alignment)
-        for _ in range(num_bootstraps):
-            # Instantiate an empty list of lists
-            align_as_lists = [['' for _ in range(align_length)] for _ in range(num_seqs)]
-            for res_indx in range(align_length):
-                column = rand_gen.randint(0, align_length - 1)
-                for seq_indx in range(num_seqs):
-                    align_as_lists[seq_indx][res_indx] = alignment[seq_indx][column]
-
-            align_as_lists = ["".join(seq) for seq in align_as_lists]
-            alb_copy = make_copy(alignbuddy)
-            for copy_indx, seq in enumerate(alb_copy.alignments[align_indx]):
-                seq.seq = Seq(align_as_lists[copy_indx], alphabet=seq.seq.alphabet)
-                seq.features = []
-                align_as_lists[copy_indx] = seq
-
-            new_alignment = MultipleSeqAlignment(align_as_lists, alphabet=alignbuddy.alpha)
-            new_alignments.append(new_alignment)
-
-    alignbuddy = AlignBuddy(new_alignments, out_format=alignbuddy.out_format)
-    if alignbuddy.out_format == "nexus":
-        alignbuddy.out_format = "phylip-relaxed"
+    # All replicates go through one writer, so the output is identical to str() of the whole bootstrapped object
+    writer = copy(alignbuddy)
+    writer.out_format = out_format
+    if out_format == "phylip":
+        # Replicates keep the original IDs, so whether they clash once truncated (and every replicate has to fall
+        # back on phylip-relaxed) can be settled up front
+        try:
+            AlignIO.write([alignment for alignment in alignbuddy.alignments if len(alignment)], StringIO(), "phylip")
+        except ValueError as e:
+            if "Repeated name" in str(e):
+                br._stderr("Warning: Phylip format returned a 'repeat name' error, probably due to truncation. "
+                           "Format changed to phylip-relaxed.\n")
+                writer.out_format = "phylip-relaxed"
+    ofile = br.RStripWriter(out_handle)
+    for alignment in alignbuddy.alignments:
+        for new_alignment in replicates(alignment):
+            writer.alignments = [new_alignment]
+            writer._write_alignments(ofile)
+    ofile.close("\n\n" if out_format == "clustal" else "\n")
+    return None
+
+
+def bulk_rename(alignbuddy, mapping, substrings=False):
+    """
+    Make many ID replacements at once, in a single pass over the records
+    :param alignbuddy: The AlignBuddy object to be modified
+    :param mapping: {old: new} dictionary, or the path to a two column table (see br.read_rename_table())
+    :param substrings: Replace every occurrence of the old values within the IDs, instead of only whole IDs
+    :return: The modified AlignBuddy object
+    :rtype: AlignBuddy
+    """
+    seqbuddy = Sb.SeqBuddy(alignbuddy.records())
+    Sb.bulk_rename(seqbuddy, mapping, substrings=substrings)
     return alignbuddy
 
 
@@ -529,163 +847,285 @@ def clean_seq(alignbuddy, ambiguous=True, rep_char="N", skip_list=None):
     return alignbuddy
 
 
+def _concat_group_pattern(alignment_ids):
+    """
+    Find the shortest ID prefix that tells every record apart within each alignment
+    :param alignment_ids: List of record ID lists, one per alignment
+    :return: Regex matching that many leading characters
+    """
+    min_length = 1
+    for ids in alignment_ids:
+        if not ids:
+            continue
+        if len(set(ids)) < len(ids):
+            # Repeated IDs can never be told apart, so the prefix grows past the longest of them
+            needed = max([len(rec_id) for rec_id in ids]) + 1
+        else:
+            # Neighbours in sorted order share the longest prefixes
+            ids = sorted(ids)
+            needed = max([len(os.path.commonprefix(pair)) + 1 for pair in zip(ids, ids[1:])] + [1])
+        min_length = max(min_length, needed)
+    return "." * min_length
+
+
+def _concat_parts(parts, group_pattern, align_name_pattern, alpha):
+    """
+    Hash-join the rows of several alignments on the group keys in their record IDs, and lay the alignments side by
+    side in a single pre-sized matrix (gaps fill in wherever a group is missing from an alignment)
+    :param parts: List of (name, record IDs, record features, ColumnMatrix.matrix, ColumnMatrix.codec) tuples, one per
+    alignment
+    :param group_pattern: Regex that matches some regular part of the sequence IDs, dictating who is bound to who
+    :param align_name_pattern: Regex that matches something for the whole alignment
+    :param alpha: Alphabet for the new records
+    :return: Tuple of (list of concatenated SeqRecords, OrderedDict partition table of {name: (start, end)})
+    """
+    if not group_pattern:
+        group_pattern = _concat_group_pattern([ids for name, ids, features, codes, codec in parts])
+    group_pattern = re.compile(group_pattern)
+
+    # Pull the group key out of every ID just once
+    groups = OrderedDict()
+    part_keys = []
+    for indx, (name, ids, features, codes, codec) in enumerate(parts):
+        keys = []
+        for rec_id in ids:
+            match = group_pattern.search(rec_id)
+            if not match:
+                raise ValueError("No match found for record %s in Alignment #%s" % (rec_id, indx + 1))
+            key = "".join(match.groups()) if match.groups() else match.group(0)
+            groups.setdefault(key, len(groups))
+            keys.append(key)
+        part_keys.append(keys)
+
+    # rows[group][part] is the row holding that group in each alignment, or None if it is missing
+    rows = [[None] * len(parts) for _ in groups]
+    for indx, keys in enumerate(part_keys):
+        for row, key in enumerate(keys):
+            if rows[groups[key]][indx] is not None:
+                raise ValueError("Replicate matches '%s' in Alignment #%s" % (key, indx + 1))
+            rows[groups[key]][indx] = row
+
+    offsets = [0]
+    for name, ids, features, codes, codec in parts:
+        offsets.append(offsets[-1] + codes.shape[1])
+    codec = "ascii" if all(part[4] == "ascii" for part in parts) else "utf-32-le"
+    supermatrix = np.full((len(groups), offsets[-1]), ord("-"), dtype=np.uint8 if codec == "ascii" else "<u4")
+    for indx, (name, ids, features, codes, _codec) in enumerate(parts):
+        part_rows = np.array([-1 if group_rows[indx] is None else group_rows[indx] for group_rows in rows],
+                             dtype=np.int64)
+        present = part_rows >= 0
+        supermatrix[present, offsets[indx]:offsets[indx + 1]] = codes[part_rows[present]]
+
+    align_name_pattern = re.compile(align_name_pattern) if align_name_pattern != "" else None
+    new_records = []
+    for group, seq, group_rows in zip(groups, decode_rows(supermatrix, codec), rows):
+        align_features = []
+        rec_features = []
+        for indx, (name, ids, features, codes, _codec) in enumerate(parts):
+            row = group_rows[indx]
+            rec_id = "<unknown id>" if row is None else ids[row]
+            location = FeatureLocation(offsets[indx], offsets[indx + 1])
+            match = align_name_pattern.search(rec_id) if align_name_pattern else None
+            if match:
+                feature_type = "".join(match.groups()) if match.groups() else match.group(0)
+            elif rec_id != "<unknown id>":
+                feature_type = rec_id
+            else:
+                feature_type = "Alignment_%s" % (indx + 1)
+            align_features.append(SeqFeature(location=location, type=feature_type))
+            if row is not None and features[row]:
+                rec_features += br.shift_features(features[row], offsets[indx], offsets[indx + 1])
+        new_records.append(SeqRecord(Seq(seq, alphabet=alpha), id=group, features=align_features + rec_features))
+
+    partitions = OrderedDict()
+    for indx, name in enumerate([part[0] for part in parts]):
+        partitions[name] = (offsets[indx] + 1, offsets[indx + 1])
+    return new_records, partitions
+
+
+def concat_alignment_files(paths, group_pattern=None, align_name_pattern="", in_format=None, out_format=None):
+    """
+    Concatenates the alignments in a set of files (e.g., one per gene) end-to-end. The files are read one at a time and
+    reduced to their residue matrices, so the full set of records never needs to be held in memory.
+    :param paths: Alignment file path(s) and/or directories of alignment files (str or list)
+    :param group_pattern: Regex that matches some regular part of the sequence IDs, dictating who is bound to who
+    :param align_name_pattern: Regex that matches something for the whole alignment
+    :param in_format: Format of the files, if it can't be guessed
+    :param out_format: Output format (default is the format of the first file)
+    :return: AlignBuddy object containing a single concatenated alignment, with the columns taken up by each file
+    in alignbuddy.partitions
+    :rtype: AlignBuddy
+    """
+    paths = [paths] if type(paths) == str else paths
+    file_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            file_paths += sorted([os.path.join(path, fname) for fname in os.listdir(path)
+                                  if not fname.startswith(".") and os.path.isfile(os.path.join(path, fname))])
+        else:
+            file_paths.append(path)
+
+    parts = []
+    alpha = None
+    for file_path in file_paths:
+        alignbuddy = AlignBuddy(file_path, in_format, out_format)
+        out_format = alignbuddy.out_format
+        alpha = alignbuddy.alpha if alpha is None else alpha
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        for indx, alignment in enumerate(alignbuddy.alignments):
+            part_name = name if len(alignbuddy.alignments) == 1 else "%s_%s" % (name, indx + 1)
+            # Only hang on to the features if there are any
+            features = [rec.features for rec in alignment]
+            features = features if any(features) else [None] * len(features)
+            matrix = ColumnMatrix(alignment)
+            parts.append((part_name, [rec.id for rec in alignment], features, matrix.matrix, matrix.codec))
+
+    if len(parts) < 2:
+        raise AttributeError("Please provide at least two alignments.")
+
+    new_records, partitions = _concat_parts(parts, group_pattern, align_name_pattern, alpha)
+    alignbuddy = AlignBuddy([MultipleSeqAlignment(new_records, alphabet=alpha)], out_format=out_format)
+    alignbuddy.partitions = partitions
+    return alignbuddy
+
+
 def concat_alignments(alignbuddy, group_pattern=None, align_name_pattern=""):
     """
     Concatenates two or more alignments together, end-to-end
     :param alignbuddy: AlignBuddy object
     :param group_pattern: Regex that matches some regular part of the sequence IDs, dictating who is bound to who
     :param align_name_pattern: Regex that matches something for the whole alignment
-    :return: AlignBuddy object containing a single concatenated alignment
+    :return: AlignBuddy object containing a single concatenated alignment, with the columns taken up by each of the
+    original alignments in alignbuddy.partitions
     :rtype: AlignBuddy
     """
     if len(alignbuddy.alignments) < 2:
         raise AttributeError("Please provide at least two alignments.")
 
-    concat_groups = OrderedDict()
-
-    if not group_pattern:
-        min_length = 1
-        for indx, align in enumerate(alignbuddy.alignments):
-            max_rec_id_len = 0
-            for rec in align:
-                max_rec_id_len = len(rec.id) if len(rec.id) > max_rec_id_len else max_rec_id_len
-            breakout = False
-            while min_length <= max_rec_id_len and not breakout:
-                breakout = True
-                test_list = []
-                for indx2, rec in enumerate(align):
-                    if indx2 != 0 and rec.id[:min_length] in test_list:
-                        min_length += 1
-                        breakout = False
-                        break
-                    else:
-                        test_list.append(rec.id[:min_length])
-
-        group_pattern = "." * min_length
-
-    for indx, align in enumerate(alignbuddy.alignments):
-        for rec in align:
-            match = re.search(group_pattern, rec.id)
-            if match:
-                if match.groups():
-                    match = "".join(match.groups())
-                else:
-                    match = match.group(0)
-                concat_groups.setdefault(match, [None for _ in range(len(alignbuddy.alignments))])
-            else:
-                raise ValueError("No match found for record %s in Alignment #%s" % (rec.id, indx + 1))
-
-    for indx, align in enumerate(alignbuddy.alignments):
-        for rec in align:
-            match = re.search(group_pattern, rec.id)
-            if match:
-                if match.groups():
-                    match = "".join(match.groups())
-                else:
-                    match = match.group(0)
-
-                if concat_groups[match][indx]:
-                    raise ValueError("Replicate matches '%s' in Alignment #%s" % (match, indx + 1))
-                concat_groups[match][indx] = rec
-
-        for group, seqs in concat_groups.items():
-            if not seqs[indx]:
-                concat_groups[group][indx] = SeqRecord(Seq("-" * align.get_alignment_length(),
-                                                           alphabet=alignbuddy.alpha))
-
-    new_records = [SeqRecord(Seq("", alphabet=alignbuddy.alpha), id=group, features=[]) for group in concat_groups]
-    indx = 0
-    for group, seqs in concat_groups.items():
-        new_length = 0
-        for rec in seqs:
-            new_records[indx].seq = Seq(str(new_records[indx].seq) + str(rec.seq),
-                                        alphabet=new_records[indx].seq.alphabet)
-            rec.features = br.shift_features(rec.features, new_length, new_length + len(rec.seq))
-            new_records[indx].features += rec.features
-            new_length += len(rec.seq)
-        indx += 1
-
-    group_indx = 0
-    for group, seqs in concat_groups.items():
-        new_length = 0
-        align_features = []
-        for rec_indx, rec in enumerate(seqs):
-            location = FeatureLocation(new_length, new_length + len(rec.seq))
-            match = re.search(align_name_pattern, rec.id)
-            if align_name_pattern != "" and match:
-                if match.groups():
-                    match = "".join(match.groups())
-                else:
-                    match = match.group(0)
-                feature = SeqFeature(location=location, type=match)
-            else:
-                if str(rec.id) != "<unknown id>":
-                    feature = SeqFeature(location=location, type=rec.id)
-                else:
-                    feature = SeqFeature(location=location, type="Alignment_%s" % (rec_indx + 1))
-            align_features.append(feature)
-            new_length += len(rec.seq)
-        new_records[group_indx].features = align_features + new_records[group_indx].features
-        group_indx += 1
-
+    parts = []
+    for indx, alignment in enumerate(alignbuddy.alignments):
+        matrix = ColumnMatrix(alignment)
+        parts.append(("Alignment_%s" % (indx + 1), [rec.id for rec in alignment], [rec.features for rec in alignment],
+                      matrix.matrix, matrix.codec))
+    new_records, alignbuddy.partitions = _concat_parts(parts, group_pattern, align_name_pattern, alignbuddy.alpha)
     alignbuddy.alignments = [MultipleSeqAlignment(new_records, alphabet=alignbuddy.alpha)]
     return alignbuddy
 
 
-def consensus_sequence(alignbuddy):
-    # ToDo: include an ambiguous mode that will pull the degenerate nucleotide alphabet in the case of frequency ties.
+def _ambiguity_codes(residues, members, alpha):
+    """
+    Collapse sets of residues into IUPAC ambiguity codes (B, Z and J for proteins, and the degenerate nucleotides)
+    :param residues: The residue characters, one per row of members
+    :param members: Boolean np.array (residues x columns) flagging the residues that are in each column's set
+    :param alpha: The alphabet of the alignment
+    :return: np.array of character codes, one per column (X or N when the set has no ambiguity code)
     """
-    Generates a simple majority-rule consensus sequence
+    if alpha == IUPAC.protein:
+        bits = {"D": 1, "N": 2, "B": 3, "E": 4, "Q": 8, "Z": 12, "I": 16, "L": 32, "J": 48}
+        ambig_char = "X"
+    else:
+        bits = {"A": 1, "C": 2, "M": 3, "G": 4, "R": 5, "S": 6, "V": 7, "T": 8, "U": 8, "W": 9, "Y": 10, "H": 11,
+                "K": 12, "D": 13, "B": 14, "N": 15}
+        ambig_char = "N"
+    codes = np.full(128, ord(ambig_char), dtype=np.uint32)
+    for char, bit in bits.items():
+        if char != "U" or alpha == IUPAC.ambiguous_rna:
+            codes[bit] = ord(char)
+    invalid = 64  # Gaps, stops, etc. can't be folded into an ambiguity code
+
+    residue_bits = np.array([bits.get(res.upper(), invalid) for res in residues], dtype=np.int64)
+    column_bits = np.bitwise_or.reduce(np.where(members, residue_bits[:, None], 0), axis=0)
+    column_codes = codes[column_bits]
+    # Keep lower case alignments in lower case
+    lower = np.array([res.islower() for res in residues], dtype=bool)
+    lower = ~np.any(members & ~lower[:, None], axis=0) & (column_codes != ord(ambig_char))
+    column_codes[lower] += 32
+    return column_codes
+
+
+def consensus_sequence(alignbuddy, mode="majority", threshold=0.5, ignore_gaps=False):
+    """
+    Generates a consensus sequence for each alignment, from the residue counts in every column
     :param alignbuddy: The AlignBuddy object to be processed
-    :return: The modified AlignBuddy object (with a single record in each alignment)
+    :param mode: How each column is called. Choose from:
+                 'majority': The most common residue (ties get the ambiguous character, X or N)
+                 'threshold': The most common residue, as long as its frequency reaches `threshold`
+                 'ambiguous': The IUPAC code covering the fewest most common residues that together reach `threshold`
+    :param threshold: Residue frequency needed by the 'threshold' and 'ambiguous' modes (as a fraction or percentage)
+    :param ignore_gaps: Leave gaps out of the residue counts. Columns are only called as gaps if most rows have a gap.
+    :return: The modified AlignBuddy object (with a single record in each alignment). The frequency of every residue in
+    every column (a PSSM-like profile) is kept in each consensus record's buddy_data['column_profile'], as an
+    OrderedDict of {residue: np.array of frequencies}
     :rtype: AlignBuddy
     """
+    if mode not in ["majority", "threshold", "ambiguous"]:
+        raise NotImplementedError("'%s' is not an implemented consensus mode. "
+                                  "Choose from 'majority', 'threshold' or 'ambiguous'." % mode)
+    threshold = threshold / 100 if threshold > 1 else threshold
+
     consensus_sequences = []
     for alignment in alignbuddy.alignments:
         alpha = guess_alphabet(alignment)
         ambig_char = "X" if alpha == IUPAC.protein else "N"
-        new_seq = ""
-        for indx in range(alignment.get_alignment_length()):
-            residues = {}
-            for rec in alignment:
-                residue = rec.seq[indx]
-                residues.setdefault(residue, 0)
-                residues[residue] += 1
-            residues = sorted(residues.items(), key=lambda x: x[1], reverse=True)
-            if len(residues) == 1 or residues[0][1] != residues[1][1]:
-                new_seq += residues[0][0]
+        matrix = ColumnMatrix(alignment)
+        residues, counts = matrix.histogram()
+        if ignore_gaps:
+            gaps = np.isin(residues, matrix.codes("-."))
+            gap_counts = counts[gaps].sum(axis=0)
+            residues, counts = residues[~gaps], counts[~gaps]
+            depth = len(matrix) - gap_counts
+        else:
+            depth = np.full(matrix.num_columns, len(matrix))
+        # A tiny allowance keeps frequencies like 0.7 from being rounded out of the threshold
+        min_counts = threshold * depth - 1e-9
+
+        new_seq = np.full(matrix.num_columns, ord(ambig_char), dtype=matrix.matrix.dtype)
+        if len(residues):
+            top_residues = residues[counts.argmax(axis=0)]
+            if mode == "ambiguous":
+                # Take residues from the most common down until the threshold is reached, along with any ties
+                ranked = np.sort(counts, axis=0)[::-1]
+                num_needed = np.argmax(np.cumsum(ranked, axis=0) >= min_counts, axis=0)
+                cutoff = np.maximum(ranked[num_needed, np.arange(matrix.num_columns)], 1)
+                members = counts >= cutoff
+                num_members = np.count_nonzero(members, axis=0)
+                ambiguous = num_members > 1
+                new_seq[ambiguous] = _ambiguity_codes([chr(res) for res in residues], members[:, ambiguous], alpha)
+                new_seq[num_members == 1] = top_residues[num_members == 1]
             else:
-                new_seq += ambig_char
+                top_counts = counts.max(axis=0)
+                called = np.count_nonzero(counts == top_counts, axis=0) == 1
+                if mode == "threshold":
+                    called &= top_counts >= min_counts
+                new_seq[called] = top_residues[called]
+        if ignore_gaps:
+            new_seq[gap_counts * 2 > len(matrix)] = ord("-")
+
+        profile = OrderedDict([(chr(res), freqs) for res, freqs in zip(residues, counts / np.maximum(depth, 1))])
+        new_seq = decode_rows(new_seq.reshape(1, -1), matrix.codec)[0]
         new_seq = Seq(new_seq, alphabet=alpha)
         description = "Original sequences: %s" % ", ".join([rec.id for rec in alignment])
         new_seq = SeqRecord(new_seq, id="consensus", name="consensus",
                             description=description)
+        new_seq.buddy_data = OrderedDict([("column_profile", profile)])
         consensus_sequences.append(MultipleSeqAlignment([new_seq], alphabet=alpha))
     alignbuddy.alignments = consensus_sequences
     return alignbuddy
 
 
-def delete_records(alignbuddy, regex):
+def delete_records(alignbuddy, regex, exact=False):
     """
     Deletes rows with names/IDs matching a search pattern
     :param alignbuddy: AlignBuddy object
     :param regex: The regex pattern to search with (duck typed for list or string)
+    :param exact: Treat regex as a list of literal IDs (much faster for long lists)
     :return: The modified AlignBuddy object
     :rtype: AlignBuddy
     """
-    if type(regex) == str:
-        regex = [regex]
-    for indx, pattern in enumerate(regex):
-        regex[indx] = ".*" if pattern == "*" else pattern
-
-    regex = "|".join(regex)
+    matcher = br.record_matcher(regex, exact)
     alignments = []
     for alignment in alignbuddy.alignments:
-        matches = []
-        for record in alignment:
-            if not re.search(regex, record.id):
-                matches.append(record)
-        alignment._records = matches
+        alignment._records = [record for record in alignment if not matcher(record.id)]
         alignments.append(alignment)
     alignbuddy.alignments = alignments
     trimal(alignbuddy, "clean")
@@ -716,7 +1156,7 @@ def enforce_triplets(alignbuddy):
     if alignbuddy.alpha == IUPAC.protein:
         raise TypeError("Nucleic acid sequence required, not protein.")
 
-    alignbuddy_copy = make_copy(alignbuddy)
+    alignbuddy_copy = make_copy(alignbuddy, shallow=True)
     for rec in alignbuddy.records_iter():
         if rec.seq.alphabet == IUPAC.protein:
             raise TypeError("Record '%s' is protein. Nucleic acid sequence required." % rec.name)
@@ -868,10 +1308,19 @@ def extract_regions(alignbuddy, positions):
                         - Ranges: "40:75,89:100,432:-45"
                         - mth of nth: "1/5,3/5"
     """
+    positions = tuple(re.sub("\\s|[,/-]$|^[,/]", "", positions).split(","))
     for indx, alignment in enumerate(alignbuddy.alignments):
-        seqbuddy = Sb.SeqBuddy([rec for rec in alignment])
-        seqbuddy = Sb.extract_regions(seqbuddy, positions)
-        alignbuddy.alignments[indx] = MultipleSeqAlignment(seqbuddy.records, alphabet=alignbuddy.alpha)
+        matrix = ColumnMatrix(alignment)
+        columns = Sb._extraction_index(positions, matrix.num_columns)
+        new_alignment = matrix.to_alignment(columns)
+        kept_counts = np.zeros(matrix.num_columns + 1, dtype=np.int64)
+        kept_counts[columns + 1] = 1
+        np.cumsum(kept_counts, out=kept_counts)
+        for rec, new_rec in zip(alignment, new_alignment):
+            new_rec.features = Sb._remap_extracted_features(rec.features, kept_counts)
+            new_rec.annotations = rec.annotations
+            new_rec.dbxrefs = rec.dbxrefs
+        alignbuddy.alignments[indx] = new_alignment
     return alignbuddy
 
 
@@ -1059,29 +1508,30 @@ def generate_msa(seqbuddy, alias, params=None, keep_temp=None, quiet=False):
                     output = contents
                 alignbuddy = AlignBuddy(output, out_format=seqbuddy.out_format)
 
+                sb_recs_by_id = OrderedDict()
+                for sb_rec in seqbuddy.records:
+                    sb_recs_by_id.setdefault(sb_rec.id, []).append(sb_rec)
                 seqbuddy_recs = []
                 for alb_rec in alignbuddy.records():
-                    for indx, sb_rec in enumerate(seqbuddy.records):
-                        if sb_rec.id == alb_rec.id:
-                            seqbuddy_recs.append(sb_rec)
-                            del seqbuddy.records[indx]
-                            break
+                    if sb_recs_by_id.get(alb_rec.id):
+                        seqbuddy_recs.append(sb_recs_by_id[alb_rec.id].pop(0))
 
                 seqbuddy.records = seqbuddy_recs
-                # ToDo: Change remap_gapped_features to multicore
-                br.remap_gapped_features(seqbuddy_recs, alignbuddy.records())
+                # Only heavily annotated records are worth farming out to other processes
+                num_features = sum([len(rec.features) for rec in seqbuddy_recs])
+                br.remap_gapped_features(seqbuddy_recs, alignbuddy.records(),
+                                         max_processes=br.usable_cpu_count() if num_features > 50000 else 1)
 
-                for _hash, sb_rec in seqbuddy.hash_map.items():
-                    rename(alignbuddy, _hash, sb_rec)
+                bulk_rename(alignbuddy, seqbuddy.hash_map, substrings=True)
 
                 if keep_temp:
                     # Loop through each saved file and rename any hashes that have been carried over
+                    restore = br.bulk_replacer(seqbuddy.hash_map, substrings=True)
                     for root, dirs, files in os.walk(tmp_dir.path):
                         for next_file in files:
                             with open("%s%s%s" % (root, os.path.sep, next_file), "r", encoding="utf-8") as ifile:
                                 contents = ifile.read()
-                            for _hash, sb_rec in seqbuddy.hash_map.items():
-                                contents = re.sub(_hash, sb_rec, contents)
+                            contents = restore(contents)
                             with open("%s%s%s" % (root, os.path.sep, next_file), "w", encoding="utf-8") as ofile:
                                 ofile.write(contents)
 
@@ -1118,18 +1568,19 @@ def hash_ids(alignbuddy, hash_length=10, r_seed=None):
                          "Hash length must be increased.")
     # If a hash_map already exists and fits all the specs, re-apply it.
     if alignbuddy.hash_map:
-        alignbuddy_copy = make_copy(alignbuddy)
+        alignbuddy_copy = make_copy(alignbuddy, shallow=True)
         re_apply_hash_map = True
         records = alignbuddy_copy.records_dict()
-        reverse_hashmap_ids = [rec_id for _hash, rec_id in alignbuddy.hash_map.items()]
-        reverse_hashmap_hashes = [_hash for _hash, rec_id in alignbuddy.hash_map.items()]
+        reverse_hashmap = {}
+        for _hash, rec_id in alignbuddy.hash_map.items():
+            reverse_hashmap.setdefault(rec_id, _hash)  # list.index() semantics, the first hash wins
 
         for rec_id, rec_list in records.items():
-            if rec_id not in reverse_hashmap_ids:
+            if rec_id not in reverse_hashmap:
                 re_apply_hash_map = False
                 break
             for rec in rec_list:
-                _hash = reverse_hashmap_hashes[reverse_hashmap_ids.index(rec_id)]
+                _hash = reverse_hashmap[rec_id]
                 rec.id = _hash
                 rec.name = _hash
 
@@ -1221,29 +1672,21 @@ def order_ids(alignbuddy, reverse=False):
     return alignbuddy
 
 
-def pull_records(alignbuddy, regex, description=False):
+def pull_records(alignbuddy, regex, description=False, exact=False):
     """
     Retrieves rows with names/IDs matching a search pattern
     :param alignbuddy: The AlignBuddy object to be pulled from
     :param regex: List of regex expressions or single regex
     :type regex: str list tuple
     :param description: Allow search in description string
+    :param exact: Treat regex as a list of literal IDs (much faster for long lists)
     :return: The modified AlignBuddy object
     :rtype: AlignBuddy
     """
-    if type(regex) == str:
-        regex = [regex]
-    for indx, pattern in enumerate(regex):
-        regex[indx] = ".*" if pattern == "*" else pattern
-
-    regex = "|".join(regex)
+    matcher = br.record_matcher(regex, exact)
     alignments = []
     for alignment in alignbuddy.alignments:
-        matches = []
-        for rec in alignment:
-            if re.search(regex, rec.id) or (description and re.search(regex, rec.description)):
-                matches.append(rec)
-        alignment._records = matches
+        alignment._records = [rec for rec in alignment if matcher(rec.id) or (description and matcher(rec.description))]
         alignments.append(alignment)
     alignbuddy.alignments = alignments
     trimal(alignbuddy, "clean")
@@ -1303,6 +1746,116 @@ def translate_cds(alignbuddy):
     return alignbuddy
 
 
+def _trimal_similarity(matrix, protein):
+    """
+    trimAl's similarity score for every column: exp(-Q), where Q is the mean distance between all pairs of residues in
+    the column, scaled by the fraction of the column that is not gaps. Residue distances are the Euclidean distances
+    between their rows in the substitution matrix (BLOSUM62, or match/mismatch for nucleotides), normalized to 0-1.
+    Gaps and unknown residues (X/N) are left out of the pairs, and columns without at least one pair score 0.
+    :param matrix: ColumnMatrix
+    :param protein: bool
+    :return: np.array of scores, one per column
+    """
+    scoring = Sb._pairwise_scoring(protein)
+    lookup, sub_matrix = scoring["lookup"], scoring["matrix"].astype(float)
+    unknown = lookup[ord("-")]
+    distances = np.sqrt(((sub_matrix[:, np.newaxis, :] - sub_matrix[np.newaxis, :, :]) ** 2).sum(axis=2))
+    distances /= distances.max()
+    num_residues = len(sub_matrix)
+
+    scores = np.zeros(matrix.num_columns)
+    for block in matrix.column_blocks(cells=2 ** 22):
+        codes = matrix.matrix[:, block]
+        if codes.dtype != np.uint8:
+            codes = np.where(codes < 256, codes, 0).astype(np.uint8)
+        residues = lookup[codes].astype(np.int64)
+        width = residues.shape[1]
+        # Residue histogram for every column of the block, in one bincount
+        counts = np.bincount((residues * width + np.arange(width)).ravel(), minlength=num_residues * width)
+        counts = counts.reshape(num_residues, width).astype(float)
+        counts[unknown] = 0
+        num_valid = counts.sum(axis=0)
+        num_pairs = num_valid * (num_valid - 1) / 2
+        total_distance = (counts * np.dot(distances, counts)).sum(axis=0) / 2
+        paired = num_pairs > 0
+        scores[block][paired] = np.exp(-total_distance[paired] / num_pairs[paired])
+    return scores * (1 - matrix.count("-") / max(len(matrix), 1))
+
+
+def _trimal_similarity_cut(similarity):
+    """
+    trimAl's automatic similarity threshold, interpolated (in log space) between the scores ranked at 20% and 80%
+    :param similarity: np.array of column scores (of the columns that passed the gap cut)
+    :return: float
+    """
+    if not len(similarity):
+        return 0.
+    ranked = np.sort(similarity)[::-1]
+    first_20 = max(float(ranked[int(len(ranked) * 0.2)]), 1e-10)
+    last_80 = max(float(ranked[min(int(len(ranked) * 0.8), len(ranked) - 1)]), 1e-10)
+    return 10 ** (((np.log10(first_20) - np.log10(last_80)) / 10) + np.log10(last_80))
+
+
+def _trimal_strict(good, plus=False):
+    """
+    trimAl's 'strict' column selection, starting from the columns that pass both the gap and similarity cuts. Columns
+    with more than two failing columns among their four nearest neighbours are dropped, and then any blocks of
+    columns that are too short (2-4 columns for strict, 3-12 for strictplus, depending on alignment length)
+    :param good: np.array of bools, True for columns passing both cuts
+    :param plus: Use the larger 'strictplus' block size
+    :return: np.array of bools, the columns to keep
+    """
+    num_columns = len(good)
+    padded = np.concatenate(([False, False], good, [False, False])).astype(np.int8)
+    good_neighbours = padded[:-4] + padded[1:-3] + padded[3:-1] + padded[4:]
+    keep = good & (good_neighbours >= 2)
+
+    if plus:
+        block_size = max(min(int(num_columns * 0.01), 12), 3)
+    else:
+        block_size = max(min(int(num_columns * 0.002), 4), 2)
+    edges = np.diff(np.concatenate(([0], keep.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    for start, end in zip(starts[ends - starts < block_size], ends[ends - starts < block_size]):
+        keep[start:end] = False
+    return keep
+
+
+def _trimal_select_method(matrix, protein):
+    """
+    trimAl's 'automated1' heuristic, which picks gappyout or strict based on how similar the sequences are. Identities
+    are measured over the positions where at least one of the pair has a residue (not a gap or X/N). Alignments too
+    large to compare every pair in full are measured on an evenly spaced sample of columns.
+    :param matrix: ColumnMatrix
+    :param protein: bool
+    :return: 'gappyout' or 'strict'
+    """
+    num_seqs = len(matrix)
+    if num_seqs < 2:
+        return "gappyout"
+    step = max(1, int(ceil(num_seqs * (num_seqs - 1) / 2 * matrix.num_columns / 2 ** 30)))
+    codes = matrix.matrix[:, ::step]
+    valid = ~np.isin(codes, matrix.codes("-Xx" if protein else "-Nn"))
+
+    identities = np.zeros((num_seqs, num_seqs))
+    for indx in range(num_seqs - 1):
+        counted = valid[indx] | valid[indx + 1:]
+        hits = np.count_nonzero((codes[indx + 1:] == codes[indx]) & counted, axis=1)
+        positions = np.count_nonzero(counted, axis=1)
+        identities[indx, indx + 1:] = np.where(positions > 0, hits / np.maximum(positions, 1), 0)
+    identities += identities.T
+
+    avg_identity = float((identities.sum(axis=1) / (num_seqs - 1)).mean())
+    max_identity = float(identities.max(axis=1).mean())
+    if avg_identity >= 0.55:
+        return "gappyout"
+    elif avg_identity <= 0.38:
+        return "strict"
+    elif num_seqs <= 20 or 0.5 < max_identity < 0.65:
+        return "gappyout"
+    return "strict"
+
+
 def trimal(alignbuddy, threshold):
     """
     Trims alignment gaps using algorithms from trimAl
@@ -1310,11 +1863,13 @@ def trimal(alignbuddy, threshold):
     trimAl: a tool for automated alignment trimming in large-scale phylogenetic analyses.
     Bioinformatics 25, 1972–1973. doi:10.1093/bioinformatics/btp348.
     :param alignbuddy: The AlignBuddy object to be trimmed
-    :param threshold: The threshold value or trimming algorithm to be used
+    :param threshold: The threshold value or trimming algorithm to be used. Either the maximum fraction (< 1) or
+    number (>= 1) of gaps allowed in a column, or one of 'all'/'no_gaps', 'clean', 'gappyout', 'strict',
+    'strictplus' and 'automated1'
     :return: The trimmed AlignBuddy object
     :rtype: AlignBuddy
     """
-    def gappyout(_gap_distr, _position_map):
+    def gappyout(_gap_distr):
         _max_gaps = 0
         # If there are no columns with zero gaps, scan through the distribution to find where the columns start
         for i in _gap_distr:
@@ -1369,85 +1924,58 @@ def trimal(alignbuddy, threshold):
 
             active_pointer = prev_pointer2
 
-        cuts = []
-        for col, gaps in enumerate(each_column):
-            if gaps <= _max_gaps:
-                cuts.append(col)
-                _position_map.extend(True)
-            else:
-                _position_map.extend(False)
-
-        _new_alignment = alignment[:, 0:0]
-        for _col in cuts:
-            _new_alignment += alignment[:, _col:_col + 1]
-
-        return _new_alignment
+        return _max_gaps
 
     for alignment_index, alignment in enumerate(alignbuddy.alignments):
         if not alignment:
             continue  # Prevent crash if the alignment doesn't have any records in it
+        matrix = ColumnMatrix(alignment)
+        num_columns = matrix.num_columns
+        each_column = matrix.count("-")
         # gap_distr is the number of columns w/ each possible number of gaps; the index is == to number of gaps
-        gap_distr = [0 for _ in range(len(alignment) + 1)]
-        num_columns = alignment.get_alignment_length()
-        each_column = [0 for _ in range(num_columns)]
+        gap_distr = np.bincount(each_column, minlength=len(alignment) + 1).tolist()
+        protein = alignbuddy.alpha == IUPAC.protein
 
-        # Each position_map index corresponds to the original column position, values are tuples of the new position
-        # and whether the column still exists (True) or has been deleted (False)
-        position_map = FeatureReMapper()
-
-        max_gaps = 0
-        for indx in range(num_columns):
-            num_gaps = len(re.findall("-", str(alignment[:, indx])))
-            gap_distr[num_gaps] += 1
-            each_column[indx] = num_gaps
+        method = threshold
+        if method == "automated1":
+            method = _trimal_select_method(matrix, protein)
 
         # Remove any columns with any gaps
-        if threshold in ["no_gaps", "all"]:
-            threshold = 0
-            new_alignment = alignment[:, 0:0]
-            for next_col, num_gaps in enumerate(each_column):
-                if num_gaps <= max_gaps:
-                    new_alignment += alignment[:, next_col:next_col + 1]
-                    position_map.extend(True)
-                else:
-                    position_map.extend(False)
+        if method in ["no_gaps", "all"]:
+            keep = each_column == 0
 
         # Remove any columns that contain nothing but gaps
-        elif threshold == "clean":
-            max_gaps = len(alignment) - 1
-            new_alignment = alignment[:, 0:0]
-            for next_col, num_gaps in enumerate(each_column):
-                if num_gaps <= max_gaps:
-                    new_alignment += alignment[:, next_col:next_col + 1]
-                    position_map.extend(True)
-                else:
-                    position_map.extend(False)
+        elif method == "clean":
+            keep = each_column <= len(alignment) - 1
 
         # trimAl algorithm for removing gaps, depending on size of alignment and distribution of seqs
-        elif threshold == "gappyout":
-            new_alignment = gappyout(gap_distr, position_map)
-
-        elif threshold == "strict":  # ToDo: Implement
-            new_alignment = False
-        elif threshold == "strictplus":  # ToDo: Implement
-            new_alignment = False
-        elif type(threshold) in [int, float]:
-            if threshold >= 1:
-                max_gaps = round(threshold)
+        elif method == "gappyout":
+            keep = each_column <= gappyout(gap_distr)
+
+        # Combine the gappyout cut with a cut on column similarity, and then clear out isolated columns
+        elif method in ["strict", "strictplus"]:
+            similarity = _trimal_similarity(matrix, protein)
+            good = each_column <= gappyout(gap_distr)
+            good &= similarity >= _trimal_similarity_cut(similarity[good])
+            keep = _trimal_strict(good, plus=method == "strictplus")
+
+        elif type(method) in [int, float]:
+            if method >= 1:
+                max_gaps = round(method)
             else:
-                threshold = 0.0001 if threshold == 0 else threshold
-                max_gaps = round(len(alignment) * threshold)
-
-            new_alignment = alignment[:, 0:0]
-            for next_col, num_gaps in enumerate(each_column):
-                if num_gaps <= max_gaps:
-                    new_alignment += alignment[:, next_col:next_col + 1]
-                    position_map.extend(True)
-                else:
-                    position_map.extend(False)
+                method = 0.0001 if method == 0 else method
+                max_gaps = round(len(alignment) * method)
+            keep = each_column <= max_gaps
         else:
             raise NotImplementedError("%s not an implemented trimal method" % threshold)
 
+        new_alignment = matrix.to_alignment(keep)
+
+        # Each position_map index corresponds to the original column position, values are tuples of the new position
+        # and whether the column still exists (True) or has been deleted (False)
+        position_map = FeatureReMapper()
+        position_map.extend_mask(keep)
+
         position_map.remap_features(alignbuddy.alignments[alignment_index], new_alignment)
         position_map.append_pos_map(new_alignment)
         alignbuddy.alignments[alignment_index] = new_alignment
@@ -1528,7 +2056,12 @@ def argparse_init():
 
     try:
         # Some tools do not start with AlignBuddy objs, so skip this for those rare cases
-        if not in_args.generate_alignment:
+        if in_args.concat_alignments and any([os.path.isdir(str(align_set)) for align_set in in_args.alignments]) \
+                and all([os.path.exists(str(align_set)) for align_set in in_args.alignments]):
+            # Directories of alignment files are read one file at a time by concat_alignment_files()
+            alignbuddy = in_args.alignments
+
+        elif not in_args.generate_alignment:
             for align_set in in_args.alignments:
                 if isinstance(align_set, TextIOWrapper) and align_set.buffer.raw.isatty():
                     br._stderr("Warning: No input detected so AlignBuddy is aborting...\n"
@@ -1565,19 +2098,19 @@ def command_line_ui(in_args, alignbuddy, skip_exit=False, pass_through=False):
     # ############################################# INTERNAL FUNCTIONS ############################################## #
     def _print_aligments(_alignbuddy):
         try:
-            _output = str(_alignbuddy)
+            if in_args.test:
+                str(_alignbuddy)
+                br._stderr("*** Test passed ***\n", in_args.quiet)
+
+            elif in_args.in_place:
+                # Build the full output before touching the input file, so a failure can't leave it truncated
+                _in_place(str(_alignbuddy), in_args.alignments[0])
+
+            else:
+                _alignbuddy.write_to(sys.stdout)
         except ValueError as err:
             br._stderr("ValueError: %s\n" % str(err))
             return False
-
-        if in_args.test:
-            br._stderr("*** Test passed ***\n", in_args.quiet)
-
-        elif in_args.in_place:
-            _in_place(_output, in_args.alignments[0])
-
-        else:
-            br._stdout("%s" % _output)
         return True
 
     def _in_place(_output, file_path):
@@ -1630,7 +2163,15 @@ def command_line_ui(in_args, alignbuddy, skip_exit=False, pass_through=False):
     # Bootstrap
     if in_args.bootstrap:
         num_bootstraps = in_args.bootstrap[0] if in_args.bootstrap[0] else 1
-        _print_aligments(bootstrap(alignbuddy, num_bootstraps))
+        max_processes = 0 if alignbuddy.memory_footprint * num_bootstraps > 10000000 else 1
+        if in_args.test or in_args.in_place:
+            _print_aligments(bootstrap(alignbuddy, num_bootstraps, max_processes=max_processes))
+        else:
+            # Send each replicate to stdout as soon as it's built, instead of holding all of them in memory
+            try:
+                bootstrap(alignbuddy, num_bootstraps, max_processes=max_processes, out_handle=sys.stdout)
+            except ValueError as err:
+                br._stderr("ValueError: %s\n" % str(err))
         _exit("bootstrap")
 
     # Clean Seq
@@ -1680,21 +2221,63 @@ def command_line_ui(in_args, alignbuddy, skip_exit=False, pass_through=False):
 
             else:
                 align_pattern = ""
-            _print_aligments(concat_alignments(alignbuddy, group_pattern, align_pattern))
+
+            if type(alignbuddy) == AlignBuddy:
+                alignbuddy = concat_alignments(alignbuddy, group_pattern, align_pattern)
+            else:
+                alignbuddy = concat_alignment_files(alignbuddy, group_pattern, align_pattern, in_args.in_format,
+                                                    in_args.out_format)
+            if in_args.partitions:
+                alignbuddy.write_partitions(in_args.partitions)
+            _print_aligments(alignbuddy)
 
         except AttributeError as e:
             _raise_error(e, "concat_alignments", "Please provide at least two alignments.")
         except ValueError as e:
             _raise_error(e, "concat_alignments", ["No match found for record", "Replicate matches"])
+        except br.GuessError as e:
+            _raise_error(e, "concat_alignments")
         _exit("concat_alignments")
 
     # Consensus sequence
     if in_args.consensus:
-        _print_aligments(consensus_sequence(alignbuddy))
+        mode = "majority"
+        threshold = 0.5
+        ignore_gaps = False
+        profile = False
+        for arg in in_args.consensus[0]:
+            arg = str(arg).lower()
+            if arg == "gaps":
+                ignore_gaps = True
+            elif arg == "profile":
+                profile = True
+            else:
+                try:
+                    threshold = abs(float(arg))
+                except ValueError:
+                    mode = arg
+        try:
+            consensus_sequence(alignbuddy, mode, threshold, ignore_gaps)
+            if profile:
+                for indx, rec in enumerate(alignbuddy.records()):
+                    column_profile = rec.buddy_data["column_profile"]
+                    if len(alignbuddy.alignments) > 1:
+                        br._stdout("# Alignment %s\n" % (indx + 1))
+                    br._stdout("Position\t%s\n" % "\t".join(column_profile))
+                    for position, freqs in enumerate(zip(*column_profile.values()), 1):
+                        br._stdout("%s\t%s\n" % (position, "\t".join(["%.4g" % freq for freq in freqs])))
+                    br._stdout("\n")
+            else:
+                _print_aligments(alignbuddy)
+        except NotImplementedError as e:
+            _raise_error(e, "consensus", "not an implemented consensus mode")
         _exit("consensus")
 
     # Delete records
     if in_args.delete_records:
+        exact = "exact" in in_args.delete_records
+        if exact:
+            del in_args.delete_records[in_args.delete_records.index("exact")]
         try:  # Check to see if the last argument is an integer, which will set number of columns
             if len(in_args.delete_records) == 1:
                 columns = 1
@@ -1713,13 +2296,13 @@ def command_line_ui(in_args, alignbuddy, skip_exit=False, pass_through=False):
             else:
                 args.append(arg)
 
-        args = br.clean_regex(args, in_args.quiet)
+        args = args if exact else br.clean_regex(args, in_args.quiet)
         if not args:  # If all regular expression are malformed, exit out gracefully
             _print_aligments(alignbuddy)
             _exit("delete_records")
 
-        pulled = pull_records(make_copy(alignbuddy), args)
-        alignbuddy = delete_records(alignbuddy, args)
+        pulled = pull_records(make_copy(alignbuddy, shallow=True), args, exact=exact)
+        alignbuddy = delete_records(alignbuddy, args, exact)
         deleted_recs = []
         num_deleted = 0
         for alignment in pulled.alignments:
@@ -1901,40 +2484,45 @@ def command_line_ui(in_args, alignbuddy, skip_exit=False, pass_through=False):
 
     # Pull records
     if in_args.pull_records:
-        description = False
         args = in_args.pull_records[0]
-        for indx, arg in enumerate(args):
-            if arg == "full":
-                description = True
-                del args[indx]
-                break
-        args = br.clean_regex(args, in_args.quiet)
+        description = "full" in args
+        exact = "exact" in args
+        args = [arg for arg in args if arg not in ["full", "exact"]]
+        args = args if exact else br.clean_regex(args, in_args.quiet)
         if args:
-            alignbuddy = pull_records(alignbuddy, args, description)
+            alignbuddy = pull_records(alignbuddy, args, description, exact)
         _print_aligments(alignbuddy)
         _exit("pull_records")
 
     # Rename IDs
     if in_args.rename_ids:
         args = in_args.rename_ids[0]
-        if not br.clean_regex(args[0], in_args.quiet):
-            _print_aligments(alignbuddy)  # Exit gracefully if regex is malformed
+        if len(args) == 1 and os.path.isfile(args[0]):
+            try:
+                _print_aligments(bulk_rename(alignbuddy, br.read_rename_table(args[0])))
+            except ValueError as e:
+                _raise_error(e, "rename_ids", "as a rename table")
             _exit("rename_ids")
 
-        if len(args) not in [2, 3]:
-            _raise_error(AttributeError("rename_ids requires two or three argments: "
-                                        "query, replacement, [max replacements]"), "rename_ids")
-        num = 0
-        try:
-            num = num if len(args) == 2 else int(args[2])
-        except ValueError:
-            _raise_error(ValueError("Max replacements argument must be an integer"), "rename_ids")
+        else:
+            if not br.clean_regex(args[0], in_args.quiet):
+                _print_aligments(alignbuddy)  # Exit gracefully if regex is malformed
+                _exit("rename_ids")
+
+            if len(args) not in [2, 3]:
+                _raise_error(AttributeError("rename_ids requires two or three argments: "
+                                            "query, replacement, [max replacements]"), "rename_ids")
+            num = 0
+            try:
+                num = num if len(args) == 2 else int(args[2])
+            except ValueError:
+                _raise_error(ValueError("Max replacements argument must be an integer"), "rename_ids")
 
-        try:
-            _print_aligments(rename(alignbuddy, args[0], args[1], num))
-        except AttributeError as e:
-            _raise_error(e, "rename_ids", "There are more replacement")
-        _exit("rename_ids")
+            try:
+                _print_aligments(rename(alignbuddy, args[0], args[1], num))
+            except AttributeError as e:
+                _raise_error(e, "rename_ids", "There are more replacement")
+            _exit("rename_ids")
 
     # Reverse Transcribe
     if in_args.reverse_transcribe:
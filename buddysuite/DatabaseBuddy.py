@@ -388,11 +388,16 @@ class DbBuddy(object):  # Open a file or read a handle and parse, or convert raw
                         self.out_format = "embl"
                         break
 
+            # Full records are serialized straight into the output handle instead of being built up in a temp file
             records = [_rec.record for _accession, _rec in records if _rec.record]
-            tmp_file = br.TempFile()
-            SeqIO.write(records, tmp_file.get_handle("w"), self.out_format)
-            _output += "%s\n" % tmp_file.read()
-            tmp_file.clear()
+            ofile = br.RStripWriter(destination if destination else sys.stdout, strip_lines=True)
+            SeqIO.write(records, ofile, self.out_format)
+            if not destination:
+                ofile.close("\n\033[m")
+                sys.stdout.flush()
+            else:
+                ofile.close("\n\n")
+            return
 
         if not destination:
             _stdout("{0}\n".format(_output.rstrip()))
@@ -380,11 +380,18 @@ def _guess_format(_input):
 
     if str(type(_input)) == "<class '_io.TextIOWrapper'>" or isinstance(_input, StringIO):
         # Die if file is empty
-        contents = _input.read()
-        if contents == "":
+        head = _input.read(4096)
+        if head == "":
             sys.exit("Input file is empty.")
         _input.seek(0)
 
+        # The head of the file is usually enough to decide
+        for next_format in br.sniff_signatures(head):
+            if next_format in ["nexml", "nexus", "newick"]:
+                return next_format
+
+        contents = _input.read()
+        _input.seek(0)
         if re.search('<nex:nexml', contents, re.IGNORECASE):
             return 'nexml'
         # Maddison, Swofford, and Maddison, 1997 DOI: 10.1093/sysbio/46.4.590
@@ -428,6 +435,26 @@ def num_taxa(phylobuddy, nodes=False, split=False):
 
 
 # ################################################ MAIN API FUNCTIONS ################################################ #
+def bulk_rename(phylobuddy, mapping, substrings=False):
+    """
+    Make many replacements at once, in a single pass over the node and taxon labels
+    :param phylobuddy: PhyloBuddy object
+    :param mapping: {old: new} dictionary, or the path to a two column table (see br.read_rename_table())
+    :param substrings: Replace every occurrence of the old values within the labels, instead of only whole labels
+    :return: The modified PhyloBuddy object
+    """
+    if not isinstance(mapping, dict):
+        mapping = br.read_rename_table(mapping)
+    replace = br.bulk_replacer(mapping, substrings=substrings)
+    for tree in phylobuddy.trees:
+        for node in tree:
+            if node.label:
+                node.label = replace(node.label)
+            if node.taxon and node.taxon.label:
+                node.taxon.label = replace(node.taxon.label)
+    return phylobuddy
+
+
 def collapse_polytomies(phylobuddy, threshold, mode="support"):
     """
     Remove nodes if their support value or branch length are below the given threshold
@@ -708,16 +735,15 @@ def generate_tree(alignbuddy, alias, params=None, keep_temp=None, quiet=False):
 
             phylobuddy = PhyloBuddy(output)
 
-            for _hash, _id in sub_alignbuddy.hash_map.items():
-                rename(phylobuddy, _hash, _id)
+            bulk_rename(phylobuddy, sub_alignbuddy.hash_map, substrings=True)
 
             if keep_temp:
+                restore = br.bulk_replacer(sub_alignbuddy.hash_map, substrings=True)
                 _root, dirs, files = next(br.walklevel(keep_temp))
                 for file in files:
                     with open("%s/%s" % (_root, file), "r", encoding="utf-8") as ifile:
                         contents = ifile.read()
-                    for _hash, _id in sub_alignbuddy.hash_map.items():
-                        contents = re.sub(_hash, _id, contents)
+                    contents = restore(contents)
                     with open("%s/%s" % (_root, file), "w", encoding="utf-8") as ofile:
                         ofile.write(contents)
             phylo_objs += phylobuddy.trees
@@ -808,23 +834,21 @@ def list_ids(phylobuddy):
     return output
 
 
-def prune_taxa(phylobuddy, *patterns):
+def prune_taxa(phylobuddy, *patterns, exact=False):
     """
     Prunes taxa that match one or more regex patterns
     :param phylobuddy: The PhyloBuddy object whose trees will be pruned.
     :param patterns: One or more regex patterns.
+    :param exact: Treat the patterns as literal taxon labels (much faster for long lists)
     :return: The same PhyloBuddy object after pruning.
     """
+    matcher = br.record_matcher(patterns, exact)
     for indx, tree in enumerate(phylobuddy.trees):
-        taxa_to_prune = []
         namespace = TaxonNamespace()
         for node in tree:  # Populate the namespace for easy iteration
             if node.taxon:
                 namespace.add_taxon(node.taxon)
-        for taxon in namespace.labels():
-            for pattern in patterns:
-                if re.search(pattern, taxon):  # Sets aside the names of the taxa to be pruned
-                    taxa_to_prune.append(taxon)
+        taxa_to_prune = [taxon for taxon in namespace.labels() if matcher(taxon)]
         try:
             for taxon in taxa_to_prune:  # Removes the nodes from the tree
                 tree.prune_taxa_with_labels(StringIO(taxon))
@@ -1375,8 +1399,10 @@ def command_line_ui(in_args, phylobuddy, skip_exit=False, pass_through=False):
 
     # Prune taxa
     if in_args.prune_taxa:
-        patterns = br.clean_regex(in_args.prune_taxa[0], in_args.quiet)
-        prune_taxa(phylobuddy, *patterns)
+        exact = "exact" in in_args.prune_taxa[0]
+        patterns = [pattern for pattern in in_args.prune_taxa[0] if pattern != "exact"]
+        patterns = patterns if exact else br.clean_regex(patterns, in_args.quiet)
+        prune_taxa(phylobuddy, *patterns, exact=exact)
         _print_trees(phylobuddy)
         _exit("prune_taxa")
 
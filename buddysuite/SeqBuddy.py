@@ -52,18 +52,20 @@ import time
 import urllib.parse
 import urllib.request
 import urllib.error
-from copy import deepcopy
+import warnings
+from copy import copy, deepcopy
 from random import sample, randint, random, Random
 from math import floor, ceil, log
 from subprocess import Popen, PIPE
-from multiprocessing import Lock
 from shutil import which
 from hashlib import md5
 from io import StringIO, TextIOWrapper
-from collections import OrderedDict
+from collections import OrderedDict, Counter
+from functools import lru_cache
 from xml.sax import SAXParseException
 
 # Third party
+import numpy as np
 from Bio import SeqIO
 from Bio.SeqFeature import SeqFeature, FeatureLocation, CompoundLocation
 from Bio.SeqRecord import SeqRecord
@@ -84,14 +86,6 @@ def sim_ident(matrix):  # Return the pairwise similarity and identity scores amo
     return x
 
 
-def cd_hit(seqbuddy, threshold):
-    """
-    :param seqbuddy: SeqBuddy object
-    :param threshold: Maximum sequence identity
-    """
-    return seqbuddy
-
-
 def auto_annotate():
     """
     Find common plasmid features in sequences
@@ -162,6 +156,173 @@ OUTPUT_FORMATS = ["ids", "accessions", "summary", "full-summary", "clustal", "em
                   "fastq-solexa", "fastq-illumina", "genbank", "gb", "imgt", "nexus", "phd", "phylip", "phylip-relaxed",
                   "phylipss", "phylipsr", "raw", "seqxml", "sff", "stockholm", "tab", "qual"]
 
+# Streaming mode only works with formats that BioPython can parse/write one record at a time
+STREAM_IN_FORMATS = ["fasta", "fastq", "fastq-sanger", "fastq-solexa", "fastq-illumina", "genbank", "gb", "embl",
+                     "seqxml", "swiss", "tab", "qual"]
+STREAM_OUT_FORMATS = ["fasta", "fastq", "fastq-sanger", "fastq-solexa", "fastq-illumina", "genbank", "gb", "embl",
+                      "imgt", "tab", "qual", "raw"]
+STREAM_TOOLS = ["clean_seq", "delete_large", "delete_repeats", "delete_small", "lowercase", "pull_records",
+                "rename_ids", "screw_formats", "translate", "uppercase"]
+
+# Scoring schemes for the built-in pairwise aligner. Gap costs follow the BLAST convention (open + extend * length),
+# and lambda/K are the gapped Karlin-Altschul parameters NCBI BLAST uses for the same scores.
+PAIRWISE_SCORING = {"protein": {"alphabet": "ARNDCQEGHILKMFPSTWYVBZX*", "gap_open": 11, "gap_extend": 1,
+                                "lambda": 0.267, "k": 0.041, "kmer_size": 3},
+                    "nucleotide": {"alphabet": "ACGTN", "match": 2, "mismatch": -3, "gap_open": 5, "gap_extend": 2,
+                                   "lambda": 0.625, "k": 0.41, "kmer_size": 8}}
+
+# Largest k-mer size recommended by CD-HIT for each minimum identity threshold
+CD_HIT_WORD_SIZES = {"protein": [(0.7, 5), (0.6, 4), (0.5, 3), (0.0, 2)],
+                     "nucleotide": [(0.95, 10), (0.9, 8), (0.88, 7), (0.85, 6), (0.8, 5), (0.0, 4)]}
+
+# Regex character classes that ambiguous residue codes expand to when find_pattern() is run with ambig=True
+AMBIGUOUS_REGEX = {"protein": {"x": "[ARNDCQEGHILKMFPSTWYVX]", "b": "[NDB]", "z": "[QEZ]"},
+                   "dna": {"k": "[GT]", "m": "[AC]", "r": "[AG]", "y": "[CT]", "s": "[CG]", "w": "[AT]",
+                           "b": "[CGT]", "v": "[CGA]", "h": "[ACT]", "d": "[AGT]", "x": "[ATCG]", "n": "[ATCG]"},
+                   "rna": {"k": "[GU]", "m": "[AC]", "r": "[AG]", "y": "[CU]", "s": "[CG]", "w": "[AU]",
+                           "b": "[CGU]", "v": "[CGA]", "h": "[ACU]", "d": "[AGU]", "x": "[AUCG]", "n": "[AUCG]"}}
+
+# Enzymes that find_restriction_sites() skips when whole groups ('commercial' or 'all') are requested
+RESTRICTION_BLACKLIST = {"AbaSI", "FspEI", "MspJI", "SgeI", "AspBHI", "SgrTI", "YkrI", "BmeDI",  # highly nonspecific
+                         # two-cutting
+                         "AjuI", "AlfI", "AloI", "ArsI", "BaeI", "BarI", "BcgI", "BdaI", "BplI", "BsaXI", "Bsp24I",
+                         "CjeI", "CjePI", "CspCI", "FalI", "Hin4I", "NgoAVIII", "NmeDI", "PpiI", "PsrI", "R2_BceSIV",
+                         "RdeGBIII", "SdeOSI", "TstI", "UcoMSI",
+                         # non-cutters
+                         "AlwFI", "AvaIII", "BmgI", "BscGI", "BspGI", "BspNCI", "Cdi630V", "Cgl13032I", "Cgl13032II",
+                         "CjeFIII", "CjeFV", "CjeNII", "CjeP659IV", "CjuI", "CjuII", "DrdII", "EsaSSI", "FinI",
+                         "GauT27I", "HgiEII", "Hpy99XIII", "Hpy99XIV", "Jma19592I", "MjaIV", "MkaDII", "NhaXI", "PenI",
+                         "Pfl1108I", "RdeGBI", "RflFIII", "RlaI", "RpaTI", "SnaI", "Sno506I", "SpoDI", "TssI", "TsuI",
+                         "UbaF11I", "UbaF12I", "UbaF13I", "UbaF14I", "UbaF9I", "UbaPI"}
+
+# Codon usage for back_translate(), as {residue: ([codons], [relative frequencies])}. The species tables were
+# derived from the data at http://www.kazusa.or.jp
+CODON_USAGE = {
+    # Homo sapiens, species=9606
+    "human": {'A': (['GCT', 'GCC', 'GCA', 'GCG'], [0.2675, 0.3975, 0.2275, 0.1075]),
+              'C': (['TGT', 'TGC'], [0.46, 0.54]),
+              'D': (['GAT', 'GAC'], [0.46, 0.54]),
+              'E': (['GAA', 'GAG'], [0.42, 0.58]),
+              'F': (['TTT', 'TTC'], [0.46, 0.54]),
+              'G': (['GGT', 'GGC', 'GGA', 'GGG'], [0.16, 0.34, 0.25, 0.25]),
+              'H': (['CAT', 'CAC'], [0.42, 0.58]),
+              'I': (['ATT', 'ATC', 'ATA'], [0.36, 0.47, 0.17]),
+              'K': (['AAA', 'AAG'], [0.43, 0.57]),
+              'L': (['TTA', 'TTG', 'CTT', 'CTC', 'CTA', 'CTG'], [0.08, 0.1275, 0.1275, 0.1975, 0.07, 0.3975]),
+              'M': (['ATG'], [1.00]),
+              'N': (['AAT', 'AAC'], [0.47, 0.53]),
+              'P': (['CCT', 'CCC', 'CCA', 'CCG'], [0.29, 0.32, 0.28, 0.11]),
+              'Q': (['CAA', 'CAG'], [0.27, 0.73]),
+              'R': (['CGT', 'CGC', 'CGA', 'CGG', 'AGA', 'AGG'], [0.08, 0.18, 0.1125, 0.2025, 0.2125, 0.2125]),
+              'S': (['TCT', 'TCC', 'TCA', 'TCG', 'AGT', 'AGC'], [0.19, 0.22, 0.15, 0.05, 0.15, 0.24]),
+              '*': (['TAA', 'TGA', 'TAG'], [0.30, 0.46, 0.24]),
+              'T': (['ACT', 'ACC', 'ACA', 'ACG'], [0.25, 0.36, 0.28, 0.11]),
+              'V': (['GTT', 'GTC', 'GTA', 'GTG'], [0.18, 0.24, 0.12, 0.46]),
+              'W': (['TGG'], [1.00]),
+              'Y': (['TAT', 'TAC'], [0.44, 0.56]),
+              'X': (['NNN'], [1.0]),
+              '-': (['---'], [1.0])},
+
+    # Mus musculus, species=10090
+    "mouse": {'A': (['GCT', 'GCC', 'GCA', 'GCG'], [0.2925, 0.3825, 0.2325, 0.0925]),
+              'C': (['TGT', 'TGC'], [0.48, 0.52]),
+              'D': (['GAT', 'GAC'], [0.45, 0.55]),
+              'E': (['GAA', 'GAG'], [0.41, 0.59]),
+              'F': (['TTT', 'TTC'], [0.44, 0.56]),
+              'G': (['GGT', 'GGC', 'GGA', 'GGG'], [0.18, 0.33, 0.26, 0.23]),
+              'H': (['CAT', 'CAC'], [0.41, 0.59]),
+              'I': (['ATT', 'ATC', 'ATA'], [0.34, 0.50, 0.16]),
+              'K': (['AAA', 'AAG'], [0.39, 0.61]),
+              'L': (['TTA', 'TTG', 'CTT', 'CTC', 'CTA', 'CTG'], [0.07, 0.13, 0.13, 0.20, 0.08, 0.39]),
+              'M': (['ATG'], [1.00]),
+              'N': (['AAT', 'AAC'], [0.43, 0.57]),
+              'P': (['CCT', 'CCC', 'CCA', 'CCG'], [0.31, 0.30, 0.29, 0.10]),
+              'Q': (['CAA', 'CAG'], [0.26, 0.74]),
+              'R': (['CGT', 'CGC', 'CGA', 'CGG', 'AGA', 'AGG'], [0.08, 0.17, 0.12, 0.19, 0.22, 0.22]),
+              'S': (['TCT', 'TCC', 'TCA', 'TCG', 'AGT', 'AGC'], [0.20, 0.22, 0.14, 0.05, 0.15, 0.24]),
+              '*': (['TAA', 'TGA', 'TAG'], [0.28, 0.49, 0.23]),
+              'T': (['ACT', 'ACC', 'ACA', 'ACG'], [0.2525, 0.3525, 0.2925, 0.1025]),
+              'V': (['GTT', 'GTC', 'GTA', 'GTG'], [0.17, 0.25, 0.12, 0.46]),
+              'W': (['TGG'], [1.00]),
+              'Y': (['TAT', 'TAC'], [0.43, 0.57]),
+              'X': (['NNN'], [1.0]),
+              '-': (['---'], [1.0])},
+
+    # Escherichia coli O157:H7 EDL933, species=155864
+    "ecoli": {'A': (['GCT', 'GCC', 'GCA', 'GCG'], [0.16, 0.27, 0.22, 0.35]),
+              'C': (['TGT', 'TGC'], [0.45, 0.55]),
+              'D': (['GAT', 'GAC'], [0.63, 0.37]),
+              'E': (['GAA', 'GAG'], [0.68, 0.32]),
+              'F': (['TTT', 'TTC'], [0.58, 0.42]),
+              'G': (['GGT', 'GGC', 'GGA', 'GGG'], [0.33, 0.39, 0.12, 0.16]),
+              'H': (['CAT', 'CAC'], [0.58, 0.42]),
+              'I': (['ATT', 'ATC', 'ATA'], [0.505, 0.404, 0.091]),
+              'K': (['AAA', 'AAG'], [0.76, 0.24]),
+              'L': (['TTA', 'TTG', 'CTT', 'CTC', 'CTA', 'CTG'], [0.13, 0.13, 0.11, 0.10, 0.04, 0.49]),
+              'M': (['ATG'], [1.00]),
+              'N': (['AAT', 'AAC'], [0.47, 0.53]),
+              'P': (['CCT', 'CCC', 'CCA', 'CCG'], [0.17, 0.13, 0.19, 0.51]),
+              'Q': (['CAA', 'CAG'], [0.33, 0.67]),
+              'R': (['CGT', 'CGC', 'CGA', 'CGG', 'AGA', 'AGG'], [0.3625, 0.3725, 0.0725, 0.1125, 0.05, 0.03]),
+              'S': (['TCT', 'TCC', 'TCA', 'TCG', 'AGT', 'AGC'], [0.14, 0.1475, 0.14, 0.1475, 0.1575, 0.2675]),
+              '*': (['TAA', 'TGA', 'TAG'], [0.59, 0.33, 0.08]),
+              'T': (['ACT', 'ACC', 'ACA', 'ACG'], [0.17, 0.41, 0.15, 0.27]),
+              'V': (['GTT', 'GTC', 'GTA', 'GTG'], [0.26, 0.21, 0.16, 0.37]),
+              'W': (['TGG'], [1.00]),
+              'Y': (['TAT', 'TAC'], [0.57, 0.43]),
+              'X': (['NNN'], [1.0]),
+              '-': (['---'], [1.0])},
+
+    # Saccharomyces cerevisiae, species=4932
+    "yeast": {'A': (['GCT', 'GCC', 'GCA', 'GCG'], [0.38, 0.22, 0.29, 0.11]),
+              'C': (['TGT', 'TGC'], [0.63, 0.37]),
+              'D': (['GAT', 'GAC'], [0.65, 0.35]),
+              'E': (['GAA', 'GAG'], [0.70, 0.30]),
+              'F': (['TTT', 'TTC'], [0.59, 0.41]),
+              'G': (['GGT', 'GGC', 'GGA', 'GGG'], [0.47, 0.19, 0.22, 0.12]),
+              'H': (['CAT', 'CAC'], [0.64, 0.36]),
+              'I': (['ATT', 'ATC', 'ATA'], [0.464, 0.263, 0.273]),
+              'K': (['AAA', 'AAG'], [0.58, 0.42]),
+              'L': (['TTA', 'TTG', 'CTT', 'CTC', 'CTA', 'CTG'], [0.2775, 0.2875, 0.1275, 0.06, 0.1375, 0.11]),
+              'M': (['ATG'], [1.00]),
+              'N': (['AAT', 'AAC'], [0.59, 0.41]),
+              'P': (['CCT', 'CCC', 'CCA', 'CCG'], [0.31, 0.15, 0.42, 0.12]),
+              'Q': (['CAA', 'CAG'], [0.69, 0.31]),
+              'R': (['CGT', 'CGC', 'CGA', 'CGG', 'AGA', 'AGG'], [0.14, 0.06, 0.07, 0.04, 0.48, 0.21]),
+              'S': (['TCT', 'TCC', 'TCA', 'TCG', 'AGT', 'AGC'], [0.26, 0.16, 0.21, 0.10, 0.16, 0.11]),
+              '*': (['TAA', 'TGA', 'TAG'], [0.47, 0.30, 0.23]),
+              'T': (['ACT', 'ACC', 'ACA', 'ACG'], [0.3475, 0.2175, 0.2975, 0.1375]),
+              'V': (['GTT', 'GTC', 'GTA', 'GTG'], [0.39, 0.21, 0.21, 0.19]),
+              'W': (['TGG'], [1.00]),
+              'Y': (['TAT', 'TAC'], [0.56, 0.44]),
+              'X': (['NNN'], [1.0]),
+              '-': (['---'], [1.0])},
+
+    # random
+    "random": {'A': (['GCT', 'GCC', 'GCA', 'GCG'], [0.25, 0.25, 0.25, 0.25]),
+               'C': (['TGT', 'TGC'], [0.5, 0.5]),
+               'D': (['GAT', 'GAC'], [0.5, 0.5]),
+               'E': (['GAA', 'GAG'], [0.5, 0.5]),
+               'F': (['TTT', 'TTC'], [0.5, 0.5]),
+               'G': (['GGT', 'GGC', 'GGA', 'GGG'], [0.25, 0.25, 0.25, 0.25]),
+               'H': (['CAT', 'CAC'], [0.5, 0.5]),
+               'I': (['ATT', 'ATC', 'ATA'], [0.3333, 0.3333, 0.3334]),
+               'K': (['AAA', 'AAG'], [0.5, 0.5]),
+               'L': (['TTA', 'TTG', 'CTT', 'CTC', 'CTA', 'CTG'], [0.167, 0.167, 0.167, 0.167, 0.166, 0.166]),
+               'M': (['ATG'], [1.00]),
+               'N': (['AAT', 'AAC'], [0.5, 0.5]),
+               'P': (['CCT', 'CCC', 'CCA', 'CCG'], [0.25, 0.25, 0.25, 0.25]),
+               'Q': (['CAA', 'CAG'], [0.5, 0.5]),
+               'R': (['CGT', 'CGC', 'CGA', 'CGG', 'AGA', 'AGG'], [0.167, 0.167, 0.167, 0.167, 0.166, 0.166]),
+               'S': (['TCT', 'TCC', 'TCA', 'TCG', 'AGT', 'AGC'], [0.167, 0.167, 0.167, 0.167, 0.166, 0.166]),
+               '*': (['TAA', 'TGA', 'TAG'], [0.3333, 0.3333, 0.3334]),
+               'T': (['ACT', 'ACC', 'ACA', 'ACG'], [0.25, 0.25, 0.25, 0.25]),
+               'V': (['GTT', 'GTC', 'GTA', 'GTG'], [0.25, 0.25, 0.25, 0.25]),
+               'W': (['TGG'], [1.00]),
+               'Y': (['TAT', 'TAC'], [0.5, 0.5]),
+               'X': (['NNN'], [1.0]),
+               '-': (['---'], [1.0])}}
+
 
 # ##################################################### SEQBUDDY ##################################################### #
 class SeqBuddy(object):
@@ -309,8 +470,28 @@ class SeqBuddy(object):
         self.memory_footprint = sum([len(rec) for rec in sequences])
 
     def __str__(self):
+        output = StringIO()
+        self.write_to(output)
+        return output.getvalue()
+
+    def write_to(self, handle, out_format=None):
+        """
+        Serialize the records straight into an open file-like object (e.g., sys.stdout), without first building the
+        full output in a temp file or string.
+        :param handle: Writable file-like object
+        :param out_format: Use this format instead of self.out_format
+        :return: None
+        """
+        if out_format:
+            out_format_save = str(self.out_format)
+            self.out_format = out_format
+            self.write_to(handle)
+            self.out_format = out_format_save
+            return
+
         if len(self.records) == 0:
-            return "Error: No sequences in object.\n"
+            handle.write("Error: No sequences in object.\n")
+            return
 
         # There is a weird bug in genbank write() that concatenates dots to the organism name (if set).
         # The following is a work around...
@@ -323,46 +504,47 @@ class SeqBuddy(object):
                 except KeyError:
                     pass
 
+        ofile = br.RStripWriter(handle)
         if self.out_format == "phylipsr":
-            output = br.phylip_sequential_out(self, _type="seqbuddy")
+            ofile.write(br.phylip_sequential_out(self, _type="seqbuddy"))
 
         elif self.out_format == "phylipss":
-            output = br.phylip_sequential_out(self, relaxed=False, _type="seqbuddy")
+            ofile.write(br.phylip_sequential_out(self, relaxed=False, _type="seqbuddy"))
 
         elif self.out_format == "raw":
-            output = "\n\n".join([str(rec.seq) for rec in self.records])
+            for indx, rec in enumerate(self.records):
+                ofile.write("%s%s" % ("\n\n" if indx else "", str(rec.seq)))
         else:
-            tmp_dir = br.TempDir()
-            with open("%s%sseqs.tmp" % (tmp_dir.path, os.path.sep), "w", encoding="utf-8") as _ofile:
-                try:
-                    SeqIO.write(self.records, _ofile, self.out_format)
-                except ValueError as e:
-                    if "Sequences must all be the same length" in str(e):
-                        br._stderr("Warning: Alignment format detected but sequences are different lengths. "
-                                   "Format changed to fasta to accommodate proper printing of records.\n\n")
-                        SeqIO.write(self.records, _ofile, "fasta")
-                    elif "Repeated name" in str(e) and self.out_format == "phylip":
-                        br._stderr("Warning: Phylip format returned a 'repeat name' error, probably due to truncation. "
-                                   "Attempting phylip-relaxed.\n")
-                        SeqIO.write(self.records, _ofile, "phylip-relaxed")
-                    elif "Locus identifier" in str(e) and "is too long" in str(e) \
-                            and self.out_format in ["gb", "genbank"]:
-                        br._stderr("Warning: Genbank format returned an 'ID too long' error. "
-                                   "Format changed to EMBL.\n\n")
-                        SeqIO.write(self.records, _ofile, "embl")
-                    else:
-                        raise e
-
-            with open("%s%sseqs.tmp" % (tmp_dir.path, os.path.sep), "r", encoding="utf-8") as ifile:
-                output = ifile.read()
-
-        return "%s\n" % output.rstrip()
+            # Nothing can be un-written from the handle, so all the checks that trigger a fallback format must pass
+            # before the first record goes out
+            try:
+                if self.out_format in ["gb", "genbank"]:
+                    _check_genbank_loci(self.records)
+                SeqIO.write(self.records, ofile, self.out_format)
+            except ValueError as e:
+                if "Sequences must all be the same length" in str(e):
+                    br._stderr("Warning: Alignment format detected but sequences are different lengths. "
+                               "Format changed to fasta to accommodate proper printing of records.\n\n")
+                    SeqIO.write(self.records, ofile, "fasta")
+                elif "Repeated name" in str(e) and self.out_format == "phylip":
+                    br._stderr("Warning: Phylip format returned a 'repeat name' error, probably due to truncation. "
+                               "Attempting phylip-relaxed.\n")
+                    SeqIO.write(self.records, ofile, "phylip-relaxed")
+                elif "Locus identifier" in str(e) and "is too long" in str(e) \
+                        and self.out_format in ["gb", "genbank"]:
+                    br._stderr("Warning: Genbank format returned an 'ID too long' error. "
+                               "Format changed to EMBL.\n\n")
+                    SeqIO.write(self.records, ofile, "embl")
+                else:
+                    raise e
+        ofile.close()
+        return
 
     def __len__(self):
         return len(self.records)
 
     def to_dict(self):
-        sb_copy = find_repeats(make_copy(self))
+        sb_copy = find_repeats(copy(self))
         if len(sb_copy.repeat_ids) > 0:
             raise RuntimeError("There are repeat IDs in self.records\n%s" %
                                ", ".join([key for key, recs in sb_copy.repeat_ids.items()]))
@@ -374,13 +556,7 @@ class SeqBuddy(object):
 
     def write(self, file_path, out_format=None):
         with open(file_path, "w", encoding="utf-8") as ofile:
-            if out_format:
-                out_format_save = str(self.out_format)
-                self.out_format = out_format
-                ofile.write(str(self))
-                self.out_format = out_format_save
-            else:
-                ofile.write(str(self))
+            self.write_to(ofile, out_format)
         return
 
     def print_hashmap(self):
@@ -392,10 +568,226 @@ class SeqBuddy(object):
 
     def reverse_hashmap(self):
         if self.hash_map:
-            for _hash, seq_id in self.hash_map.items():
-                rename(self, _hash, seq_id)
+            bulk_rename(self, self.hash_map, substrings=True)
         return
 
+    @staticmethod
+    def stream(sb_input, in_format=None, out_format=None, alpha=None, chunk_size=100):
+        """
+        Open a sequence file for lazy, record-by-record processing. See SeqBuddyStream.
+        """
+        return SeqBuddyStream(sb_input, in_format, out_format, alpha, chunk_size)
+
+
+class SeqBuddyStream(object):
+    """
+    Iterate over the records of a (potentially huge) sequence file without ever holding the whole thing in memory.
+    Per-record tools (e.g., clean_seq, rename, translate_cds, delete_small) are queued with pipe(), and are then run
+    on small SeqBuddy objects of 'chunk_size' records at a time as the output is written.
+    :usage: SeqBuddy.stream("huge.fq").pipe(clean_seq).pipe(delete_small, 50).write("cleaned.fq")
+    """
+    def __init__(self, sb_input, in_format=None, out_format=None, alpha=None, chunk_size=100):
+        if chunk_size < 1:
+            raise ValueError("The 'chunk_size' parameter must be a positive integer.")
+        self.chunk_size = chunk_size
+        self.pipeline = []
+        self.hash_map = OrderedDict()
+        self.repeat_ids = []  # IDs of the records dropped by delete_repeats()
+        self.repeat_seqs = []
+        self._seen_ids = set()
+        self._seen_seqs = set()
+
+        if type(sb_input) == str:
+            if not os.path.isfile(sb_input):
+                raise FileNotFoundError("SeqBuddyStream requires a file path or file-like object, "
+                                        "'%s' is not a file." % sb_input)
+            self.in_file = sb_input
+            self._handle = None
+        else:
+            self.in_file = None
+            self._handle = sb_input
+
+        head = ""
+        if in_format:
+            self.in_format = in_format.lower()
+        else:
+            if self.in_file:
+                with open(self.in_file, "r", encoding="utf-8") as ifile:
+                    first_line = _first_line(ifile)
+            else:
+                first_line = _first_line(self._handle)
+                head = first_line
+            self.in_format = _sniff_stream_format(first_line)
+            if not self.in_format:
+                raise br.GuessError("Could not determine a streamable format from input\n --> %s ...\n"
+                                    "Try explicitly setting with -f flag." % first_line.strip()[:50])
+
+        if self.in_format not in STREAM_IN_FORMATS:
+            raise TypeError("Format '%s' cannot be streamed. Streaming supports: %s"
+                            % (self.in_format, ", ".join(STREAM_IN_FORMATS)))
+
+        if self._handle is not None and head:
+            self._handle = _HeadBufferedHandle(head, self._handle)
+
+        self.out_format = self.in_format if not out_format else out_format.lower()
+
+        # Peek at the first chunk to settle on an alphabet for the whole stream
+        self._pending = self._parse()
+        self._head_records = []
+        for rec in self._pending:
+            self._head_records.append(rec)
+            if len(self._head_records) == self.chunk_size:
+                break
+        self.alpha = SeqBuddy(self._head_records, self.in_format, self.out_format, alpha).alpha
+
+    def __iter__(self):
+        for seqbuddy in self.chunks():
+            for rec in seqbuddy.records:
+                yield rec
+
+    def _parse(self):
+        if self.in_file:
+            with open(self.in_file, "r", encoding="utf-8") as ifile:
+                for rec in SeqIO.parse(ifile, self.in_format):
+                    yield rec
+        else:
+            for rec in SeqIO.parse(self._handle, self.in_format):
+                yield rec
+
+    def _records(self):
+        if self._pending is not None:
+            head_records, pending = self._head_records, self._pending
+            self._head_records, self._pending = [], None
+            for rec in head_records:
+                yield rec
+            for rec in pending:
+                yield rec
+        elif self.in_file:
+            for rec in self._parse():
+                yield rec
+        else:
+            raise IOError("The input handle has already been consumed and cannot be streamed again.")
+
+    def _run_pipeline(self, records):
+        seqbuddy = SeqBuddy(records, self.in_format, self.out_format, self.alpha)
+        for function, args, kwargs in self.pipeline:
+            seqbuddy = function(seqbuddy, *args, **kwargs)
+        return seqbuddy
+
+    def _delete_repeats(self, seqbuddy, scope):
+        retained_records = []
+        for rec in seqbuddy.records:
+            if scope in ["all", "ids"]:
+                if rec.id in self._seen_ids:
+                    self.repeat_ids.append(rec.id)
+                    continue
+                self._seen_ids.add(rec.id)
+            if scope in ["all", "seqs"]:
+                digest = md5(str(rec.seq).encode("utf-8")).digest()
+                if digest in self._seen_seqs:
+                    self.repeat_seqs.append(rec.id)
+                    continue
+                self._seen_seqs.add(digest)
+            retained_records.append(rec)
+        seqbuddy.records = retained_records
+        return seqbuddy
+
+    def chunks(self):
+        """
+        Generator of processed SeqBuddy objects, each holding at most chunk_size records
+        """
+        self.repeat_ids, self.repeat_seqs = [], []
+        self._seen_ids, self._seen_seqs = set(), set()
+        batch = []
+        for rec in self._records():
+            batch.append(rec)
+            if len(batch) == self.chunk_size:
+                yield self._run_pipeline(batch)
+                batch = []
+        if batch:
+            yield self._run_pipeline(batch)
+
+    def pipe(self, function, *args, **kwargs):
+        """
+        Queue up a SeqBuddy function. It must only depend on one record at a time (i.e., no order_ids or find_repeats)
+        :param function: Any function that accepts a SeqBuddy object as its first argument and returns a SeqBuddy object
+        :param args: Extra positional arguments passed into function
+        :param kwargs: Extra keyword arguments passed into function
+        :return: self, so calls can be chained
+        """
+        self.pipeline.append((function, args, kwargs))
+        return self
+
+    def delete_repeats(self, scope="all"):
+        """
+        Queue up the removal of records with repeated IDs and/or sequences. Unlike the in-memory delete_repeats(),
+        the first record of each is the one kept, in place. Only the IDs and sequence digests seen so far are held in
+        memory, and the IDs of the dropped records end up in self.repeat_ids and self.repeat_seqs.
+        :param scope: Specifies if deleting repeat seqs, ids, or all
+        :return: self, so calls can be chained
+        """
+        if scope not in ["all", "ids", "seqs"]:
+            raise ValueError("The 'scope' parameter must be 'all', 'ids', or 'seqs'.")
+        return self.pipe(self._delete_repeats, scope)
+
+    def write_to(self, handle, out_format=None):
+        """
+        Process and write records one chunk at a time
+        :param handle: Any open file-like object (e.g., sys.stdout)
+        :param out_format: Override self.out_format
+        :return: Number of records written
+        """
+        out_format = self.out_format if not out_format else out_format.lower()
+        if out_format not in STREAM_OUT_FORMATS:
+            raise TypeError("Format '%s' cannot be streamed. Streaming supports: %s"
+                            % (out_format, ", ".join(STREAM_OUT_FORMATS)))
+        rec_count = 0
+        for seqbuddy in self.chunks():
+            if not seqbuddy.records:
+                continue
+            if out_format == "raw" and rec_count:
+                handle.write("\n")
+            seqbuddy.write_to(handle, out_format)
+            rec_count += len(seqbuddy)
+        if not rec_count:
+            handle.write("Error: No sequences in object.\n")
+        return rec_count
+
+    def write(self, file_path, out_format=None):
+        with open(file_path, "w", encoding="utf-8") as ofile:
+            self.write_to(ofile, out_format)
+        return
+
+
+class _HeadBufferedHandle(object):
+    """
+    Re-attach the text that was read off the front of a non-seekable stream (e.g., stdin) while sniffing its format
+    """
+    def __init__(self, head, handle):
+        self._head = StringIO(head)
+        self._handle = handle
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self._head.read() + self._handle.read()
+        data = self._head.read(size)
+        if len(data) < size:
+            data += self._handle.read(size - len(data))
+        return data
+
+    def readline(self):
+        line = self._head.readline()
+        return line if line else self._handle.readline()
+
 
 # ################################################# HELPER FUNCTIONS ################################################# #
 def _add_buddy_data(rec, key=None, data=None):
@@ -457,90 +849,6 @@ def _feature_rc(feature, seq_len):
     return feature
 
 
-class FeatureReMapper(object):
-    """
-    Build a list that maps original residues to new positions if residues have been removed
-    This will not work if new columns are being added.
-    :usage: Instantiate a new object, and for each position in the original sequence, call the 'extend' method,
-            specifying whether that residue exists in the new alignment or not. Remap the features on the new sequence
-            by calling the remap_features method.
-    """
-    def __init__(self, old_seq):
-        self.old_seq = old_seq  # SeqRecord
-        self.position_map = []
-        self.starting_position_filled = False
-
-    def extend(self, exists=True):
-        """
-        Iterates the position map, adding an index and whether the new sequence contains the residue.
-        Extend() must be called exactly len(self.old_seq) times.
-        :param exists: Specify whether the next residue exists or not
-        """
-        if len(self.old_seq.seq) < len(self.position_map) + 1:
-            raise AttributeError("The position map has already been fully populated.")
-
-        if not self.position_map:
-            if exists:
-                self.starting_position_filled = True
-            self.position_map.append((0, exists))
-
-        else:
-            if exists and not self.starting_position_filled:
-                self.position_map.append((0, True))
-                self.starting_position_filled = True
-            elif exists and self.starting_position_filled:
-                self.position_map.append((self.position_map[-1][0] + 1, True))
-            else:
-                self.position_map.append((self.position_map[-1][0], False))
-        return
-
-    def remap_features(self, new_seq):
-        """
-        Add all the features from self.old_seq that still exist onto new_seq
-        :param new_seq: SeqRecord containing the new sequence that was used to build self.position_map
-        """
-        if len(self.old_seq.seq) != len(self.position_map):
-            raise AttributeError("The position map has not been fully populated.")
-
-        new_features = []
-        for feature in self.old_seq.features:
-            feature = self._remap(feature)
-            if feature:
-                new_features.append(feature)
-        new_seq.features = new_features
-        return new_seq
-
-    def _remap(self, feature):
-        """
-        Deal with the weirdness that is SeqRecord features... Compares self.old_seq features against self.position_map
-        :param feature: A feature from self.old_seq
-        """
-        if type(feature.location) == FeatureLocation:
-            for pos, present in self.position_map[feature.location.start:feature.location.end]:
-                if present:
-                    start = pos
-                    end = self.position_map[feature.location.end - 1][0] + 1
-                    location = FeatureLocation(start, end, strand=feature.location.strand)
-                    feature.location = location
-                    return feature
-            else:
-                return None
-
-        else:  # CompoundLocation
-            parts = []
-            for sub_feature in feature.location.parts:
-                sub_feature = self._remap(SeqFeature(sub_feature))
-                if sub_feature:
-                    parts.append(sub_feature.location)
-            if len(parts) > 1:
-                feature.location = CompoundLocation(parts, operator='order')
-            elif len(parts) == 1:
-                feature.location = FeatureLocation(parts[0].start, parts[0].end, strand=parts[0].strand)
-            else:
-                feature = None
-            return feature
-
-
 def _guess_alphabet(seqbuddy):
     """
     Looks through the characters in the SeqBuddy records to determine the most likely alphabet
@@ -592,13 +900,14 @@ def _guess_format(_input):
     if str(type(_input)) == "<class '_io.TextIOWrapper'>" or isinstance(_input, StringIO):
         if not _input.seekable():  # Deal with input streams (e.g., stdout pipes)
             _input = StringIO(_input.read())
-        if _input.read() == "":
+        if _input.read(1) == "":
             return "empty file"
         _input.seek(0)
 
         possible_formats = ["stockholm", "fasta", "gb", "phylipss", "phylipsr", "phylip", "phylip-relaxed",
                             "fastq", "embl", "nexus", "seqxml", "clustal", "swiss"]
-        for next_format in possible_formats:
+        # Formats matching the head of the file go first, so usually only one parser is ever run
+        for next_format in br.sniff_format(_input, possible_formats):
             try:
                 _input.seek(0)
                 if next_format in ["phylip", "phylipsr", "phylipss"]:
@@ -635,13 +944,236 @@ def _guess_format(_input):
         raise br.GuessError("Unsupported _input argument in guess_format(). %s" % _input)
 
 
-def make_copy(seqbuddy):
+def _check_genbank_loci(records):
+    """
+    Older versions of BioPython's GenBank writer raise on long LOCUS lines part way through a file, so run that check
+    against every record before anything is written out.
+    :param records: list of SeqRecords
+    :return: None
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for rec in records:
+            # Only long or white space containing names can fail, so don't render every record twice
+            if any(len(str(locus)) > 16 or len(str(locus).split()) > 1 for locus in [rec.name, rec.id]):
+                SeqIO.write(rec, StringIO(), "genbank")
+    return
+
+
+def _first_line(handle):
+    """
+    Read up to, and return, the first line of a handle that isn't just whitespace
+    """
+    line = handle.readline()
+    while line and not line.strip():
+        line = handle.readline()
+    return line
+
+
+def _sniff_stream_format(first_line):
+    """
+    Work out the format of a stream from its first non-blank line, without reading any further
+    :param first_line: str
+    :return: str or None
+    """
+    for next_format in br.sniff_signatures(first_line):
+        if next_format in STREAM_IN_FORMATS:
+            return next_format
+    return None
+
+
+def _pairwise_output_dict(output_list):
+    """
+    Push all-by-all results into a dictionary of dictionaries, for more flexible use outside of bl2seq()
+    :param output_list: [[query, subject, %_ident, length, evalue, bit_score], ...] with each pair listed once
+    :return: OrderedDict of results dict[key][matches]
+    """
+    output_list = sorted(output_list, key=lambda l: l[0])
+    output_dict = {}
+    for match in output_list:
+        query, subj, ident, length, evalue, bit_score = match
+        output_dict.setdefault(query, {})
+        output_dict[query][subj] = [float(ident), int(length), float(evalue), float(bit_score)]
+
+        output_dict.setdefault(subj, {})
+        output_dict[subj][query] = [float(ident), int(length), float(evalue), float(bit_score)]
+
+    for key, value in output_dict.items():
+        output_dict[key] = [(x, y) for x, y in output_dict[key].items()]
+        output_dict[key] = OrderedDict(sorted(output_dict[key], key=lambda l: l[0]))
+
+    output_dict = [(key, value) for key, value in output_dict.items()]
+    output_dict = OrderedDict(sorted(output_dict, key=lambda l: l[0]))
+    return output_dict
+
+
+def _pairwise_scoring(protein):
+    """
+    Build the residue encoding and substitution matrix for the built-in pairwise aligner
+    :param protein: bool
+    :return: dict with 'lookup' (ASCII -> residue index), 'matrix' (np.array), and the PAIRWISE_SCORING values
+    """
+    scoring = dict(PAIRWISE_SCORING["protein" if protein else "nucleotide"])
+    alphabet = scoring["alphabet"]
+    lookup = np.full(256, len(alphabet) - (2 if protein else 1), dtype=np.uint8)  # Unknown residues become X or N
+    for indx, residue in enumerate(alphabet):
+        lookup[ord(residue)] = indx
+        lookup[ord(residue.lower())] = indx
+
+    if protein:
+        try:
+            from Bio.SubsMat.MatrixInfo import blosum62
+        except ImportError:  # Bio.SubsMat was removed from newer versions of BioPython
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                from Bio.Align import substitution_matrices
+            blosum62 = substitution_matrices.load("BLOSUM62")
+            blosum62 = {(res1, res2): blosum62[res1][res2] for res1 in alphabet for res2 in alphabet}
+        matrix = np.zeros((len(alphabet), len(alphabet)), dtype=np.int32)
+        for indx1, res1 in enumerate(alphabet):
+            for indx2, res2 in enumerate(alphabet):
+                # Older BioPython versions don't include stop codons, so fall back on BLAST's values (-4 and 1)
+                matrix[indx1, indx2] = blosum62.get((res1, res2), blosum62.get((res2, res1), 1 if res1 == res2 else -4))
+    else:
+        lookup[ord("U")] = lookup[ord("u")] = lookup[ord("T")]
+        matrix = np.full((len(alphabet), len(alphabet)), scoring["mismatch"], dtype=np.int32)
+        np.fill_diagonal(matrix[:4, :4], scoring["match"])
+    scoring["lookup"] = lookup
+    scoring["matrix"] = matrix
+    return scoring
+
+
+def _kmer_index(encoded, kmer_size, alphabet_size):
+    """
+    Integer codes for every k-mer in an encoded sequence, with the position each one first appears at
+    :param encoded: np.array of residue indices
+    :return: (sorted unique k-mer codes, first positions)
+    """
+    if len(encoded) < kmer_size:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    codes = np.zeros(len(encoded) - kmer_size + 1, dtype=np.int64)
+    for offset in range(kmer_size):
+        codes = codes * alphabet_size + encoded[offset:len(codes) + offset]
+    return np.unique(codes, return_index=True)
+
+
+def _kmer_diagonal(kmers1, kmers2, band_width, min_hits):
+    """
+    k-mer prefilter. Find the diagonal (offset of seq2 relative to seq1) supported by the most shared k-mers.
+    :return: The diagonal, or None if fewer than min_hits shared k-mers fall within band_width of it
+    """
+    shared, indices1, indices2 = np.intersect1d(kmers1[0], kmers2[0], assume_unique=True, return_indices=True)
+    if len(shared) < min_hits:
+        return None
+    diagonals = kmers2[1][indices2] - kmers1[1][indices1]
+    diagonal = np.bincount(diagonals - diagonals.min()).argmax() + diagonals.min()
+    if np.count_nonzero(np.abs(diagonals - diagonal) <= band_width) < min_hits:
+        return None
+    return int(diagonal)
+
+
+def _banded_align(queries, subjects, diagonals, band_width, scoring, block_size=64):
+    """
+    Local alignments (Smith-Waterman with affine gaps) of a batch of sequence pairs, each restricted to a band around
+    its own diagonal. The bands of every pair are stacked into 2D arrays and filled one query residue at a time, and
+    horizontal gaps are resolved with a running maximum instead of a column-by-column loop. Identities and alignment
+    lengths are carried along with the scores, so no traceback is needed.
+    :param queries: List of np.arrays of residue indices
+    :param subjects: List of np.arrays of residue indices (same length as queries)
+    :param diagonals: For each pair, subject position - query position for the center of the band
+    :param band_width: Number of diagonals on either side of the center
+    :param scoring: dict from _pairwise_scoring()
+    :param block_size: Number of query rows to pre-compute substitution scores for at a time
+    :return: np.arrays of the best local scores, identities, and alignment lengths (one value per pair)
+    """
+    gap_open, gap_extend, matrix = scoring["gap_open"], scoring["gap_extend"], scoring["matrix"]
+    neg_inf = -10 ** 8
+    num_pairs, width = len(subjects), 2 * band_width + 1
+    positions = np.arange(width, dtype=np.int32)
+    offsets = np.asarray(diagonals, dtype=np.int64)[:, None] + positions - band_width
+    query_lens = np.array([len(query) for query in queries])
+    sub_lens = np.array([len(subject) for subject in subjects])
+    query_pad = np.zeros((num_pairs, max(query_lens.max(), 1) + 1), dtype=np.uint8)
+    sub_pad = np.zeros((num_pairs, max(sub_lens.max(), 1)), dtype=np.uint8)
+    for indx, (query, subject) in enumerate(zip(queries, subjects)):
+        query_pad[indx, :len(query)] = query
+        sub_pad[indx, :len(subject)] = subject
+
+    # Cell t of query row i is subject column j = i + diagonal + t - band_width. The diagonal predecessor of a cell
+    # has the same t, the cell above it is at t + 1, and the cell to its left is at t - 1. An extra column at the end
+    # of each array stands in for the cells above and to the right of the band.
+    h_score = np.zeros((num_pairs, width + 1), dtype=np.int32)
+    h_ident, h_len = np.zeros_like(h_score), np.zeros_like(h_score)
+    f_score = np.full((num_pairs, width + 1), neg_inf, dtype=np.int32)
+    f_ident, f_len = np.zeros_like(f_score), np.zeros_like(f_score)
+    best_score, best_ident, best_len = [np.zeros((num_pairs, width), dtype=np.int32) for _ in range(3)]
+    first_col = np.zeros((num_pairs, 1), dtype=np.int32)
+
+    for block_start in range(1, query_lens.max() + 1, block_size):
+        # Substitution scores, identities, and valid cells for a block of rows, in one shot
+        rows = np.arange(block_start, min(block_start + block_size, query_lens.max() + 1))
+        columns = rows[:, None, None] + offsets[None, :, :]
+        valid_block = (columns >= 1) & (columns <= sub_lens[:, None]) & (rows[:, None, None] <= query_lens[:, None])
+        residues = sub_pad[np.arange(num_pairs)[None, :, None], np.clip(columns - 1, 0, sub_pad.shape[1] - 1)]
+        query_res = query_pad[:, rows - 1].T[:, :, None]
+        sub_block = matrix[query_res, residues]
+        match_block = residues == query_res
+
+        for valid, sub_scores, matches in zip(valid_block, sub_block, match_block):
+            # Vertical gaps, opened from or extending the cell above
+            open_gap = h_score[:, 1:] - gap_open - gap_extend
+            use_open = open_gap >= f_score[:, 1:] - gap_extend
+            f_new = np.where(valid, np.where(use_open, open_gap, f_score[:, 1:] - gap_extend), neg_inf)
+            f_ident_new = np.where(use_open, h_ident[:, 1:], f_ident[:, 1:])
+            f_len_new = np.where(use_open, h_len[:, 1:], f_len[:, 1:]) + 1
+
+            diag_score = h_score[:, :-1] + sub_scores
+            use_diag = diag_score >= f_new
+            score = np.where(use_diag, diag_score, f_new)
+            keep = valid & (score > 0)
+            score *= keep
+            ident = np.where(use_diag, h_ident[:, :-1] + matches, f_ident_new) * keep
+            length = np.where(use_diag, h_len[:, :-1] + 1, f_len_new) * keep
+
+            # Horizontal gaps: E[t] = max over k < t of (H[k] - gap_open - gap_extend * (t - k))
+            ramp = score + gap_extend * positions
+            running = np.maximum.accumulate(ramp, axis=1)
+            source = np.maximum.accumulate(np.where(ramp == running, positions, 0), axis=1)
+            e_score = np.concatenate([first_col + neg_inf, running[:, :-1]], axis=1) - gap_open - gap_extend * positions
+            source = np.concatenate([first_col, source[:, :-1]], axis=1)
+            use_e = valid & (e_score > score)
+            if use_e.any():
+                score = np.where(use_e, e_score, score)
+                ident = np.where(use_e, np.take_along_axis(ident, source, axis=1), ident)
+                length = np.where(use_e, np.take_along_axis(length, source, axis=1) + positions - source, length)
+
+            h_score[:, :-1], h_ident[:, :-1], h_len[:, :-1] = score, ident, length
+            f_score[:, :-1], f_ident[:, :-1], f_len[:, :-1] = f_new, f_ident_new, f_len_new
+            improved = score > best_score
+            best_score = np.where(improved, score, best_score)
+            best_ident = np.where(improved, ident, best_ident)
+            best_len = np.where(improved, length, best_len)
+
+    # Ties go to the left-most cell of the band, like argmax
+    top = best_score.argmax(axis=1)[:, None]
+    return tuple(np.take_along_axis(x, top, axis=1)[:, 0] for x in (best_score, best_ident, best_len))
+
+
+def make_copy(seqbuddy, shallow=False):
     """
     Deepcopy a SeqBuddy object. The alphabet objects are not handled properly when deepcopy is called,
     so need to wrap it.
+    Set shallow=True for a much cheaper copy (see br.copy_record()) that shares the Seq payloads with the original.
     :param seqbuddy: SeqBuddy object
+    :param shallow: Only copy the parts of each record that get edited in place
     :return: SeqBuddy object
     """
+    if shallow:
+        _copy = copy(seqbuddy)
+        _copy.records = [br.copy_record(rec) for rec in seqbuddy.records]
+        _copy.hash_map = OrderedDict(seqbuddy.hash_map)
+        return _copy
+
     alphabet_list = [rec.seq.alphabet for rec in seqbuddy.records]
     _copy = deepcopy(seqbuddy)
     _copy.alpha = seqbuddy.alpha
@@ -793,229 +1325,166 @@ def ave_seq_length(seqbuddy, clean=False):
     return sum_length / len(seqbuddy)
 
 
+def _codon_usage_file(path):
+    """
+    Read a custom codon usage table. Every codon followed by a frequency (or count) is picked up, so simple
+    'codon  frequency' lists work, as do the tables from http://www.kazusa.or.jp (e.g., 'UUU 17.6(714298)').
+    Codons are assigned to residues with the standard genetic code.
+    :param path: Location of the codon usage table
+    :return: Dictionary in the same layout as the CODON_USAGE tables
+    """
+    with open(path, "r", encoding="utf-8") as ifile:
+        frequencies = re.findall(r"\b([ACGTUacgtu]{3})\s+([0-9]*\.?[0-9]+)", ifile.read())
+    if not frequencies:
+        raise ValueError("Unable to find any codon frequencies in '%s'." % path)
+    frequencies = {codon.upper().replace("U", "T"): float(freq) for codon, freq in frequencies}
+
+    genetic_code = CodonTable.unambiguous_dna_by_id[1]
+    codons = list(genetic_code.forward_table.items()) + [(codon, "*") for codon in genetic_code.stop_codons]
+    usage = OrderedDict()
+    for codon, residue in codons:
+        usage.setdefault(residue, ([], []))
+        usage[residue][0].append(codon)
+        usage[residue][1].append(frequencies.get(codon, 0.))
+
+    for residue, (_codons, freqs) in usage.items():
+        total = sum(freqs)
+        usage[residue] = (_codons, [freq / total for freq in freqs] if total else [1 / len(freqs)] * len(freqs))
+    usage['X'] = (['NNN'], [1.0])
+    usage['-'] = (['---'], [1.0])
+    return usage
+
+
+def _codon_sampler(usage, optimized=False):
+    """
+    Lay a codon usage table out as arrays, with the cumulative frequencies for each residue in its own row
+    :param usage: Dictionary in the CODON_USAGE layout
+    :param optimized: Only keep the most frequent codon for each residue
+    :return: Tuple of (residue byte -> row, cumulative frequencies, codons per row, codons)
+    """
+    width = max(len(codons) for codons, freqs in usage.values())
+    residue_rows = np.full(256, -1, dtype=np.int16)
+    cumulative = np.full((len(usage), width), np.inf)
+    num_codons = np.zeros(len(usage), dtype=np.int64)
+    codon_table = np.zeros((len(usage), width), dtype="S3")
+    for row, (residue, (codons, freqs)) in enumerate(usage.items()):
+        if optimized:
+            best = int(np.argmax(freqs))
+            codons, freqs = [codons[best]], [1.0]
+        residue_rows[ord(residue)] = row
+        cumulative[row, :len(freqs)] = np.cumsum(freqs)
+        num_codons[row] = len(codons)
+        codon_table[row, :len(codons)] = codons
+    return residue_rows, cumulative, num_codons, codon_table
+
+
+def _sample_codons(residues, sampler, rand_gen):
+    """
+    Pick a codon for every residue, weighted by the codon usage frequencies
+    :param residues: Upper case protein sequence (bytes)
+    :param sampler: Output from _codon_sampler()
+    :param rand_gen: np.random.RandomState object
+    :return: DNA sequence (str)
+    """
+    residue_rows, cumulative, num_codons, codon_table = sampler
+    residues = np.frombuffer(residues, dtype=np.uint8)
+    rows = residue_rows[residues]
+    if len(rows) and rows.min() < 0:
+        raise KeyError(chr(residues[np.argmax(rows < 0)]))
+
+    draws = rand_gen.random_sample(len(residues))
+    choices = np.zeros(len(residues), dtype=np.int64)
+    for row in np.unique(rows):
+        selected = rows == row
+        choices[selected] = np.searchsorted(cumulative[row, :num_codons[row]], draws[selected])
+    # Frequencies that sum to a hair under 1 can leave the largest draws past the final codon
+    choices = np.minimum(choices, num_codons[rows] - 1)
+    return codon_table[rows, choices].tobytes().decode()
+
+
 def back_translate(seqbuddy, mode='random', species=None, r_seed=None):
     """
     Back-translates protein sequences into DNA sequences
     :param seqbuddy: SeqBuddy object
     :param mode: The codon selection mode (random/optimized)
-    :param species: The model to use for optimized codon selection (human/mouse/yeast/ecoli)
-    codon preference tables derived from the data at http://www.kazusa.or.jp
+    :param species: The model to use for optimized codon selection (human/mouse/yeast/ecoli), or the path to a
+    custom codon usage table. Species codon preference tables derived from the data at http://www.kazusa.or.jp
     :param r_seed: Set the random generator seed value
     :return: Modified SeqBuddy object
     """
     rand_gen = Random() if not r_seed else Random(r_seed)
 
-    # Homo sapiens, species=9606
     if mode.upper() not in ['RANDOM', 'R', 'OPTIMIZED', 'O']:
         raise AttributeError("Back_translate modes accepted are 'random' or 'r' and 'optimized' or 'o'. "
                              "You entered '%s'" % mode)
 
-    h_sapi = {'A': (['GCT', 'GCC', 'GCA', 'GCG'], [0.2675, 0.3975, 0.2275, 0.1075]),
-              'C': (['TGT', 'TGC'], [0.46, 0.54]),
-              'D': (['GAT', 'GAC'], [0.46, 0.54]),
-              'E': (['GAA', 'GAG'], [0.42, 0.58]),
-              'F': (['TTT', 'TTC'], [0.46, 0.54]),
-              'G': (['GGT', 'GGC', 'GGA', 'GGG'], [0.16, 0.34, 0.25, 0.25]),
-              'H': (['CAT', 'CAC'], [0.42, 0.58]),
-              'I': (['ATT', 'ATC', 'ATA'], [0.36, 0.47, 0.17]),
-              'K': (['AAA', 'AAG'], [0.43, 0.57]),
-              'L': (['TTA', 'TTG', 'CTT', 'CTC', 'CTA', 'CTG'], [0.08, 0.1275, 0.1275, 0.1975, 0.07, 0.3975]),
-              'M': (['ATG'], [1.00]),
-              'N': (['AAT', 'AAC'], [0.47, 0.53]),
-              'P': (['CCT', 'CCC', 'CCA', 'CCG'], [0.29, 0.32, 0.28, 0.11]),
-              'Q': (['CAA', 'CAG'], [0.27, 0.73]),
-              'R': (['CGT', 'CGC', 'CGA', 'CGG', 'AGA', 'AGG'], [0.08, 0.18, 0.1125, 0.2025, 0.2125, 0.2125]),
-              'S': (['TCT', 'TCC', 'TCA', 'TCG', 'AGT', 'AGC'], [0.19, 0.22, 0.15, 0.05, 0.15, 0.24]),
-              '*': (['TAA', 'TGA', 'TAG'], [0.30, 0.46, 0.24]),
-              'T': (['ACT', 'ACC', 'ACA', 'ACG'], [0.25, 0.36, 0.28, 0.11]),
-              'V': (['GTT', 'GTC', 'GTA', 'GTG'], [0.18, 0.24, 0.12, 0.46]),
-              'W': (['TGG'], [1.00]),
-              'Y': (['TAT', 'TAC'], [0.44, 0.56]),
-              'X': (['NNN'], [1.0]),
-              '-': (['---'], [1.0])}
-
-    # Mus musculus, species=10090
-    m_muscul = {'A': (['GCT', 'GCC', 'GCA', 'GCG'], [0.2925, 0.3825, 0.2325, 0.0925]),
-                'C': (['TGT', 'TGC'], [0.48, 0.52]),
-                'D': (['GAT', 'GAC'], [0.45, 0.55]),
-                'E': (['GAA', 'GAG'], [0.41, 0.59]),
-                'F': (['TTT', 'TTC'], [0.44, 0.56]),
-                'G': (['GGT', 'GGC', 'GGA', 'GGG'], [0.18, 0.33, 0.26, 0.23]),
-                'H': (['CAT', 'CAC'], [0.41, 0.59]),
-                'I': (['ATT', 'ATC', 'ATA'], [0.34, 0.50, 0.16]),
-                'K': (['AAA', 'AAG'], [0.39, 0.61]),
-                'L': (['TTA', 'TTG', 'CTT', 'CTC', 'CTA', 'CTG'], [0.07, 0.13, 0.13, 0.20, 0.08, 0.39]),
-                'M': (['ATG'], [1.00]),
-                'N': (['AAT', 'AAC'], [0.43, 0.57]),
-                'P': (['CCT', 'CCC', 'CCA', 'CCG'], [0.31, 0.30, 0.29, 0.10]),
-                'Q': (['CAA', 'CAG'], [0.26, 0.74]),
-                'R': (['CGT', 'CGC', 'CGA', 'CGG', 'AGA', 'AGG'], [0.08, 0.17, 0.12, 0.19, 0.22, 0.22]),
-                'S': (['TCT', 'TCC', 'TCA', 'TCG', 'AGT', 'AGC'], [0.20, 0.22, 0.14, 0.05, 0.15, 0.24]),
-                '*': (['TAA', 'TGA', 'TAG'], [0.28, 0.49, 0.23]),
-                'T': (['ACT', 'ACC', 'ACA', 'ACG'], [0.2525, 0.3525, 0.2925, 0.1025]),
-                'V': (['GTT', 'GTC', 'GTA', 'GTG'], [0.17, 0.25, 0.12, 0.46]),
-                'W': (['TGG'], [1.00]),
-                'Y': (['TAT', 'TAC'], [0.43, 0.57]),
-                'X': (['NNN'], [1.0]),
-                '-': (['---'], [1.0])}
-
-    # Escherichia coli O157:H7 EDL933, species=155864
-    e_coli = {'A': (['GCT', 'GCC', 'GCA', 'GCG'], [0.16, 0.27, 0.22, 0.35]),
-              'C': (['TGT', 'TGC'], [0.45, 0.55]),
-              'D': (['GAT', 'GAC'], [0.63, 0.37]),
-              'E': (['GAA', 'GAG'], [0.68, 0.32]),
-              'F': (['TTT', 'TTC'], [0.58, 0.42]),
-              'G': (['GGT', 'GGC', 'GGA', 'GGG'], [0.33, 0.39, 0.12, 0.16]),
-              'H': (['CAT', 'CAC'], [0.58, 0.42]),
-              'I': (['ATT', 'ATC', 'ATA'], [0.505, 0.404, 0.091]),
-              'K': (['AAA', 'AAG'], [0.76, 0.24]),
-              'L': (['TTA', 'TTG', 'CTT', 'CTC', 'CTA', 'CTG'], [0.13, 0.13, 0.11, 0.10, 0.04, 0.49]),
-              'M': (['ATG'], [1.00]),
-              'N': (['AAT', 'AAC'], [0.47, 0.53]),
-              'P': (['CCT', 'CCC', 'CCA', 'CCG'], [0.17, 0.13, 0.19, 0.51]),
-              'Q': (['CAA', 'CAG'], [0.33, 0.67]),
-              'R': (['CGT', 'CGC', 'CGA', 'CGG', 'AGA', 'AGG'], [0.3625, 0.3725, 0.0725, 0.1125, 0.05, 0.03]),
-              'S': (['TCT', 'TCC', 'TCA', 'TCG', 'AGT', 'AGC'], [0.14, 0.1475, 0.14, 0.1475, 0.1575, 0.2675]),
-              '*': (['TAA', 'TGA', 'TAG'], [0.59, 0.33, 0.08]),
-              'T': (['ACT', 'ACC', 'ACA', 'ACG'], [0.17, 0.41, 0.15, 0.27]),
-              'V': (['GTT', 'GTC', 'GTA', 'GTG'], [0.26, 0.21, 0.16, 0.37]),
-              'W': (['TGG'], [1.00]),
-              'Y': (['TAT', 'TAC'], [0.57, 0.43]),
-              'X': (['NNN'], [1.0]),
-              '-': (['---'], [1.0])}
-
-    # Saccharomyces cerevisiae, species=4932
-    s_cerev = {'A': (['GCT', 'GCC', 'GCA', 'GCG'], [0.38, 0.22, 0.29, 0.11]),
-               'C': (['TGT', 'TGC'], [0.63, 0.37]),
-               'D': (['GAT', 'GAC'], [0.65, 0.35]),
-               'E': (['GAA', 'GAG'], [0.70, 0.30]),
-               'F': (['TTT', 'TTC'], [0.59, 0.41]),
-               'G': (['GGT', 'GGC', 'GGA', 'GGG'], [0.47, 0.19, 0.22, 0.12]),
-               'H': (['CAT', 'CAC'], [0.64, 0.36]),
-               'I': (['ATT', 'ATC', 'ATA'], [0.464, 0.263, 0.273]),
-               'K': (['AAA', 'AAG'], [0.58, 0.42]),
-               'L': (['TTA', 'TTG', 'CTT', 'CTC', 'CTA', 'CTG'], [0.2775, 0.2875, 0.1275, 0.06, 0.1375, 0.11]),
-               'M': (['ATG'], [1.00]),
-               'N': (['AAT', 'AAC'], [0.59, 0.41]),
-               'P': (['CCT', 'CCC', 'CCA', 'CCG'], [0.31, 0.15, 0.42, 0.12]),
-               'Q': (['CAA', 'CAG'], [0.69, 0.31]),
-               'R': (['CGT', 'CGC', 'CGA', 'CGG', 'AGA', 'AGG'], [0.14, 0.06, 0.07, 0.04, 0.48, 0.21]),
-               'S': (['TCT', 'TCC', 'TCA', 'TCG', 'AGT', 'AGC'], [0.26, 0.16, 0.21, 0.10, 0.16, 0.11]),
-               '*': (['TAA', 'TGA', 'TAG'], [0.47, 0.30, 0.23]),
-               'T': (['ACT', 'ACC', 'ACA', 'ACG'], [0.3475, 0.2175, 0.2975, 0.1375]),
-               'V': (['GTT', 'GTC', 'GTA', 'GTG'], [0.39, 0.21, 0.21, 0.19]),
-               'W': (['TGG'], [1.00]),
-               'Y': (['TAT', 'TAC'], [0.56, 0.44]),
-               'X': (['NNN'], [1.0]),
-               '-': (['---'], [1.0])}
-
-    # random
-    rand_table = {'A': (['GCT', 'GCC', 'GCA', 'GCG'], [0.25, 0.25, 0.25, 0.25]),
-                  'C': (['TGT', 'TGC'], [0.5, 0.5]),
-                  'D': (['GAT', 'GAC'], [0.5, 0.5]),
-                  'E': (['GAA', 'GAG'], [0.5, 0.5]),
-                  'F': (['TTT', 'TTC'], [0.5, 0.5]),
-                  'G': (['GGT', 'GGC', 'GGA', 'GGG'], [0.25, 0.25, 0.25, 0.25]),
-                  'H': (['CAT', 'CAC'], [0.5, 0.5]),
-                  'I': (['ATT', 'ATC', 'ATA'], [0.3333, 0.3333, 0.3334]),
-                  'K': (['AAA', 'AAG'], [0.5, 0.5]),
-                  'L': (['TTA', 'TTG', 'CTT', 'CTC', 'CTA', 'CTG'], [0.167, 0.167, 0.167, 0.167, 0.166, 0.166]),
-                  'M': (['ATG'], [1.00]),
-                  'N': (['AAT', 'AAC'], [0.5, 0.5]),
-                  'P': (['CCT', 'CCC', 'CCA', 'CCG'], [0.25, 0.25, 0.25, 0.25]),
-                  'Q': (['CAA', 'CAG'], [0.5, 0.5]),
-                  'R': (['CGT', 'CGC', 'CGA', 'CGG', 'AGA', 'AGG'], [0.167, 0.167, 0.167, 0.167, 0.166, 0.166]),
-                  'S': (['TCT', 'TCC', 'TCA', 'TCG', 'AGT', 'AGC'], [0.167, 0.167, 0.167, 0.167, 0.166, 0.166]),
-                  '*': (['TAA', 'TGA', 'TAG'], [0.3333, 0.3333, 0.3334]),
-                  'T': (['ACT', 'ACC', 'ACA', 'ACG'], [0.25, 0.25, 0.25, 0.25]),
-                  'V': (['GTT', 'GTC', 'GTA', 'GTG'], [0.25, 0.25, 0.25, 0.25]),
-                  'W': (['TGG'], [1.00]),
-                  'Y': (['TAT', 'TAC'], [0.5, 0.5]),
-                  'X': (['NNN'], [1.0]),
-                  '-': (['---'], [1.0])}
-
     if seqbuddy.alpha != IUPAC.protein:
         raise TypeError("The input sequence needs to be IUPAC.protein'>, not %s" %
                         str(type(seqbuddy.alpha)))
 
+    species_names = {"HUMAN": "human", "H": "human", "MOUSE": "mouse", "M": "mouse",
+                     "ECOLI": "ecoli", "E": "ecoli", "YEAST": "yeast", "Y": "yeast"}
     if not species:
-        lookup_table = rand_table
-    elif species.upper() in ["HUMAN", "H"]:
-        lookup_table = h_sapi
-    elif species.upper() in ["MOUSE", "M"]:
-        lookup_table = m_muscul
-    elif species.upper() in ["ECOLI", "E"]:
-        lookup_table = e_coli
-    elif species.upper() in ["YEAST", "Y"]:
-        lookup_table = s_cerev
+        usage = CODON_USAGE["random"]
+    elif species.upper() in species_names:
+        usage = CODON_USAGE[species_names[species.upper()]]
+    elif os.path.isfile(species):
+        usage = _codon_usage_file(species)
     else:
         raise AttributeError("The species requested does not match any lookup tables currently implemented. "
                              "Please leave blank or select from human, mouse, ecoli, or yeast.")
 
-    # Modify the lookup table so each amino acid maps to a single 'optimal' codon
-    if mode.upper() in ['OPTIMIZED', 'O']:
-        for aa in lookup_table:
-            best = ["", 0.]
-            for i in range(len(lookup_table[aa][1])):
-                if lookup_table[aa][1][i] > best[1]:
-                    best = [lookup_table[aa][0][i], lookup_table[aa][1][i]]
-            lookup_table[aa] = ([best[0]], [1.0])
+    # Optimized mode maps each amino acid to a single 'optimal' codon
+    sampler = _codon_sampler(usage, optimized=mode.upper() in ['OPTIMIZED', 'O'])
+
+    # Continue the Mersenne Twister stream of rand_gen, so r_seed gives the same codons that random.Random() would
+    state = rand_gen.getstate()[1]
+    rand_gen = np.random.RandomState()
+    rand_gen.set_state(("MT19937", np.array(state[:624], dtype=np.uint32), state[624]))
 
     clean_seq(seqbuddy, skip_list="\-*")
-    originals = make_copy(seqbuddy)
-    for rec in seqbuddy.records:
-        rec.features = []
-        dna_seq = ["" for _ in range(len(rec))]
-        for indx, aa in enumerate(rec.seq.upper()):
-            rand_num = rand_gen.random()
-            sum_probs = 0.
-            for i in range(len(lookup_table[aa][1])):
-                sum_probs += lookup_table[aa][1][i]
-                if sum_probs >= rand_num:
-                    dna_seq[indx] = lookup_table[aa][0][i]
-                    break
-            rec.seq = Seq("".join(dna_seq), alphabet=IUPAC.ambiguous_dna)
+    # Protein features are carried over to the new CDS records, if there are any
+    originals = make_copy(seqbuddy, shallow=True) if any(rec.features for rec in seqbuddy.records) else None
+
+    # Sample a batch of records at a time, to keep memory in check with very large libraries
+    batch, batch_size = [], 0
+    for indx, rec in enumerate(seqbuddy.records):
+        batch.append(rec)
+        batch_size += len(rec)
+        if batch_size < 2 ** 20 and indx + 1 < len(seqbuddy.records):
+            continue
+
+        dna_seq = _sample_codons("".join([str(rec.seq) for rec in batch]).upper().encode(), sampler, rand_gen)
+        start = 0
+        for rec in batch:
+            end = start + len(rec) * 3
+            rec.features = []
+            rec.seq = Seq(dna_seq[start:end], alphabet=IUPAC.ambiguous_dna)
+            start = end
+        batch, batch_size = [], 0
 
     seqbuddy.alpha = IUPAC.ambiguous_dna
-    map_features_prot2nucl(originals, seqbuddy, mode="list")
+    if originals:
+        map_features_prot2nucl(originals, seqbuddy, mode="list")
     return seqbuddy
 
 
-def bl2seq(seqbuddy):
+def bl2seq(seqbuddy, num_threads=None, backend="blast"):
     """
-    Does an all-by-all analysis of the sequences
+    Does an all-by-all analysis of the sequences. All records are pushed into a single BLAST database and searched
+    against it with one multithreaded BLAST call, instead of a separate blast2seq run for every pair.
     :param seqbuddy: SeqBuddy object
+    :param num_threads: Number of threads passed to BLAST (default is br.usable_cpu_count())
+    :param backend: "blast", or "python" to use the built-in aligner instead (see pairwise_identity())
     :return: OrderedDict of results dict[key][matches]
     """
-    # Note on blast2seq: Expect (E) values are calculated on an assumed database size of (the rather large) nr, so the
-    # threshold may need to be increased quite a bit to return short alignments
-    def mc_blast(_query, _args):
-        _subject_file = _args[0]
-        _query_file = br.TempFile()
-        with open(_query_file.path, "w", encoding="utf-8") as ofile:
-            ofile.write(_query.format("fasta"))
-
-        if subject.id == _query.id:
-            return
-
-        _blast_res = Popen("%s -query '%s' -subject '%s' -outfmt 6" %
-                           (blast_bin, _query_file.path, _subject_file), stdout=PIPE, shell=True).communicate()
-        _blast_res = _blast_res[0].decode().split("\n")[0].split("\t")
-
-        if len(_blast_res) == 1:
-            _result = "%s\t%s\t0\t0\t0\t0\n" % (subject.id, _query.id)
-        else:
-            # values are: query, subject, %_ident, length, evalue, bit_score
-            if _blast_res[10] == '0.0':
-                _blast_res[10] = '1e-180'
-            _result = "%s\t%s\t%s\t%s\t%s\t%s\n" % (_blast_res[0], _blast_res[1], _blast_res[2],
-                                                    _blast_res[3], _blast_res[10], _blast_res[11].strip())
-
-        with lock:
-            with open("%s%sblast_results.txt" % (tmp_dir.path, os.path.sep), "a", encoding="utf-8") as _ofile:
-                _ofile.write(_result)
-        return
+    if backend not in ["blast", "python"]:
+        raise ValueError("The bl2seq backend must be either 'blast' or 'python'")
+    if backend == "python":
+        return pairwise_identity(seqbuddy, max_processes=num_threads if num_threads else 0)
 
+    # Note: Expect (E) values are calculated against the size of the full set of sequences, not just the pair being
+    # compared, so they will be somewhat larger than those reported by a true blast2seq run
     if seqbuddy.alpha == IUPAC.protein and not _check_for_blast_bin("blastp"):
         raise RuntimeError("Blastp not present in $PATH or working directory.")
 
@@ -1023,49 +1492,61 @@ def bl2seq(seqbuddy):
             and not _check_for_blast_bin("blastn"):
         raise RuntimeError("Blastn not present in $PATH or working directory.")
 
+    if not _check_for_blast_bin("makeblastdb"):
+        raise RuntimeError("makeblastdb not present in $PATH or working directory.")
+
     blast_bin = "blastp" if seqbuddy.alpha == IUPAC.protein else "blastn"
+    dbtype = "prot" if seqbuddy.alpha == IUPAC.protein else "nucl"
+    num_threads = br.usable_cpu_count() if not num_threads else num_threads
 
-    from multiprocessing import Lock
-    lock = Lock()
     tmp_dir = br.TempDir()
 
     # Remove any gaps
     seqbuddy = clean_seq(seqbuddy, skip_list=["*"])
-
-    # Copy the seqbuddy records into new list, so they can be iteratively deleted below
     make_ids_unique(seqbuddy, sep="-")
-    seqs_copy = seqbuddy.records[:]
-    subject_file = "%s%ssubject.fa" % (tmp_dir.path, os.path.sep)
-    for subject in seqbuddy.records:
-        with open(subject_file, "w", encoding="utf-8") as ifile:
-            SeqIO.write(subject, ifile, "fasta")
-
-        br.run_multicore_function(seqs_copy, mc_blast, [subject_file], out_type=sys.stderr, quiet=True)
-        seqs_copy = seqs_copy[1:]
-
-    with open("%s%sblast_results.txt" % (tmp_dir.path, os.path.sep), "r", encoding="utf-8") as _ifile:
-        output_list = _ifile.read().strip().split("\n")
-
-    # Push output into a dictionary of dictionaries, for more flexible use outside of this function
-    output_list = [x.split("\t") for x in output_list]
-    output_list = sorted(output_list, key=lambda l: l[0])
-    output_dict = {}
-    for match in output_list:
-        query, subj, ident, length, evalue, bit_score = match
-        output_dict.setdefault(query, {})
-        output_dict[query][subj] = [float(ident), int(length), float(evalue), float(bit_score)]
 
-        output_dict.setdefault(subj, {})
-        output_dict[subj][query] = [float(ident), int(length), float(evalue), float(bit_score)]
-
-    for key, value in output_dict.items():
-        output_dict[key] = [(x, y) for x, y in output_dict[key].items()]
-        output_dict[key] = OrderedDict(sorted(output_dict[key], key=lambda l: l[0]))
+    # Simple placeholder ids are used in the database, so BLAST doesn't try to interpret the record ids
+    id_map = OrderedDict([("seq%s" % indx, rec.id) for indx, rec in enumerate(seqbuddy.records)])
+    seqs_file = "%s%sseqs.fa" % (tmp_dir.path, os.path.sep)
+    with open(seqs_file, "w", encoding="utf-8") as ofile:
+        for seq_id, rec in zip(id_map, seqbuddy.records):
+            ofile.write(">%s\n%s\n" % (seq_id, str(rec.seq)))
+
+    Popen("makeblastdb -dbtype {0} -in '{1}' -out '{2}{3}seqs_db'".format(dbtype, seqs_file, tmp_dir.path, os.path.sep),
+          shell=True, stdout=PIPE, stderr=PIPE).communicate()
+
+    blast_command = "{0} -query '{1}' -db '{2}{3}seqs_db' -out '{2}{3}blast_results.txt' " \
+                    "-outfmt '6 qseqid sseqid pident length evalue bitscore' -num_threads {4} " \
+                    "-max_target_seqs {5}".format(blast_bin, seqs_file, tmp_dir.path, os.path.sep, num_threads,
+                                                  max(len(id_map), 1))
+    blast_output = Popen(blast_command, shell=True, stdout=PIPE, stderr=PIPE).communicate()[1].decode("utf-8")
+    if "Error" in blast_output:
+        raise RuntimeError(blast_output)
 
-    output_dict = [(key, value) for key, value in output_dict.items()]
-    output_dict = OrderedDict(sorted(output_dict, key=lambda l: l[0]))
+    # Only keep the top HSP for each query/subject pair
+    hits = {}
+    with open("%s%sblast_results.txt" % (tmp_dir.path, os.path.sep), "r", encoding="utf-8") as ifile:
+        for line in ifile:
+            line = line.strip().split("\t")
+            if len(line) != 6 or line[0] == line[1] or (line[0], line[1]) in hits:
+                continue
+            hits[(line[0], line[1])] = line[2:]
+
+    # Every pair is reported once, using the later record as the query (falling back to the reverse search)
+    output_list = []
+    seq_ids = list(id_map)
+    for subj_indx, subj in enumerate(seq_ids):
+        for query in seq_ids[subj_indx + 1:]:
+            hit = hits.get((query, subj), hits.get((subj, query)))
+            if not hit:
+                output_list.append([id_map[subj], id_map[query], "0", "0", "0", "0"])
+                continue
+            # values are: query, subject, %_ident, length, evalue, bit_score
+            ident, length, evalue, bit_score = hit
+            evalue = "1e-180" if evalue == "0.0" else evalue
+            output_list.append([id_map[query], id_map[subj], ident, length, evalue, bit_score])
 
-    return output_dict
+    return _pairwise_output_dict(output_list)
 
 
 def blast(subject, query, **kwargs):
@@ -1207,9 +1688,7 @@ def blast(subject, query, **kwargs):
     if query_sb:
         new_seqs.hash_map = query_sb.hash_map
         new_seqs.reverse_hashmap()
-
-        for key, value in new_seqs.hash_map.items():
-            blast_results = re.sub(key, value, blast_results)
+        blast_results = br.bulk_replacer(new_seqs.hash_map, substrings=True)(blast_results)
 
     br._stderr("# ######################## BLAST results ######################## #\n%s"
                "# ############################################################### #\n\n" % blast_results,
@@ -1217,6 +1696,193 @@ def blast(subject, query, **kwargs):
     return new_seqs
 
 
+def bulk_rename(seqbuddy, mapping, store_old_id=False, descriptions=False, substrings=False):
+    """
+    Make many ID replacements at once, in a single pass over the records
+    :param seqbuddy: SeqBuddy object
+    :param mapping: {old: new} dictionary, or the path to a two column table (see br.read_rename_table()). The old
+    values are literal strings, matched against whole IDs.
+    :param store_old_id: Keep a copy of the original ID in the description line
+    :param descriptions: Also replace every occurrence of the old values in the description lines
+    :param substrings: Replace every occurrence of the old values within the IDs too (longest first where they overlap)
+    :return: The modified SeqBuddy object
+    """
+    if not isinstance(mapping, dict):
+        mapping = br.read_rename_table(mapping)
+    replace = br.bulk_replacer(mapping, substrings=substrings)
+    replace_text = br.bulk_replacer(mapping, substrings=True) if descriptions else None
+    for rec in seqbuddy.records:
+        if rec.description.startswith(rec.id):
+            rec.description = rec.description[len(rec.id) + 1:]
+        if descriptions:
+            rec.description = replace_text(rec.description)
+        if store_old_id:
+            rec.description = "%s %s" % (rec.id, rec.description)
+        rec.id = replace(rec.id)
+        rec.name = rec.id
+    return seqbuddy
+
+
+def cd_hit(seqbuddy, threshold, word_size=None, band_width=20, max_processes=0, batch_size=1000):
+    """
+    Greedy incremental clustering, in the style of CD-HIT. Records are sorted longest first, and each one either joins
+    the cluster of an existing representative that it shares at least <threshold> identity with, or becomes a new
+    representative. Only the representatives passing a k-mer word filter (the number of shared words a sequence
+    that similar must have) are aligned with _banded_align(), best candidates first.
+    Records are handled in batches; each batch is compared against the representatives found so far in parallel,
+    and then the records left over are aligned against each other (also in parallel) to sort out which of them
+    belong to the new representatives from the same batch.
+    :param seqbuddy: SeqBuddy object
+    :param threshold: Minimum identity (as a fraction or percentage), measured over the length of the shorter sequence
+    :param word_size: k-mer size for the word filter (defaults to the CD-HIT recommendation for the threshold)
+    :param band_width: Number of diagonals on either side of the k-mer diagonal to include in the alignment
+    :param max_processes: Number of CPUs to use (0 = br.usable_cpu_count())
+    :param batch_size: Number of records compared against the existing representatives at a time
+    :return: The SeqBuddy object, reduced to the cluster representatives (in their original order). The ids of the
+    other cluster members are stored in rec.buddy_data["cluster"]
+    """
+    threshold = threshold / 100 if threshold > 1 else threshold
+    if not 0 < threshold <= 1:
+        raise ValueError("The cd_hit threshold must be between 0 and 1 (or a percentage).")
+
+    protein = seqbuddy.alpha == IUPAC.protein
+    scoring = _pairwise_scoring(protein)
+    if not word_size:
+        word_size = [size for min_ident, size in CD_HIT_WORD_SIZES["protein" if protein else "nucleotide"]
+                     if threshold >= min_ident][0]
+    alphabet_size = len(scoring["alphabet"])
+    encoded = [scoring["lookup"][np.frombuffer(re.sub("[^A-Za-z*]", "", str(rec.seq)).encode(), dtype=np.uint8)]
+               for rec in seqbuddy.records]
+    kmers = [_kmer_index(seq, word_size, alphabet_size) for seq in encoded]
+    order = sorted(range(len(encoded)), key=lambda indx: len(encoded[indx]), reverse=True)
+
+    reps = []  # Record indices of the representatives, in the order they were found
+    word_index = {}  # k-mer code -> positions in reps
+    clusters = {}
+
+    def word_filter(query_indx, index, first_pos, last_pos):
+        """
+        :param index: Inverted k-mer index (code -> list of positions)
+        :return: Positions in [first_pos, last_pos) that pass the word filter, most shared words first
+        """
+        postings = [index[code] for code in kmers[query_indx][0].tolist() if code in index]
+        if not postings:
+            return []
+        shared = np.bincount(np.concatenate(postings), minlength=last_pos)[first_pos:last_pos]
+        # Every mismatch can knock out up to word_size of the words a near-identical sequence would share
+        required = len(kmers[query_indx][0]) - ceil((1 - threshold) * len(encoded[query_indx])) * word_size
+        candidates = np.nonzero(shared >= max(required, 1))[0]
+        return (candidates[np.argsort(-shared[candidates], kind="stable")] + first_pos).tolist()
+
+    def candidate_pairs(query_indx, candidates):
+        pairs = []
+        for subject_indx in candidates:
+            diagonal = _kmer_diagonal(kmers[query_indx], kmers[subject_indx], band_width, 1)
+            if diagonal is not None:
+                pairs.append((query_indx, subject_indx, diagonal))
+        return pairs
+
+    def align_pairs(pairs):
+        """
+        :param pairs: List of (query index, subject index, diagonal) tuples
+        :return: Identity of each pair, as a fraction of the query length
+        """
+        identities = []
+        for indx in range(0, len(pairs), 1024):
+            chunk = pairs[indx:indx + 1024]
+            identities += _banded_align([encoded[pair[0]] for pair in chunk], [encoded[pair[1]] for pair in chunk],
+                                        [pair[2] for pair in chunk], band_width, scoring)[1].tolist()
+        return [ident / max(len(encoded[pair[0]]), 1) for pair, ident in zip(pairs, identities)]
+
+    def pick(candidates, identities):
+        """
+        Candidates are considered 16 at a time, and the most similar qualifying one from the first group that has
+        any is chosen
+        :param identities: dict of candidate -> identity (candidates without a shared diagonal are missing)
+        """
+        for indx in range(0, len(candidates), 16):
+            best, best_ident = None, 0
+            for candidate in candidates[indx:indx + 16]:
+                ident = identities.get(candidate, 0)
+                if ident >= threshold and ident > best_ident:
+                    best, best_ident = candidate, ident
+            if best is not None:
+                return best
+        return None
+
+    def find_representatives(query_indices, args):
+        """
+        Candidates are aligned 16 at a time, for all of the queries at once, so most queries only need a single round
+        :param args: [number of representatives to search]
+        :return: For each query, the record index of its representative in reps[:args[0]], or None
+        """
+        num_reps = args[0]
+        candidates = [[reps[pos] for pos in word_filter(query_indx, word_index, 0, num_reps)]
+                      for query_indx in query_indices]
+        identities = [{} for _ in query_indices]
+        matches = [None] * len(query_indices)
+        for indx in range(0, max([len(x) for x in candidates] + [0]), 16):
+            unresolved = [query_pos for query_pos, match in enumerate(matches) if match is None]
+            pairs = [candidate_pairs(query_indices[query_pos], candidates[query_pos][indx:indx + 16])
+                     for query_pos in unresolved]
+            flat_pairs = [pair for query_pairs in pairs for pair in query_pairs]
+            if not flat_pairs:
+                continue
+            flat_idents = iter(align_pairs(flat_pairs))
+            for query_pos, query_pairs in zip(unresolved, pairs):
+                identities[query_pos].update({pair[1]: next(flat_idents) for pair in query_pairs})
+                matches[query_pos] = pick(candidates[query_pos][:indx + 16], identities[query_pos])
+        return matches
+
+    for batch_start in range(0, len(order), batch_size):
+        batch = order[batch_start:batch_start + batch_size]
+        matches = [None] * len(batch)
+        if reps:
+            sub_batches = [batch[indx:indx + 64] for indx in range(0, len(batch), 64)]
+            matches = br.run_multicore_function(sub_batches, find_representatives, func_args=[len(reps)],
+                                                max_processes=max_processes, quiet=True)
+            matches = [match for sub_batch in matches for match in sub_batch]
+        for query_indx, match in zip(batch, matches):
+            if match is not None:
+                clusters[match].append(seqbuddy.records[query_indx].id)
+
+        # Records left over may still belong to a representative from this same batch. Align every left over record
+        # against all of the earlier ones that pass the word filter, then walk through them in order.
+        leftovers = [query_indx for query_indx, match in zip(batch, matches) if match is None]
+        local_index = {}
+        local_candidates = []
+        pairs = []
+        for pos, query_indx in enumerate(leftovers):
+            local_candidates.append([leftovers[x] for x in word_filter(query_indx, local_index, 0, pos)])
+            pairs += candidate_pairs(query_indx, local_candidates[-1])
+            for code in kmers[query_indx][0].tolist():
+                local_index.setdefault(code, []).append(pos)
+
+        pair_chunks = [pairs[indx:indx + 1024] for indx in range(0, len(pairs), 1024)]
+        identities = br.run_multicore_function(pair_chunks, align_pairs, max_processes=max_processes, quiet=True)
+        identities = [ident for chunk in identities for ident in chunk]
+        identities = dict(zip([pair[:2] for pair in pairs], identities))
+        for query_indx, candidates in zip(leftovers, local_candidates):
+            candidates = [candidate for candidate in candidates if candidate in clusters]
+            match = pick(candidates, {candidate: identities.get((query_indx, candidate), 0)
+                                      for candidate in candidates})
+            if match is None:
+                for code in kmers[query_indx][0].tolist():
+                    word_index.setdefault(code, []).append(len(reps))
+                reps.append(query_indx)
+                clusters[query_indx] = []
+            else:
+                clusters[match].append(seqbuddy.records[query_indx].id)
+
+    new_records = []
+    for indx, rec in enumerate(seqbuddy.records):
+        if indx in clusters:
+            _add_buddy_data(rec, "cluster", clusters[indx])
+            new_records.append(rec)
+    seqbuddy.records = new_records
+    return seqbuddy
+
+
 def clean_seq(seqbuddy, ambiguous=True, rep_char="N", skip_list=None):
     """
     Removes all non-sequence characters, and converts ambiguous characters to 'X' if ambiguous=False
@@ -1226,27 +1892,30 @@ def clean_seq(seqbuddy, ambiguous=True, rep_char="N", skip_list=None):
     :param skip_list: Optional list of characters to be left alone
     :return: The cleaned SeqBuddy object
     """
-    seqbuddy_copy = make_copy(seqbuddy)
     skip_list = "" if not skip_list else "".join(skip_list)
-    for rec, rec_copy in zip(seqbuddy.records, seqbuddy_copy.records):
+    # Gapped copies are only needed to remap features, so records without any are cleaned in place
+    old_records, new_records = [], []
+    for rec in seqbuddy.records:
+        rec_copy = br.copy_record(rec) if rec.features else None
         if rec.seq.alphabet == IUPAC.protein:
             full_skip = "ACDEFGHIKLMNPQRSTVWXYacdefghiklmnpqrstvwxy%s" % skip_list
-            rec_copy.seq = Seq(re.sub("[^%s]" % full_skip, "-", str(rec.seq)),
-                               alphabet=rec.seq.alphabet)
-            rec.seq = Seq(re.sub("[^%s]" % full_skip, "", str(rec.seq)),
-                          alphabet=rec.seq.alphabet)
         else:
             full_skip = "ATGCURYWSMKHBVDNXatgcurywsmkhbvdnx%s" % skip_list
-            rec_copy.seq = Seq(re.sub("[^%s]" % full_skip, "-", str(rec.seq)),
-                               alphabet=rec.seq.alphabet)
-            rec.seq = Seq(re.sub("[^%s]" % full_skip, "", str(rec.seq)),
-                          alphabet=rec.seq.alphabet)
-            if not ambiguous:
-                full_skip = "ATGCUatgcu%s" % skip_list
-                rec.seq = Seq(re.sub("[^%s]" % full_skip, rep_char, str(rec.seq)), alphabet=rec.seq.alphabet)
+        if rec_copy:
+            rec_copy.seq = Seq(re.sub("[^%s]" % full_skip, "-", str(rec.seq)), alphabet=rec.seq.alphabet)
+        rec.seq = Seq(re.sub("[^%s]" % full_skip, "", str(rec.seq)), alphabet=rec.seq.alphabet)
+
+        if rec.seq.alphabet != IUPAC.protein and not ambiguous:
+            full_skip = "ATGCUatgcu%s" % skip_list
+            rec.seq = Seq(re.sub("[^%s]" % full_skip, rep_char, str(rec.seq)), alphabet=rec.seq.alphabet)
+            if rec_copy:
                 rec_copy.seq = Seq(re.sub("[^%s]" % full_skip, rep_char, str(rec.seq)), alphabet=rec.seq.alphabet)
 
-    br.remap_gapped_features(seqbuddy_copy.records, seqbuddy.records)
+        if rec_copy:
+            old_records.append(rec_copy)
+            new_records.append(rec)
+
+    br.remap_gapped_features(old_records, new_records)
     return seqbuddy
 
 
@@ -1302,6 +1971,35 @@ def concat_seqs(seqbuddy, clean=False):
     return seqbuddy
 
 
+def _residue_counts(seq):
+    """
+    Build a histogram of the characters in a sequence string, in a single vectorized pass for plain ASCII sequences
+    :param seq: Sequence string
+    :return: dict of {character: count}
+    """
+    try:
+        raw = seq.encode("ascii")
+    except UnicodeEncodeError:
+        return dict(Counter(seq))
+    counts = np.bincount(np.frombuffer(raw, dtype=np.uint8), minlength=128)
+    return {chr(indx): int(counts[indx]) for indx in np.flatnonzero(counts)}
+
+
+def _codon_counts(seq):
+    """
+    Build a histogram of the codons in a sequence string. Any trailing partial codon is ignored.
+    :param seq: Sequence string
+    :return: OrderedDict of {codon: count}, sorted by codon
+    """
+    seq = seq[:len(seq) - len(seq) % 3]
+    try:
+        raw = seq.encode("ascii")
+    except UnicodeEncodeError:
+        return OrderedDict(sorted(Counter([seq[indx:indx + 3] for indx in range(0, len(seq), 3)]).items()))
+    codons, counts = np.unique(np.frombuffer(raw, dtype="S3"), return_counts=True)
+    return OrderedDict(zip([codon.decode() for codon in codons.tolist()], counts.tolist()))
+
+
 def count_codons(seqbuddy):
     """
     Generate frequency statistics for codon composition
@@ -1314,37 +2012,34 @@ def count_codons(seqbuddy):
         codontable = CodonTable.ambiguous_dna_by_name['Standard'].forward_table
     else:
         codontable = CodonTable.ambiguous_rna_by_name['Standard'].forward_table
+    amino_acids = {'ATG': 'M', 'AUG': 'M', 'NNN': 'X', 'TAA': '*', 'TAG': '*', 'TGA': '*', 'UAA': '*', 'UAG': '*',
+                   'UGA': '*'}
     output = OrderedDict()
-    sb_copy = make_copy(seqbuddy)
-    replace_subsequence(sb_copy, "[-.]")
-    uppercase(sb_copy)
-    for rec in sb_copy.records:
-        sequence = str(rec.seq)
-        if len(sequence) % 3 != 0:
-            while len(sequence) % 3 != 0:
-                sequence = sequence[:-1]
-        data_table = {}
-        num_codons = len(sequence) / 3
-        while len(sequence) > 0:
-            codon = str(sequence[:3])
-            if codon in data_table:
-                data_table[codon][1] += 1
+    for rec in seqbuddy.records:
+        sequence = re.sub("[-.]", "", str(rec.seq)).upper()
+        num_codons = len(sequence) // 3
+        data_table = OrderedDict()
+        invalid = []
+        for codon, count in _codon_counts(sequence).items():
+            if codon not in amino_acids:
+                try:
+                    amino_acids[codon] = codontable[codon]
+                except (KeyError, CodonTable.TranslationError):
+                    amino_acids[codon] = None
+            if amino_acids[codon]:
+                data_table[codon] = [amino_acids[codon], count, 0.0]
             else:
-                if codon in ['ATG', 'AUG']:
-                    data_table[codon] = ['M', 1, 0.0]
-                elif codon == 'NNN':
-                    data_table[codon] = ['X', 1, 0.0]
-                elif codon in ['TAA', 'TAG', 'TGA', 'UAA', 'UAG', 'UGA']:
-                    data_table[codon] = ['*', 1, 0.0]
-                else:
-                    try:
-                        data_table[codon] = [codontable[codon], 1, 0.0]
-                    except (KeyError, CodonTable.TranslationError):
-                        br._stderr("Warning: Codon '{0}' is invalid. Codon will be skipped.\n".format(codon))
-            sequence = sequence[3:]
+                invalid.append(codon)
+
+        if invalid:  # Warn about every occurrence, in sequence order
+            for indx in range(0, num_codons * 3, 3):
+                codon = sequence[indx:indx + 3]
+                if codon in invalid:
+                    br._stderr("Warning: Codon '{0}' is invalid. Codon will be skipped.\n".format(codon))
+
         for codon in data_table:
             data_table[codon][2] = round(data_table[codon][1] / float(num_codons) * 100, 3)
-        output[rec.id] = OrderedDict(sorted(data_table.items(), key=lambda x: x[0]))
+        output[rec.id] = data_table
     for rec in seqbuddy.records:
         try:
             rec.buddy_data['Codon_frequency'] = output[rec.id]
@@ -1360,34 +2055,32 @@ def count_residues(seqbuddy):
     :return: annotated SeqBuddy object. Residue counts are appended to buddy_data in the SeqRecord obects
     """
     for rec in seqbuddy.records:
-        resid_count = {}
         seq = str(rec.seq).upper()
-        for char in seq:
-            resid_count.setdefault(char, 0)
-            resid_count[char] += 1
-
+        counts = _residue_counts(seq)
         seq_len = len(rec)
-        for residue, count in resid_count.items():
-            resid_count[residue] = [count, count / seq_len]
+        resid_count = {residue: [count, count / seq_len] for residue, count in counts.items()}
+
+        def class_count(residues):
+            return sum([counts.get(residue, 0) for residue in residues])
 
         if seqbuddy.alpha is IUPAC.protein:
-            ambig = len(re.findall("X", seq))
+            ambig = class_count("X")
             if ambig > 0:
                 resid_count['% Ambiguous'] = round(100 * ambig / seq_len, 2)
 
-            pos = len(re.findall("[HKR]", seq))
+            pos = class_count("HKR")
             resid_count['% Positive'] = round(100 * pos / seq_len, 2)
 
-            neg = len(re.findall("[DEC]", seq))
+            neg = class_count("DEC")
             resid_count['% Negative'] = round(100 * neg / seq_len, 2)
 
-            neut = len(re.findall("[GAVLIPFYWSTNQM]", seq))
+            neut = class_count("GAVLIPFYWSTNQM")
             resid_count['% Uncharged'] = round(100 * neut / seq_len, 2)
 
-            hydrophobic = len(re.findall("[AVLIPYFWMC]", seq))
+            hydrophobic = class_count("AVLIPYFWMC")
             resid_count['% Hydrophobic'] = round(100 * hydrophobic / seq_len, 2)
 
-            hydrophilic = len(re.findall("[NQSTKRHDE]", seq))
+            hydrophilic = class_count("NQSTKRHDE")
             resid_count['% Hydrophilic'] = round(100 * hydrophilic / seq_len, 2)
 
             for residue in ["A", "C", "D", "E", "F", "G", "H", "I", "K", "L", "M",
@@ -1395,7 +2088,7 @@ def count_residues(seqbuddy):
                 resid_count.setdefault(residue, [0, 0])
 
         else:
-            ambig = len(re.findall("[^ATCGU]", seq))
+            ambig = len(seq) - class_count("ATCGU")
             if ambig > 0:
                 resid_count['% Ambiguous'] = round(100 * ambig / seq_len, 2)
 
@@ -1607,32 +2300,23 @@ def delete_metadata(seqbuddy):
     return seqbuddy
 
 
-def delete_records(seqbuddy, patterns):
+def delete_records(seqbuddy, patterns, exact=False):
     """
     Deletes records with IDs matching a regex pattern
     :param seqbuddy: SeqBuddy object
     :param patterns: A single regex pattern, or list of patterns, to search with
     :type patterns: list str
+    :param exact: Treat patterns as a list of literal IDs (much faster for long lists)
     :return: The modified SeqBuddy object
     """
-    if type(patterns) == str:
-        patterns = [patterns]
-    if type(patterns) != list:
-        raise ValueError("'patterns' must be a list or a string.")
-
-    for indx, pattern in enumerate(patterns):
-        patterns[indx] = ".*" if pattern == "*" else pattern
-
-    patterns = "|".join(patterns)
-
-    retained_records = []
-    deleted = [rec.id for rec in pull_recs(make_copy(seqbuddy), patterns).records]
-    for rec in seqbuddy.records:
-        if rec.id in deleted:
-            continue
-        else:
-            retained_records.append(rec)
-    seqbuddy.records = retained_records
+    if type(patterns) == str:
+        patterns = [patterns]
+    if type(patterns) not in [list, set, tuple]:
+        raise ValueError("'patterns' must be a list or a string.")
+
+    matcher = br.record_matcher(patterns, exact)
+    deleted = set([rec.id for rec in seqbuddy.records if matcher(rec.id, rec.name)])
+    seqbuddy.records = [rec for rec in seqbuddy.records if rec.id not in deleted]
     return seqbuddy
 
 
@@ -1643,34 +2327,25 @@ def delete_repeats(seqbuddy, scope='all'):  # scope in ['all', 'ids', 'seqs']
     :param scope: Specifies if deleting repeat seqs, ids, or all
     :return: The modified SeqBuddy object
     """
-    # First, remove duplicate IDs
+    # First, remove duplicate IDs. The first copy of each is kept, and moved to the end of the list.
     if scope in ['all', 'ids']:
         find_repeats(seqbuddy)
         if len(seqbuddy.repeat_ids) > 0:
-            for rep_id in seqbuddy.repeat_ids:
-                store_one_copy = pull_recs(make_copy(seqbuddy), ["^%s$" % rep_id]).records[0]
-                delete_records(seqbuddy, "^%s$" % rep_id)
-                seqbuddy.records.append(store_one_copy)
+            first_copies = OrderedDict([(rep_id, None) for rep_id in seqbuddy.repeat_ids])
+            retained_records = []
+            for rec in seqbuddy.records:
+                if rec.id not in first_copies:
+                    retained_records.append(rec)
+                elif first_copies[rec.id] is None:
+                    first_copies[rec.id] = rec
+            seqbuddy.records = retained_records + list(first_copies.values())
 
-    # Then remove duplicate sequences
+    # Then remove duplicate sequences, keeping the record listed first in each repeat_seqs group
     if scope in ['all', 'seqs']:
         find_repeats(seqbuddy)
         if len(seqbuddy.repeat_seqs) > 0:
-            rep_seq_ids = []
-            for seq in seqbuddy.repeat_seqs:
-                rep_seq_ids.append([])
-                for rep_seq_id in seqbuddy.repeat_seqs[seq]:
-                    rep_seq_ids[-1].append(rep_seq_id)
-
-            repeat_regex = ""
-
-            for repeat_seqs in rep_seq_ids:
-                for rep_seq in repeat_seqs[1:]:
-                    rep_seq = re.sub("([|.*?^\[\]()])", r"\\\1", rep_seq)
-                    repeat_regex += "^%s$|" % rep_seq
-
-            repeat_regex = repeat_regex[:-1]
-            delete_records(seqbuddy, repeat_regex)
+            repeat_ids = set([rep_id for rep_ids in seqbuddy.repeat_seqs.values() for rep_id in rep_ids[1:]])
+            seqbuddy.records = [rec for rec in seqbuddy.records if rec.id not in repeat_ids]
 
     seqbuddy.repeat_seqs = OrderedDict()
     seqbuddy.repeat_ids = OrderedDict()
@@ -1782,21 +2457,13 @@ def extract_feature_sequences(seqbuddy, patterns):
     return seqbuddy
 
 
-def extract_regions(seqbuddy, positions):
+def _extraction_index(positions, rec_len):
     """
-    Fine grained control of what residues to pull out of the sequences
-    :param seqbuddy: SeqBuddy object
-    :param positions: Position code describing which residues to pull (str)
-
-    Position Code:  - Always a string
-                    - Comma-separated
-                    - Three types of extraction:
-                        - Singlets: "2,5,9,-5"
-                        - Ranges: "40:75,89:100,432:-45"
-                        - mth of nth: "1/5,3/5"
+    Decode a position code into the residues it selects, for a sequence of a given length
+    :param positions: Position code, already split on commas (tuple)
+    :param rec_len: Length of the sequence being extracted from
+    :return: np.array of the selected indices, sorted and unique
     """
-    positions = re.sub("\s|[,/-]$|^[,/]", "", positions).split(",")
-
     def process_single(num, max_len):
         if num == 0:
             num = 1
@@ -1809,89 +2476,136 @@ def extract_regions(seqbuddy, positions):
             num = max_len
         return num
 
-    def create_residue_list(_rec, _positions):
-        rec_len = len(_rec.seq)
-        singlets = []
-        for _position in _positions:
-            # Singlets
-            try:
-                single = process_single(int(_position), rec_len)
-                singlets.append(single - 1)
-                continue
-            except ValueError as e:
-                if "invalid literal for int() with base 10" in str(e):
-                    pass
-                else:
-                    raise e
-            try:
-                # mth of nth
-                if "/" in _position:
-                    start, end = os.path.split(_position)
-                    end = process_single(int(end), rec_len)
-                    if ":" in start:
-                        range_start, range_end = start.split(":")
-                        range_end = process_single(-1, end) if not range_end else process_single(int(range_end), end)
-                        range_start = 1 if not range_start else process_single(int(range_start), end)
+    mask = np.zeros(rec_len, dtype=bool)
+    for _position in positions:
+        # Singlets
+        try:
+            single = process_single(int(_position), rec_len)
+            if rec_len:
+                mask[single - 1] = True
+            continue
+        except ValueError as e:
+            if "invalid literal for int() with base 10" in str(e):
+                pass
+            else:
+                raise e
+        try:
+            # mth of nth
+            if "/" in _position:
+                start, end = os.path.split(_position)
+                end = process_single(int(end), rec_len)
+                if ":" in start:
+                    range_start, range_end = start.split(":")
+                    range_end = process_single(-1, end) if not range_end else process_single(int(range_end), end)
+                    range_start = 1 if not range_start else process_single(int(range_start), end)
 
-                        if range_start > range_end:
-                            raise ValueError
+                    if range_start > range_end:
+                        raise ValueError
 
-                        for i in range(range_start, range_end + 1):
-                            singlets += range(i - 1, rec_len, end)
+                    for i in range(range_start, range_end + 1):
+                        mask[i - 1::end] = True
 
-                    else:
-                        start = process_single(int(start), end)
-                        singlets += range(start - 1, rec_len, end)
-
-                # Ranges
-                elif ":" in _position:
-                    start, end = _position.split(":")
-                    start = 1 if not start else process_single(int(start), rec_len)
-                    end = process_single(-1, rec_len) if not end else process_single(int(end), rec_len)
-                    start, end = sorted([start, end])
-                    singlets += range(start - 1, end)
-
-                # Fail...
                 else:
-                    raise ValueError()
+                    start = process_single(int(start), end)
+                    mask[start - 1::end] = True
+
+            # Ranges
+            elif ":" in _position:
+                start, end = _position.split(":")
+                start = 1 if not start else process_single(int(start), rec_len)
+                end = process_single(-1, rec_len) if not end else process_single(int(end), rec_len)
+                start, end = sorted([start, end])
+                mask[max(start - 1, 0):end] = True
+
+            # Fail...
+            else:
+                raise ValueError()
 
-            except ValueError:
-                raise ValueError("Unable to decode the positions string '%s'." % _position)
+        except ValueError:
+            raise ValueError("Unable to decode the positions string '%s'." % _position)
+
+    return np.flatnonzero(mask)
+
+
+def _remap_extracted_features(features, kept_counts):
+    """
+    Move features onto an extracted sequence, trimming or dropping them to fit the residues that were kept
+    :param features: Features from the original record
+    :param kept_counts: Number of residues kept before each position of the original sequence (len(seq) + 1 values)
+    :return: List of new SeqFeature objects
+    """
+    seq_len = len(kept_counts) - 1
+
+    def remap(location):
+        if type(location) == FeatureLocation:
+            start = int(kept_counts[min(max(int(location.start), 0), seq_len)])
+            end = int(kept_counts[min(max(int(location.end), 0), seq_len)])
+            return FeatureLocation(start, end, strand=location.strand) if end > start else None
+
+        # CompoundLocation
+        parts = [remap(part) for part in location.parts]
+        parts = [part for part in parts if part]
+        if len(parts) > 1:
+            return CompoundLocation(parts, operator='order')
+        elif len(parts) == 1:
+            return parts[0]
+        return None
+
+    new_features = []
+    for feature in features:
+        location = remap(feature.location)
+        if location:
+            feature = copy(feature)
+            feature.location = location
+            new_features.append(feature)
+    return new_features
 
-        singlets = list(set(singlets))
-        singlets = sorted(singlets)
-        return singlets
 
+def extract_regions(seqbuddy, positions):
+    """
+    Fine grained control of what residues to pull out of the sequences
+    :param seqbuddy: SeqBuddy object
+    :param positions: Position code describing which residues to pull (str)
+
+    Position Code:  - Always a string
+                    - Comma-separated
+                    - Three types of extraction:
+                        - Singlets: "2,5,9,-5"
+                        - Ranges: "40:75,89:100,432:-45"
+                        - mth of nth: "1/5,3/5"
+    """
+    positions = tuple(re.sub("\s|[,/-]$|^[,/]", "", positions).split(","))
+
+    # The position code only depends on sequence length, so decode it once per length (i.e., once for alignments)
+    residue_indices = {}
     new_records = []
     for rec in seqbuddy.records:
-        new_rec_positions = create_residue_list(rec, positions)
+        seq = str(rec.seq)
+        rec_len = len(seq)
+        if rec_len not in residue_indices:
+            residue_indices[rec_len] = _extraction_index(positions, rec_len)
+        indices = residue_indices[rec_len]
+
+        encoded = seq.encode()
+        if len(encoded) == rec_len:
+            new_seq = np.frombuffer(encoded, dtype=np.uint8)[indices].tobytes().decode()
+        else:  # Multi-byte characters
+            new_seq = "".join([seq[indx] for indx in indices.tolist()])
+
         letter_annotations = {}
-        for anno_type in rec.letter_annotations:
-            letter_annotations[anno_type] = [None for _ in range(len(new_rec_positions))]
-            for indx, anno_pos in enumerate(new_rec_positions):
-                letter_annotations[anno_type][indx] = rec.letter_annotations[anno_type][anno_pos]
-        new_seq = []
-        if rec.features:  # This is super slow for large records...
-            remapper = FeatureReMapper(rec)
-            for indx, residue in enumerate(str(rec.seq)):
-                if indx in new_rec_positions:
-                    remapper.extend(True)
-                    new_seq.append(residue)
-                else:
-                    remapper.extend(False)
-            new_seq = ''.join(new_seq)
-            new_seq = Seq(new_seq, alphabet=rec.seq.alphabet)
-            new_seq = SeqRecord(new_seq, id=rec.id, name=rec.name, description=rec.description, dbxrefs=rec.dbxrefs,
-                                annotations=rec.annotations, letter_annotations=letter_annotations)
-            new_seq = remapper.remap_features(new_seq)
-        else:
-            seq = str(rec.seq)
-            for indx in new_rec_positions:
-                new_seq.append(seq[indx])
-            new_seq = ''.join(new_seq)
-            new_seq = Seq(new_seq, alphabet=rec.seq.alphabet)
-            new_seq = SeqRecord(new_seq, id=rec.id, name=rec.name, description=rec.description, dbxrefs=rec.dbxrefs,
-                                annotations=rec.annotations, letter_annotations=letter_annotations)
+        if rec.letter_annotations:
+            index_list = indices.tolist()
+            for anno_type, annotation in rec.letter_annotations.items():
+                letter_annotations[anno_type] = [annotation[indx] for indx in index_list]
+
+        new_seq = Seq(new_seq, alphabet=rec.seq.alphabet)
+        new_seq = SeqRecord(new_seq, id=rec.id, name=rec.name, description=rec.description, dbxrefs=rec.dbxrefs,
+                            annotations=rec.annotations, letter_annotations=letter_annotations)
+        if rec.features:
+            kept_counts = np.zeros(rec_len + 1, dtype=np.int64)
+            kept_counts[indices + 1] = 1
+            np.cumsum(kept_counts, out=kept_counts)
+            new_seq.features = _remap_extracted_features(rec.features, kept_counts)
 
         new_records.append(new_seq)
 
@@ -1899,85 +2613,103 @@ def extract_regions(seqbuddy, positions):
     return seqbuddy
 
 
-def find_cpg(seqbuddy):
+def _cpg_island_mask(seq, window_size, start, end, cg_threshold, oe_threshold):
+    """
+    Score positions start to end of seq, each with the average CG fraction and observed/expected CpG ratio of all the
+    windows that overlap it. Windows are summarized with cumulative sums, so only a window's worth of sequence on
+    either side of the block needs to be read.
+    :return: np.array of bools, True where both averages are over their thresholds
+    """
+    seq_len = len(seq)
+    first_win = max(0, start - window_size + 1)
+    last_win = min(end - 1, seq_len - window_size)
+    block = np.frombuffer(str(seq[first_win:last_win + window_size]).upper().encode(), dtype=np.uint8)
+    is_cg = (block == ord("C")) | (block == ord("G"))
+    is_cpg = (block[:-1] == ord("C")) & (block[1:] == ord("G"))
+    cg_sums = np.concatenate(([0], np.cumsum(is_cg)))
+    cpg_sums = np.concatenate(([0], np.cumsum(is_cpg)))
+
+    # Window values, for windows first_win to last_win
+    win_starts = np.arange(last_win - first_win + 1)
+    cg_counts = cg_sums[win_starts + window_size] - cg_sums[win_starts]
+    cpg_counts = cpg_sums[win_starts + window_size - 1] - cpg_sums[win_starts]
+    expected = (cg_counts / 2) ** 2
+    expected[expected == 0] = 1  # Prevent DivByZero
+    # Both sums are kept as integers (o/e in fixed point), so they come out the same whichever chunk they're part of
+    oe_scale = min(10 ** 9, 2 ** 62 // (2 * window_size ** 2 + 1))
+    oe_values = np.rint(cpg_counts * window_size / expected * oe_scale).astype(np.int64)
+    oe_sums = np.concatenate(([0], np.cumsum(oe_values)))
+    cg_count_sums = np.concatenate(([0], np.cumsum(cg_counts)))
+
+    # Sum over the windows covering each position, and then average
+    positions = np.arange(start, end)
+    low = np.maximum(0, positions - window_size + 1) - first_win
+    high = np.minimum(positions, seq_len - window_size) - first_win + 1
+    divisor = np.where(positions + 1 <= window_size, positions + 1,
+                       np.where(seq_len - window_size - positions - 1 < 0, seq_len - positions, window_size))
+    # Averages are compared in fixed point as well, so a position sitting exactly on a threshold is always counted
+    oe_totals = oe_sums[high] - oe_sums[low]
+    cg_totals = cg_count_sums[high] - cg_count_sums[low]
+    oe_limit = int(round(oe_threshold * oe_scale))
+    return (cg_totals >= cg_threshold * divisor * window_size) & (oe_totals >= oe_limit * divisor)
+
+
+def find_cpg(seqbuddy, window_size=200, cg_threshold=0.5, oe_threshold=0.6, chunk_size=1000000):
     """
     Predicts locations of CpG islands in DNA sequences
     :param seqbuddy: SeqBuddy object
+    :param window_size: Length of the sliding window (shortened to the length of any sequences that are smaller)
+    :param cg_threshold: Minimum average CG fraction at each position of an island
+    :param oe_threshold: Minimum average observed/expected CpG ratio at each position of an island
+    :param chunk_size: Number of positions scored at a time, which caps the memory used on very long records
     :return: Modified SeqBuddy object (buddy_data["cpgs"] appended to all records)
     """
     seqbuddy = clean_seq(seqbuddy)
     if seqbuddy.alpha not in [IUPAC.ambiguous_dna, IUPAC.unambiguous_dna]:
         raise TypeError("DNA sequence required, not protein or RNA.")
+    if window_size < 1 or chunk_size < 1:
+        raise ValueError("The window size and chunk size must be positive integers.")
 
     records = []
 
-    def cpg_calc(in_seq):  # Returns observed/expected value of a sequence
-        in_seq = in_seq.upper()
-        observed_cpg = len(re.findall("CG", in_seq)) * len(in_seq)
-        expected = (len(re.findall("[CG]", in_seq)) / 2) ** 2
-        expected = 1 if not expected else expected  # Prevent DivByZero
-        return observed_cpg / expected
-
-    def cg_percent(in_seq):  # Returns the CG % of a sequence
-        in_seq = in_seq.upper()
-        return len(re.findall("[CG]", in_seq)) / len(in_seq)
-
-    def find_islands(cg_percents, oe_values):  # Returns a list of tuples containing the start and end of an island
-        _indx = 0
+    def find_islands(seq, _window_size):  # Returns a list of tuples containing the start and end of an island
         out_list = []
-        while _indx < len(cg_percents):
-            if cg_percents[_indx] > .5 and oe_values[_indx] > .6:
-                start = _indx
-                while _indx < len(cg_percents) and cg_percents[_indx] > .5 and oe_values[_indx] > .6:
-                    _indx += 1
-                end = _indx
-                out_list.append((start, end))
-            _indx += 1
+        open_start = None  # An island can run over the end of one chunk and into the next
+        for chunk_start in range(0, len(seq), chunk_size):
+            chunk_end = min(chunk_start + chunk_size, len(seq))
+            mask = _cpg_island_mask(seq, _window_size, chunk_start, chunk_end, cg_threshold, oe_threshold)
+            if open_start is not None and not mask[0]:
+                out_list.append((open_start, chunk_start))
+                open_start = None
+            edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0])))) + chunk_start
+            for island_start, island_end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+                if open_start is not None:  # Picks up where the last chunk left off
+                    island_start, open_start = open_start, None
+                if island_end == chunk_end and chunk_end != len(seq):
+                    open_start = island_start
+                else:
+                    out_list.append((island_start, island_end))
         return out_list
 
     def map_cpg(in_seq, island_ranges):  # Maps CpG islands onto a sequence as capital letters
-        cpg_seq = in_seq.lower()
+        cpg_seq = []
+        prev_end = 0
         for pair in island_ranges:
-            cpg_seq = cpg_seq[:pair[0]] + cpg_seq[pair[0]:pair[1] + 1].upper() + cpg_seq[pair[1] + 1:]
-        return cpg_seq
+            cpg_seq += [in_seq[prev_end:pair[0]].lower(), in_seq[pair[0]:pair[1] + 1].upper()]
+            prev_end = pair[1] + 1
+        cpg_seq.append(in_seq[prev_end:].lower())
+        return "".join(cpg_seq)
 
     for rec in seqbuddy.records:
-        seq = rec.seq
-
-        oe_vals_list = [0 for _ in range(len(seq))]
-        cg_percent_list = [0 for _ in range(len(seq))]
-        window_size = len(seq) if len(seq) < 200 else 200
-
-        for indx, window in enumerate([seq[i:i + window_size] for i in range(len(seq) - window_size + 1)]):
-            cpg = cpg_calc(str(window))
-            for i in range(window_size):
-                oe_vals_list[indx + i] += cpg
-
-            cg_perc = cg_percent(str(window))
-            for i in range(window_size):
-                cg_percent_list[indx + i] += cg_perc
-
-        for indx in range(len(oe_vals_list)):
-            if indx + 1 <= window_size:
-                oe_vals_list[indx] /= (indx + 1)
-                cg_percent_list[indx] /= (indx + 1)
-
-            elif (len(oe_vals_list) - window_size) - (indx + 1) < 0:
-                oe_vals_list[indx] /= (len(oe_vals_list) - indx)
-                cg_percent_list[indx] /= (len(cg_percent_list) - indx)
-
-            else:
-                oe_vals_list[indx] /= window_size
-                cg_percent_list[indx] /= window_size
-
-        indices = find_islands(cg_percent_list, oe_vals_list)
+        seq = str(rec.seq)
+        indices = find_islands(seq, min(len(seq), window_size))
         cpg_features = [SeqFeature(location=FeatureLocation(start, end), type="CpG_island",
                                    qualifiers={'created_by': 'SeqBuddy'}) for (start, end) in indices]
         for feature in rec.features:
             cpg_features.append(feature)
-        rec = SeqRecord(map_cpg(seq, indices), id=rec.id, name=rec.name, description=rec.description,
-                        dbxrefs=rec.dbxrefs, features=cpg_features, annotations=rec.annotations,
-                        letter_annotations=rec.letter_annotations)
+        rec = SeqRecord(Seq(map_cpg(seq, indices), alphabet=rec.seq.alphabet), id=rec.id, name=rec.name,
+                        description=rec.description, dbxrefs=rec.dbxrefs, features=cpg_features,
+                        annotations=rec.annotations, letter_annotations=rec.letter_annotations)
 
         records.append(rec)
         _add_buddy_data(rec, "cpgs", indices)
@@ -1985,6 +2717,77 @@ def find_cpg(seqbuddy):
     return seqbuddy
 
 
+@lru_cache(maxsize=256)
+def _compile_pattern(pattern, alpha=None):
+    """
+    Expand ambiguous residue codes and compile a find_pattern() regex. The result is cached, so each pattern is only
+    prepared once no matter how many records or calls it is used on.
+    Sequences are lowercased before they are searched, so if the pattern has no escapes, inline flags, or ranges that
+    case could change the meaning of, it is also compiled lowercased without IGNORECASE (much faster to search).
+    :param pattern: regex pattern
+    :param alpha: Alphabet used to expand ambiguous codes. Leave as None to search for the pattern as is.
+    :return: Function that takes a lowercase sequence string and returns an iterator of match objects
+    """
+    if alpha is not None:
+        if alpha == IUPAC.protein:
+            codes = AMBIGUOUS_REGEX["protein"]
+        elif alpha in [IUPAC.ambiguous_dna, IUPAC.unambiguous_dna]:
+            codes = AMBIGUOUS_REGEX["dna"]
+        elif alpha in [IUPAC.ambiguous_rna, IUPAC.unambiguous_rna]:
+            codes = AMBIGUOUS_REGEX["rna"]
+        else:
+            codes = {}
+        pattern_backup = pattern
+        table = {}
+        for code, expansion in codes.items():
+            table[ord(code)] = table[ord(code.upper())] = expansion
+        pattern = pattern.translate(table)
+
+        safety_valve = br.SafetyValve()
+        # Strip out any double square brackets
+        while re.search("\[[^[\]]*?\[[^]]*\]", pattern):
+            safety_valve.step("Ambiguous %s regular expression '%s' failed compile." % (alpha, pattern_backup))
+            pattern = re.sub("(\[[^[\]]*?)\[([^]]*)\]", r"\1\2", pattern, count=1)
+
+    regex = re.compile(pattern, flags=re.IGNORECASE)
+    try:
+        pattern.encode("ascii")
+    except UnicodeEncodeError:
+        return regex.finditer
+    if "\\" in pattern or "-" in pattern or "(?" in pattern.replace("(?:", ""):
+        return regex.finditer
+
+    lower_regex = re.compile(pattern.lower())
+
+    def finditer(seq):
+        try:
+            seq.encode("ascii")
+        except UnicodeEncodeError:
+            return regex.finditer(seq)
+        return lower_regex.finditer(seq)
+    return finditer
+
+
+def _uppercase_spans(seq, spans):
+    """
+    Uppercase the given regions of a sequence string
+    :param seq: Sequence string
+    :param spans: List of (start, end) tuples. They may overlap and do not need to be sorted.
+    :return: New sequence string
+    """
+    segments = []
+    last_end = 0
+    for start, end in sorted(spans):
+        if end <= last_end:
+            continue
+        start = max(start, last_end)
+        segments.append(seq[last_end:start])
+        segments.append(seq[start:end].upper())
+        last_end = end
+    segments.append(seq[last_end:])
+    return "".join(segments)
+
+
 def find_orfs(seqbuddy, include_feature=True, include_buddy_data=True):
     """
     Finds all the open reading frames in the sequences and their reverse complements.
@@ -1996,34 +2799,32 @@ def find_orfs(seqbuddy, include_feature=True, include_buddy_data=True):
     if seqbuddy.alpha == IUPAC.protein:
         raise TypeError("Nucleic acid sequence required, not protein.")
 
-    pattern = "a[tu]g(?:...)*?(?:[tu]aa|[tu]ag|[tu]ga)"
+    finditer = _compile_pattern("a[tu]g(?:...)*?(?:[tu]aa|[tu]ag|[tu]ga)", seqbuddy.alpha)
 
     clean_seq(seqbuddy)
     lowercase(seqbuddy)
 
-    find_pattern(seqbuddy, pattern, ambig=True, include_feature=True, include_buddy_data=False)
-    lowercase(seqbuddy)
-
-    reverse_complement(seqbuddy)
-    find_pattern(seqbuddy, pattern, ambig=True, include_feature=True, include_buddy_data=False)
-    lowercase(seqbuddy)
-
-    reverse_complement(seqbuddy)
-
     for rec in seqbuddy.records:
+        try:
+            rev_comp = str(rec.seq.reverse_complement())
+        except ValueError as e:
+            if "Proteins do not have complements!" in str(e):
+                raise TypeError("Record '%s' is protein. Nucleic acid sequences required." % rec.id)
+            else:
+                raise e  # Hopefully never gets here
+        seq_len = len(rev_comp)
         buddy_data = {'+': [], '-': []}
-        feature_indicies = []
-        for indx, feature in enumerate(rec.features):
-            if 'regex' in feature.qualifiers.keys() and feature.qualifiers['regex'] == pattern:
-                if include_feature:
-                    feature.type = "orf"
-                    strand = "+" if feature.strand == +1 else "-"
-                    feature.qualifiers.pop("regex")
-                    buddy_data[strand].append((int(feature.location.start), int(feature.location.end)))
-                else:
-                    feature_indicies.append(indx)
-        for indx in sorted(feature_indicies, reverse=True):
-            del rec.features[indx]
+        for match in finditer(str(rec.seq)):
+            buddy_data['+'].append(match.span())
+        # Matches on the reverse complement are mapped straight back onto the forward strand
+        for match in finditer(rev_comp):
+            buddy_data['-'].append((seq_len - match.end(), seq_len - match.start()))
+
+        if include_feature:
+            for strand, sign in [('+', 1), ('-', -1)]:
+                for start, end in buddy_data[strand]:
+                    rec.features.append(SeqFeature(location=FeatureLocation(start=start, end=end, strand=sign),
+                                                   type='orf', qualifiers=OrderedDict([('added_by', 'SeqBuddy')])))
 
         if include_buddy_data:
             _add_buddy_data(rec, 'find_orfs')
@@ -2043,136 +2844,85 @@ def find_pattern(seqbuddy, *patterns, ambig=False, include_feature=True, include
     """
     # search through sequences for regex matches. For example, to find micro-RNAs
     lowercase(seqbuddy)
-    for pattern in patterns:
-        pattern_backup = str(pattern)
-        if ambig and seqbuddy.alpha == IUPAC.protein:
-            pattern = re.sub("[xX]", "[ARNDCQEGHILKMFPSTWYVX]", pattern)
-            pattern = re.sub("[bB]", "[NDB]", pattern)
-            pattern = re.sub("[zZ]", "[QEZ]", pattern)
-
-        elif ambig and seqbuddy.alpha in [IUPAC.ambiguous_dna or IUPAC.unambiguous_dna]:
-            pattern = re.sub("[kK]", "[GT]", pattern)
-            pattern = re.sub("[mM]", "[AC]", pattern)
-            pattern = re.sub("[rR]", "[AG]", pattern)
-            pattern = re.sub("[yY]", "[CT]", pattern)
-            pattern = re.sub("[sS]", "[CG]", pattern)
-            pattern = re.sub("[wW]", "[AT]", pattern)
-            pattern = re.sub("[bB]", "[CGT]", pattern)
-            pattern = re.sub("[vV]", "[CGA]", pattern)
-            pattern = re.sub("[hH]", "[ACT]", pattern)
-            pattern = re.sub("[dD]", "[AGT]", pattern)
-            pattern = re.sub("[xnXN]", "[ATCG]", pattern)
-
-        elif ambig and seqbuddy.alpha in [IUPAC.ambiguous_rna or IUPAC.unambiguous_rna]:
-            pattern = re.sub("[kK]", "[GU]", pattern)
-            pattern = re.sub("[mM]", "[AC]", pattern)
-            pattern = re.sub("[rR]", "[AG]", pattern)
-            pattern = re.sub("[yY]", "[CU]", pattern)
-            pattern = re.sub("[sS]", "[CG]", pattern)
-            pattern = re.sub("[wW]", "[AU]", pattern)
-            pattern = re.sub("[bB]", "[CGU]", pattern)
-            pattern = re.sub("[vV]", "[CGA]", pattern)
-            pattern = re.sub("[hH]", "[ACU]", pattern)
-            pattern = re.sub("[dD]", "[AGU]", pattern)
-            pattern = re.sub("[xnXN]", "[AUCG]", pattern)
-
-        if ambig:
-            safety_valve = br.SafetyValve()
-            # Strip out any double square brackets
-            while re.search("\[[^[\]]*?\[[^]]*\]", pattern):
-                safety_valve.step("Ambiguous %s regular expression '%s' failed compile." %
-                                  (seqbuddy.alpha, pattern_backup))
-                pattern = re.sub("(\[[^[\]]*?)\[([^]]*)\]", r"\1\2", pattern, count=1)
-
-        for rec in seqbuddy.records:
-            if include_buddy_data:
-                _add_buddy_data(rec, 'find_patterns')
+    patterns = [(str(pattern), _compile_pattern(pattern, seqbuddy.alpha if ambig else None)) for pattern in patterns]
+    for rec in seqbuddy.records:
+        if include_buddy_data:
+            _add_buddy_data(rec, 'find_patterns')
+        seq = str(rec.seq)
+        spans = []
+        for pattern, finditer in patterns:
             indices = []
-            matches = re.finditer(pattern, str(rec.seq), flags=re.IGNORECASE)
-            new_seq = ""
-            last_match = 0
-            for match in matches:
+            for match in finditer(seq):
                 indices.append(match.start())
+                spans.append(match.span())
                 if include_feature:
                     rec.features.append(SeqFeature(location=FeatureLocation(start=match.start(), end=match.end()),
                                                    type='match', strand=+1,
-                                                   qualifiers=OrderedDict([('regex', pattern_backup),
+                                                   qualifiers=OrderedDict([('regex', pattern),
                                                                            ('added_by', 'SeqBuddy')])))
-                if match.start() > 0:
-                    new_seq += str(rec.seq[last_match:match.start()])
-                new_seq += str(rec.seq[match.start():match.end()]).upper()
-                last_match = match.end()
-            new_seq += str(rec.seq[last_match:])
-            rec.seq = Seq(new_seq, alphabet=rec.seq.alphabet)
 
             if include_buddy_data:
                 if not rec.buddy_data['find_patterns']:
-                    rec.buddy_data['find_patterns'] = OrderedDict({pattern_backup: indices})
+                    rec.buddy_data['find_patterns'] = OrderedDict({pattern: indices})
                 else:
-                    rec.buddy_data['find_patterns'][pattern_backup] = indices
+                    rec.buddy_data['find_patterns'][pattern] = indices
+
+        if spans:
+            rec.seq = Seq(_uppercase_spans(seq, spans), alphabet=rec.seq.alphabet)
     return seqbuddy
 
 
 def find_repeats(seqbuddy):
     """
-    Finds sequences with identical IDs or sequences
+    Finds sequences with identical IDs or sequences. Records are indexed on their ID and on the MD5 digest of their
+    sequence in a single pass, so nothing is copied.
     :param seqbuddy: SeqBuddy object
     :return: modified seqbuddy object with three new attributes --> unique_seqs, repeat_ids, and repeat_seqs
     """
     unique_seqs = OrderedDict()
     repeat_ids = OrderedDict()
     repeat_seqs = OrderedDict()
+    digests = {}  # id -> digest, for the records in unique_seqs
+    repeat_digests = {}  # id -> digests, in the same order as the records in repeat_ids
 
     # First find replicate IDs
-    # MD5 hash all sequences as we go for memory efficiency when looking for replicate sequences (below)
-    # Need to work from a copy though, so sequences aren't overwritten
-    seqbuddy_copy = make_copy(seqbuddy)
-    for rec in seqbuddy_copy.records:
-        seq = str(rec.seq).encode("utf-8")
-        seq = md5(seq).hexdigest()
-        rec.seq = Seq(seq)
+    for rec in seqbuddy.records:
+        digest = md5(str(rec.seq).encode("utf-8")).hexdigest()
         if rec.id in repeat_ids:
             repeat_ids[rec.id].append(rec)
+            repeat_digests[rec.id].append(digest)
         elif rec.id in unique_seqs:
-            repeat_ids[rec.id] = [rec]
-            repeat_ids[rec.id].append(unique_seqs[rec.id])
-            del (unique_seqs[rec.id])
+            repeat_ids[rec.id] = [rec, unique_seqs.pop(rec.id)]
+            repeat_digests[rec.id] = [digest, digests.pop(rec.id)]
         else:
             unique_seqs[rec.id] = rec
+            digests[rec.id] = digest
 
     # Then look for replicate sequences
-    flip_uniqe = {}
+    first_ids = {}  # digest -> id of the first record found with it
     del_keys = []
-    for key, value in unique_seqs.items():  # find and remove duplicates in/from the unique list
-        value = str(value.seq)
-        if value not in flip_uniqe:
-            flip_uniqe[value] = [key]
+    for key, digest in digests.items():  # find and remove duplicates in/from the unique list
+        if digest not in first_ids:
+            first_ids[digest] = key
         else:
-            if value not in repeat_seqs:
-                repeat_seqs[value] = [key]
-                repeat_seqs[value] += flip_uniqe[value]
-                if flip_uniqe[value][0] in unique_seqs:
-                    del_keys.append(flip_uniqe[value][0])
+            if digest not in repeat_seqs:
+                repeat_seqs[digest] = [key, first_ids[digest]]
+                del_keys.append(first_ids[digest])
             else:
-                repeat_seqs[value].append(key)
-            del_keys.append(unique_seqs[key].id)
+                repeat_seqs[digest].append(key)
+            del_keys.append(key)
 
     for key in del_keys:
-        if key in unique_seqs:
-            del (unique_seqs[key])
-
-    for key, value in repeat_ids.items():  # find duplicates in the repeat ID list
-        for rep_seq in value:
-            rep_seq = str(rep_seq.seq)
-            if rep_seq not in flip_uniqe:
-                flip_uniqe[rep_seq] = [key]
+        unique_seqs.pop(key, None)
+
+    for key, rep_digests in repeat_digests.items():  # find duplicates in the repeat ID list
+        for digest in rep_digests:
+            if digest not in first_ids:
+                first_ids[digest] = key
+            elif digest not in repeat_seqs:
+                repeat_seqs[digest] = [key, first_ids[digest]]
             else:
-                if rep_seq not in repeat_seqs:
-                    repeat_seqs[rep_seq] = [key]
-                    repeat_seqs[rep_seq] += flip_uniqe[rep_seq]
-
-                else:
-                    repeat_seqs[rep_seq].append(key)
+                repeat_seqs[digest].append(key)
 
     seqbuddy.unique_seqs = unique_seqs
     seqbuddy.repeat_ids = repeat_ids
@@ -2180,8 +2930,20 @@ def find_repeats(seqbuddy):
     return seqbuddy
 
 
+@lru_cache(maxsize=None)
+def _restriction_group(group):
+    """
+    Collect the enzymes in one of the Bio.Restriction groups, minus the RESTRICTION_BLACKLIST. Cached, so the group is
+    only walked once per session.
+    :param group: "commercial" or "all"
+    :return: tuple of RestrictionType enzymes
+    """
+    enzymes = CommOnly if group == "commercial" else AllEnzymes
+    return tuple([res for res in enzymes if str(res) not in RESTRICTION_BLACKLIST])
+
+
 # ToDo: Make sure cut sites are not already in the features list
-def find_restriction_sites(seqbuddy, enzyme_group=(), min_cuts=1, max_cuts=None, quiet=False):
+def find_restriction_sites(seqbuddy, enzyme_group=(), min_cuts=1, max_cuts=None, quiet=False, include_feature=True):
     """
     Finds the restriction sites in the sequences in the SeqBuddy object
     :param seqbuddy: SeqBuddy object
@@ -2189,6 +2951,8 @@ def find_restriction_sites(seqbuddy, enzyme_group=(), min_cuts=1, max_cuts=None,
     :param min_cuts: The minimum cut threshold
     :param max_cuts: The maximum cut threshold
     :param quiet: Suppress stderr
+    :param include_feature: Add a new feature to records for every cut site. Set to False if only the
+                            `restriction_sites` table is needed.
     :return: annotated SeqBuddy object, and a dictionary of restriction sites added as the `restriction_sites` attribute
     """
     if seqbuddy.alpha == IUPAC.protein:
@@ -2205,56 +2969,51 @@ def find_restriction_sites(seqbuddy, enzyme_group=(), min_cuts=1, max_cuts=None,
 
     enzyme_group = list(enzyme_group) if enzyme_group else ["commercial"]
 
-    blacklist = ["AbaSI", "FspEI", "MspJI", "SgeI", "AspBHI", "SgrTI", "YkrI", "BmeDI"]  # highly nonspecific
-    blacklist += ["AjuI", "AlfI", "AloI", "ArsI", "BaeI", "BarI", "BcgI", "BdaI", "BplI", "BsaXI", "Bsp24I", "CjeI",
-                  "CjePI", "CspCI", "FalI", "Hin4I", "NgoAVIII", "NmeDI", "PpiI", "PsrI", "R2_BceSIV", "RdeGBIII",
-                  "SdeOSI", "TstI", "UcoMSI"]  # two-cutting
-    blacklist += ["AlwFI", "AvaIII", "BmgI", "BscGI", "BspGI", "BspNCI", "Cdi630V", "Cgl13032I", "Cgl13032II",
-                  "CjeFIII", "CjeFV", "CjeNII", "CjeP659IV", "CjuI", "CjuII", "DrdII", "EsaSSI", "FinI", "GauT27I",
-                  "HgiEII", "Hpy99XIII", "Hpy99XIV", "Jma19592I", "MjaIV", "MkaDII", "NhaXI", "PenI", "Pfl1108I",
-                  "RdeGBI", "RflFIII", "RlaI", "RpaTI", "SnaI", "Sno506I", "SpoDI", "TssI", "TsuI", "UbaF11I",
-                  "UbaF12I", "UbaF13I", "UbaF14I", "UbaF9I", "UbaPI"]  # non-cutters
-
     batch = RestrictionBatch([])
     for enzyme in enzyme_group:
-        if enzyme == "commercial":
-            for res in CommOnly:
-                if str(res) not in blacklist:
-                    batch.add(res)
-
-        elif enzyme == "all":
-            for res in AllEnzymes:
-                if str(res) not in blacklist:
-                    batch.add(res)
-
+        if enzyme in ["commercial", "all"]:
+            batch.update(_restriction_group(enzyme))
         else:
             try:
                 batch.add(enzyme)
             except ValueError:
                 br._stderr("Warning: %s not a known enzyme\n" % enzyme, quiet=quiet)
+    enzymes = {str(res): res for res in batch}
+
+    def digest(indx):
+        # Enzymes are passed back by name, so the results don't depend on pickling RestrictionType classes
+        analysis = Analysis(batch, seqbuddy.records[indx].seq)
+        return [(str(key), value) for key, value in analysis.with_sites().items()]
+
+    indices = list(range(len(seqbuddy.records)))
+    if len(indices) > 1 and br.usable_cpu_count() > 1:
+        digests = br.run_multicore_function(indices, digest, quiet=True)
+    else:
+        digests = [digest(indx) for indx in indices]
 
     sites = []
-    for rec in seqbuddy.records:
+    for rec, result in zip(seqbuddy.records, digests):
         rec.res_sites = {}
-        analysis = Analysis(batch, rec.seq)
-        result = analysis.with_sites()
-        for key, value in result.items():
+        for key, value in result:
+            key = enzymes[key]
             if key.cut_twice():
                 br._stderr("Warning: Double-cutters not supported.\n", quiet=quiet)
                 pass
             elif min_cuts <= len(value) <= max_cuts:
                 try:
-                    for zyme in value:
-                        cut_start = zyme + key.fst3 - 1
-                        cut_end = zyme + key.fst5 + abs(key.ovhg) - 1
-                        rec.features.append(SeqFeature(FeatureLocation(start=cut_start, end=cut_end), type=str(key)))
+                    cuts = [(zyme + key.fst3 - 1, zyme + key.fst5 + abs(key.ovhg) - 1) for zyme in value]
                 except TypeError:
                     br._stderr("Warning: No-cutters not supported.\n", quiet=quiet)
-                    pass
+                    cuts = []
+                if include_feature:
+                    rec.features += [SeqFeature(FeatureLocation(start=cut_start, end=cut_end), type=str(key))
+                                     for cut_start, cut_end in cuts]
                 rec.res_sites[key] = value
-        rec.res_sites = OrderedDict(sorted(rec.res_sites.items(), key=lambda x: x[0]))
+        # Same order as sorting the RestrictionType classes directly: recognition site size, then name
+        rec.res_sites = OrderedDict(sorted(rec.res_sites.items(), key=lambda x: (x[0].size, str(x[0]))))
         sites.append((rec.id, rec.res_sites))
-    order_features_alphabetically(seqbuddy)
+    if include_feature:
+        order_features_alphabetically(seqbuddy)
     seqbuddy.restriction_sites = sites
     if convert_rna:
         dna2rna(seqbuddy)
@@ -2269,9 +3028,6 @@ def hash_ids(seqbuddy, hash_length=10, r_seed=None):
     :param r_seed: Set the random generator seed value
     :return: The modified SeqBuddy object, with a new attribute `hash_map` added
     """
-    hash_list = []
-    seq_ids = []
-
     try:
         hash_length = int(hash_length)
     except ValueError:
@@ -2280,7 +3036,7 @@ def hash_ids(seqbuddy, hash_length=10, r_seed=None):
     # If a hash_map already exists and fits all the specs, re-apply it.
     if seqbuddy.hash_map and len(seqbuddy.hash_map) == len(seqbuddy):
         # work from a copy, just in case we find an id that doesn't match and we need to start from scratch
-        seqbuddy_copy = make_copy(seqbuddy)
+        seqbuddy_copy = make_copy(seqbuddy, shallow=True)
         re_apply_hash_map = True
         for rec, _hash_id in zip(seqbuddy_copy.records, list(seqbuddy_copy.hash_map.items())):
             if rec.id != _hash_id[1]:
@@ -2301,26 +3057,20 @@ def hash_ids(seqbuddy, hash_length=10, r_seed=None):
                          "Hash length must be increased.")
 
     rand_gen = Random() if not r_seed else Random(r_seed)
-    for i in range(len(seqbuddy)):
-        new_hash = ""
-        seq_ids.append(seqbuddy.records[i].id)
+    chars = string.ascii_letters + string.digits
+    hash_map = OrderedDict()
+    for rec in seqbuddy.records:
         while True:
-            chars = string.ascii_letters + string.digits
             new_hash = "".join([rand_gen.choice(chars) for _ in range(hash_length)])
-            if new_hash in hash_list:
-                continue
-            else:
-                hash_list.append(new_hash)
+            if new_hash not in hash_map:
                 break
-        if re.match(seqbuddy.records[i].id, seqbuddy.records[i].description):
-            seqbuddy.records[i].description = seqbuddy.records[i].description[len(seqbuddy.records[i].id) + 1:]
+        hash_map[new_hash] = rec.id
+        if rec.description.startswith(rec.id):
+            rec.description = rec.description[len(rec.id) + 1:]
 
-        seqbuddy.records[i].id = new_hash
-        seqbuddy.records[i].name = new_hash
+        rec.id = new_hash
+        rec.name = new_hash
 
-    hash_map = OrderedDict()
-    for indx, _hash in enumerate(hash_list):
-        hash_map[hash_list[indx]] = seq_ids[indx]
     seqbuddy.hash_map = hash_map
     return seqbuddy
 
@@ -2500,7 +3250,7 @@ def map_features_nucl2prot(nuclseqbuddy, protseqbuddy, mode="key", quiet=False):
                             "not %s" % type(feature.location))  # This should be un-reachable because of clean_seq call
         return feature
 
-    prot_copy, nucl_copy = make_copy(protseqbuddy), make_copy(nuclseqbuddy)
+    prot_copy, nucl_copy = make_copy(protseqbuddy, shallow=True), make_copy(nuclseqbuddy, shallow=True)
     clean_seq(prot_copy, skip_list="*")
     clean_seq(nucl_copy)
 
@@ -2586,7 +3336,7 @@ def map_features_prot2nucl(protseqbuddy, nuclseqbuddy, mode="key", quiet=False):
                             "not %s" % type(feature.location))  # This should be un-reachable because of clean_seq call
         return feature
 
-    prot_copy, nucl_copy = make_copy(protseqbuddy), make_copy(nuclseqbuddy)
+    prot_copy, nucl_copy = make_copy(protseqbuddy, shallow=True), make_copy(nuclseqbuddy, shallow=True)
     clean_seq(prot_copy, skip_list="*")
     clean_seq(nucl_copy)
 
@@ -2716,10 +3466,10 @@ def molecular_weight(seqbuddy):
     aa_dict = amino_acid_weights
     if seqbuddy.alpha == IUPAC.protein:
         aa_dict = amino_acid_weights
-    elif seqbuddy.alpha in [IUPAC.ambiguous_dna or IUPAC.unambiguous_dna]:
+    elif seqbuddy.alpha in [IUPAC.ambiguous_dna, IUPAC.unambiguous_dna]:
         aa_dict = deoxynucleotide_weights
         dna = True
-    elif seqbuddy.alpha in [IUPAC.ambiguous_rna or IUPAC.unambiguous_rna]:
+    elif seqbuddy.alpha in [IUPAC.ambiguous_rna, IUPAC.unambiguous_rna]:
         aa_dict = deoxyribonucleotide_weights
     for rec in seqbuddy.records:
         rec.mass_ds = 0
@@ -2732,14 +3482,19 @@ def molecular_weight(seqbuddy):
                 rec.mass_ds += 157.9  # molecular weight of the 5' triphosphate in dsDNA
             else:
                 rec.mass_ss += 159.0  # molecular weight of a 5' triphosphate in ssRNA
-        for indx, value in enumerate(str(rec.seq).upper()):
-            try:
-                rec.mass_ss += aa_dict[value]
-                if dna:
-                    rec.mass_ds += aa_dict[value] + deoxynucleotide_weights[deoxynucleotide_compliments[value]]
-            except KeyError:
-                raise KeyError("Invalid residue '{0}' in record {1}. '{0}' is not valid a valid character in "
-                               "{2}.".format(value, rec.id, str(seqbuddy.alpha)))
+
+        seq = str(rec.seq).upper()
+        counts = _residue_counts(seq)
+        invalid = [residue for residue in counts if residue not in aa_dict]
+        if invalid:
+            raise KeyError("Invalid residue '{0}' in record {1}. '{0}' is not valid a valid character in "
+                           "{2}.".format(min(invalid, key=seq.index), rec.id, str(seqbuddy.alpha)))
+
+        for residue, count in counts.items():
+            rec.mass_ss += aa_dict[residue] * count
+            if dna:
+                rec.mass_ds += (aa_dict[residue] +
+                                deoxynucleotide_weights[deoxynucleotide_compliments[residue]]) * count
         output['masses_ss'].append(round(rec.mass_ss, 3))
 
         qualifiers = OrderedDict()
@@ -2749,7 +3504,7 @@ def molecular_weight(seqbuddy):
             qualifiers["ssDNA_value"] = round(rec.mass_ss, 3)
             qualifiers["dsDNA_value"] = round(rec.mass_ds, 3)
             output['masses_ds'].append(round(rec.mass_ds, 3))
-        elif seqbuddy.alpha in [IUPAC.ambiguous_rna or IUPAC.unambiguous_rna]:
+        elif seqbuddy.alpha in [IUPAC.ambiguous_rna, IUPAC.unambiguous_rna]:
             qualifiers["ssRNA_value"] = round(rec.mass_ss, 3)
         output['ids'].append(rec.id)
         mw_feature = SeqFeature(location=FeatureLocation(start=1, end=len(rec.seq)), type='mw', qualifiers=qualifiers)
@@ -2876,6 +3631,61 @@ def order_ids_randomly(seqbuddy, r_seed=None):
     return seqbuddy
 
 
+def pairwise_identity(seqbuddy, kmer_size=None, band_width=16, min_hits=2, max_processes=0):
+    """
+    BLAST-free all-by-all comparison of the sequences. Pairs that share at least min_hits k-mers on roughly the same
+    diagonal are aligned locally within a band around that diagonal (see _banded_align()); everything else is
+    reported as having no hit. Scores use BLOSUM62 (11/1 gaps) for protein and +2/-3 (5/2 gaps) for nucleotides, and
+    are converted to bit scores and blast2seq style E-values, so the output can be used anywhere bl2seq() output is.
+    :param seqbuddy: SeqBuddy object
+    :param kmer_size: Word size used by the prefilter (default 3 for protein and 8 for nucleotide)
+    :param band_width: Number of diagonals on either side of the k-mer diagonal to include in the alignment
+    :param min_hits: Minimum number of shared k-mers in the band before a pair gets aligned
+    :param max_processes: Number of CPUs to use (0 = br.usable_cpu_count())
+    :return: OrderedDict of results dict[key][matches], where matches are [%_ident, length, evalue, bit_score]
+    """
+    # Remove any gaps
+    seqbuddy = clean_seq(seqbuddy, skip_list=["*"])
+    make_ids_unique(seqbuddy, sep="-")
+
+    scoring = _pairwise_scoring(seqbuddy.alpha == IUPAC.protein)
+    kmer_size = kmer_size if kmer_size else scoring["kmer_size"]
+    encoded = [scoring["lookup"][np.frombuffer(str(rec.seq).encode("ascii", "replace"), dtype=np.uint8)]
+               for rec in seqbuddy.records]
+    kmers = [_kmer_index(seq, kmer_size, len(scoring["alphabet"])) for seq in encoded]
+
+    def align_to_previous(query_indx):
+        _results = [(0.0, 0, 0.0, 0.0)] * query_indx
+        candidates, diagonals = [], []
+        for subj_indx in range(query_indx):
+            diagonal = _kmer_diagonal(kmers[query_indx], kmers[subj_indx], band_width, min_hits)
+            if diagonal is not None:
+                candidates.append(subj_indx)
+                diagonals.append(diagonal)
+        if not candidates:
+            return _results
+
+        scores, identities, lengths = _banded_align([encoded[query_indx]] * len(candidates),
+                                                    [encoded[indx] for indx in candidates], diagonals, band_width,
+                                                    scoring)
+        for subj_indx, score, ident, length in zip(candidates, scores, identities, lengths):
+            if not score:
+                continue
+            bit_score = (scoring["lambda"] * score - log(scoring["k"])) / log(2)
+            evalue = max(len(encoded[subj_indx]) * len(encoded[query_indx]) * 2 ** -bit_score, 1e-180)
+            _results[subj_indx] = (round(100 * ident / length, 3), int(length), float("%.2g" % evalue),
+                                   round(bit_score, 1))
+        return _results
+
+    results = br.run_multicore_function(range(len(encoded)), align_to_previous, max_processes=max_processes,
+                                        quiet=True)
+    output_list = []
+    for query_indx, matches in enumerate(results):
+        for subj_indx, match in enumerate(matches):
+            output_list.append([seqbuddy.records[query_indx].id, seqbuddy.records[subj_indx].id] + list(match))
+    return _pairwise_output_dict(output_list)
+
+
 class PrositeScan(object):
     """
     Search for PROSITE scan motifs in sequences (via REST service)
@@ -2919,8 +3729,12 @@ class PrositeScan(object):
         req_h.close()
         return result
 
-    def _mc_run_prosite(self, _rec, args):
-        out_file_path, lock = args
+    def _mc_run_prosite(self, _rec):
+        """
+        Scan a single record against PROSITE
+        :param _rec: Protein SeqRecord
+        :return: The record, with PROSITE features, as a GenBank formatted string
+        """
         if not self.user_deets["email"] or not re.search(r".+@.+\..+", self.user_deets["email"]):
             email = "buddysuite@gmail.com"
         else:
@@ -2954,16 +3768,11 @@ class PrositeScan(object):
         temp_seq = SeqBuddy([_rec], out_format="gb")
         temp_seq.records[0].features = feature_list
         temp_seq = order_features_by_position(temp_seq)
-
-        with lock:
-            with open(out_file_path, "a", encoding="utf-8") as out_file:
-                out_file.write("%s\n" % str(temp_seq))
-        return
+        return "%s\n" % str(temp_seq)
 
     def run(self):
         self._rest_request(self.base_url)  # Confirm internet connection prior to multi-core loop
 
-        temp_file = br.TempFile()
         hash_ids(self.seqbuddy)
         clean_seq(self.seqbuddy, skip_list="*")  # Clean once to make sure no wonky characters (no alignments)
         seqbuddy_copy = make_copy(self.seqbuddy)
@@ -2971,18 +3780,10 @@ class PrositeScan(object):
         if self.seqbuddy.alpha != IUPAC.protein:
             translate_cds(self.seqbuddy)
 
-        br.run_multicore_function(self.seqbuddy.records, self._mc_run_prosite,
-                                  [temp_file.path, Lock()], out_type=sys.stderr, quiet=self.quiet)
-        self.seqbuddy = SeqBuddy(temp_file.path)
-        new_records = []
-        for rec in seqbuddy_copy.records:
-            for indx, rec2 in enumerate(self.seqbuddy.records):
-                if rec.id == rec2.id:
-                    new_records.append(rec2)
-                    del self.seqbuddy.records[indx]
-                    break
-
-        self.seqbuddy.records = new_records
+        # Results come back in record order, so no need to re-sort them against seqbuddy_copy
+        results = br.run_multicore_function(self.seqbuddy.records, self._mc_run_prosite, out_type=sys.stderr,
+                                            quiet=self.quiet, pool="thread", max_processes=br.usable_cpu_count())
+        self.seqbuddy = SeqBuddy("".join(results), in_format="gb")
 
         find_pattern(seqbuddy_copy, "\*", include_feature=False)
         for indx, rec in enumerate(seqbuddy_copy.records):
@@ -3044,27 +3845,20 @@ def pull_record_ends(seqbuddy, amount):
     return seqbuddy
 
 
-def pull_recs(seqbuddy, regex, description=False):
+def pull_recs(seqbuddy, regex, description=False, exact=False):
     """
     Retrieves sequences with names/IDs matching a search pattern
     :param seqbuddy: SeqBuddy object
     :param regex: List of regex expressions or single regex
     :type regex: str list
     :param description: Allow search in description string
+    :param exact: Treat regex as a list of literal IDs (much faster for long lists)
     :return: The modified SeqBuddy object
     """
-    if type(regex) == str:
-        regex = [regex]
-    for indx, pattern in enumerate(regex):
-        regex[indx] = ".*" if pattern == "*" else pattern
-
-    regex = "|".join(regex)
+    matcher = br.record_matcher(regex, exact)
     matched_records = []
     for rec in seqbuddy.records:
-        if re.search(regex, rec.id) or re.search(regex, rec.name):
-            matched_records.append(rec)
-            continue
-        if description and (re.search(regex, rec.description) or re.search(regex, str(rec.annotations))):
+        if matcher(rec.id, rec.name) or (description and matcher(rec.description, str(rec.annotations))):
             matched_records.append(rec)
     seqbuddy.records = matched_records
     return seqbuddy
@@ -3094,18 +3888,22 @@ def pull_recs_with_feature(seqbuddy, regex):
     return seqbuddy
 
 
-def purge(seqbuddy, threshold):
+def purge(seqbuddy, threshold, backend="blast"):
     """
     Deletes highly similar sequences
     ToDo: Implement a way to return a certain # of seqs (i.e. auto-determine threshold)
         - This would probably be a different flag in the UI
     :param seqbuddy: SeqBuddy object
     :param threshold: Sets the similarity threshold
+    :param backend: "blast" to score pairs with bl2seq(), or "python" to use pairwise_identity()
     :return: The purged SeqBuddy object
     """
+    if backend not in ["blast", "python"]:
+        raise ValueError("The purge backend must be either 'blast' or 'python'")
     keep_dict = {}
     purged = []
-    for query_id, match_list in bl2seq(seqbuddy).items():
+    pairwise_scores = bl2seq(seqbuddy) if backend == "blast" else pairwise_identity(seqbuddy)
+    for query_id, match_list in pairwise_scores.items():
         if query_id in purged:
             continue
         else:
@@ -3264,98 +4062,103 @@ def shuffle_seqs(seqbuddy, r_seed=None):
     return seqbuddy
 
 
-def translate6frames(seqbuddy):
+@lru_cache(maxsize=None)
+def _codon_lookup(table=1):
     """
-    Translates a nucleotide sequence into a protein sequence across all six reading frames.
-    :param seqbuddy: SeqBuddy object
-    :return: The translated SeqBuddy object
+    Build the lookup arrays that _translate_seq() uses for a genetic code. Every residue is reduced to a code from 0-5
+    (A, C, G, T/U, gap, anything else), so each codon is indexed by a single number from 0-215.
+    :param table: NCBI genetic code, either as an id or a name (e.g., 2 or 'Vertebrate Mitochondrial')
+    :return: Tuple --> (residue codes indexed by byte value, amino acid bytes indexed by codon code)
     """
-    frame1, frame2, frame3 = make_copy(seqbuddy), make_copy(seqbuddy), make_copy(seqbuddy)
-    seqbuddy = reverse_complement(seqbuddy)
+    try:
+        codon_table = CodonTable.unambiguous_dna_by_id[int(table)]
+    except (ValueError, KeyError):
+        if table not in CodonTable.unambiguous_dna_by_name:
+            raise ValueError("Unknown genetic code table '%s'" % table)
+        codon_table = CodonTable.unambiguous_dna_by_name[table]
 
-    rframe1, rframe2, rframe3 = make_copy(seqbuddy), make_copy(seqbuddy), make_copy(seqbuddy)
+    residue_codes = np.full(256, 5, dtype=np.uint8)
+    for code, residues in enumerate(["Aa", "Cc", "Gg", "TtUu", "-"]):
+        for residue in residues:
+            residue_codes[ord(residue)] = code
 
-    frame2 = select_frame(frame2, 2, add_metadata=False)
-    frame3 = select_frame(frame3, 3, add_metadata=False)
-    rframe2 = select_frame(rframe2, 2, add_metadata=False)
-    rframe3 = select_frame(rframe3, 3, add_metadata=False)
+    amino_acids = np.full(216, ord("N"), dtype=np.uint8)
+    for indx, codon in enumerate([i + j + k for i in "ACGT-*" for j in "ACGT-*" for k in "ACGT-*"]):
+        if codon in codon_table.forward_table:
+            amino_acids[indx] = ord(codon_table.forward_table[codon])
+        elif codon in codon_table.stop_codons:
+            amino_acids[indx] = ord("*")
+        elif codon.count("-") >= 2 and "*" not in codon:
+            amino_acids[indx] = ord("-")
+    return residue_codes, amino_acids
 
-    frame1 = translate_cds(frame1, quiet=True)
-    frame2 = translate_cds(frame2, quiet=True)
-    frame3 = translate_cds(frame3, quiet=True)
-    rframe1 = translate_cds(rframe1, quiet=True)
-    rframe2 = translate_cds(rframe2, quiet=True)
-    rframe3 = translate_cds(rframe3, quiet=True)
 
-    output = []
-    for i in range(len(frame1)):
-        frame1.records[i].id = "%s_f1" % frame1.records[i].id
-        frame2.records[i].id = "%s_f2" % frame2.records[i].id
-        frame3.records[i].id = "%s_f3" % frame3.records[i].id
-        rframe1.records[i].id = "%s_rf1" % rframe1.records[i].id
-        rframe2.records[i].id = "%s_rf2" % rframe2.records[i].id
-        rframe3.records[i].id = "%s_rf3" % rframe3.records[i].id
+def _translate_seq(seq, table=1):
+    """
+    Translate a nucleotide sequence string in a single vectorized pass. Any trailing partial codon is dropped,
+    codons with ambiguous residues become 'N', and codons with two or more gaps become '-'.
+    :param seq: Nucleotide sequence string (DNA or RNA, any case)
+    :param table: NCBI genetic code id or name
+    :return: Amino acid sequence string
+    """
+    residue_codes, amino_acids = _codon_lookup(table)
+    codes = residue_codes[np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)]
+    codes = codes[:len(codes) - len(codes) % 3].reshape(-1, 3)
+    return amino_acids[codes[:, 0] * 36 + codes[:, 1] * 6 + codes[:, 2]].tobytes().decode()
 
-        output += [frame1.records[i], frame2.records[i], frame3.records[i],
-                   rframe1.records[i], rframe2.records[i], rframe3.records[i]]
 
-    seqbuddy = SeqBuddy(output, out_format=seqbuddy.out_format)
+def translate6frames(seqbuddy, table=1):
+    """
+    Translates a nucleotide sequence into a protein sequence across all six reading frames.
+    :param seqbuddy: SeqBuddy object
+    :param table: NCBI genetic code id or name (e.g., 2 or 'Vertebrate Mitochondrial')
+    :return: The translated SeqBuddy object
+    """
+    _codon_lookup(table)  # Fail on a bad genetic code before doing any work
+    forward = seqbuddy
+    reverse = reverse_complement(make_copy(seqbuddy, shallow=True))
+
+    frames = []
+    for strand, label in [(forward, "f"), (reverse, "rf")]:
+        for frame in [1, 2, 3]:
+            shifted = make_copy(strand, shallow=True)
+            if frame != 1:
+                select_frame(shifted, frame, add_metadata=False)
+            translate_cds(shifted, quiet=True, table=table)
+            for rec in shifted.records:
+                rec.id = "%s_%s%s" % (rec.id, label, frame)
+            frames.append(shifted.records)
+
+    output = [rec for recs in zip(*frames) for rec in recs]
+    seqbuddy = SeqBuddy(output, out_format=seqbuddy.out_format, alpha=IUPAC.protein)
     return seqbuddy
 
 
-def translate_cds(seqbuddy, quiet=False, alignment=False):
+def translate_cds(seqbuddy, quiet=False, alignment=False, table=1):
     """
     Translates a nucleotide sequence into a protein sequence.
     :param seqbuddy: SeqBuddy object
     :param quiet: Suppress the errors thrown by translate(cds=True)
     :param alignment: If the incoming sequence has gaps you want maintained, set to True. Otherwise they will be cleaned
+    :param table: NCBI genetic code id or name (e.g., 2 or 'Vertebrate Mitochondrial')
     :return: The translated SeqBuddy object
     """
     if seqbuddy.alpha == IUPAC.protein:
         raise TypeError("Protein sequence cannot be translated.")
 
-    codon_dict = {'---': '-', '--A': '-', '--C': '-', '--G': '-', '--T': '-', '-A-': '-', '-C-': '-', '-G-': '-',
-                  '-T-': '-', 'A--': '-', 'AAA': 'K', 'AAC': 'N', 'AAG': 'K', 'AAT': 'N', 'ACA': 'T', 'ACC': 'T',
-                  'ACG': 'T', 'ACT': 'T', 'AGA': 'R', 'AGC': 'S', 'AGG': 'R', 'AGT': 'S', 'ATA': 'I', 'ATC': 'I',
-                  'ATG': 'M', 'ATT': 'I', 'C--': '-', 'CAA': 'Q', 'CAC': 'H', 'CAG': 'Q', 'CAT': 'H', 'CCA': 'P',
-                  'CCC': 'P', 'CCG': 'P', 'CCT': 'P', 'CGA': 'R', 'CGC': 'R', 'CGG': 'R', 'CGT': 'R', 'CTA': 'L',
-                  'CTC': 'L', 'CTG': 'L', 'CTT': 'L', 'G--': '-', 'GAA': 'E', 'GAC': 'D', 'GAG': 'E', 'GAT': 'D',
-                  'GCA': 'A', 'GCC': 'A', 'GCG': 'A', 'GCT': 'A', 'GGA': 'G', 'GGC': 'G', 'GGG': 'G', 'GGT': 'G',
-                  'GTA': 'V', 'GTC': 'V', 'GTG': 'V', 'GTT': 'V', 'T--': '-', 'TAA': '*', 'TAC': 'Y', 'TAG': '*',
-                  'TAT': 'Y', 'TCA': 'S', 'TCC': 'S', 'TCG': 'S', 'TCT': 'S', 'TGA': '*', 'TGC': 'C', 'TGG': 'W',
-                  'TGT': 'C', 'TTA': 'L', 'TTC': 'F', 'TTG': 'L', 'TTT': 'F'}
-
+    _codon_lookup(table)  # Fail on a bad genetic code before touching the sequences
     if not alignment:
         clean_seq(seqbuddy)
 
-    if seqbuddy.alpha == IUPAC.ambiguous_rna:
-        rna2dna(seqbuddy)
-
-    translated_sb = make_copy(seqbuddy)
-    uppercase(translated_sb)
+    translated_sb = make_copy(seqbuddy, shallow=True)
     for rec in translated_sb.records:
         if rec.seq.alphabet == IUPAC.protein:
             raise TypeError("Record %s is protein." % rec.id)
-
-        new_seq = [""] * ceil(len(rec) / 3)
-        new_seq_indx = 0
-        old_seq = str(rec.seq)
-        for codon in [old_seq[::1][i:i + 3][::1] for i in range(0, len(old_seq), 3)][::1]:
-            if len(codon) == 3:
-                if codon in codon_dict:
-                    new_seq[new_seq_indx] = codon_dict[codon]
-                else:
-                    new_seq[new_seq_indx] = "N"
-                new_seq_indx += 1
-
-        new_seq = "".join(new_seq) if new_seq and new_seq[-1] != "" else "".join(new_seq[:-1])
-        new_seq = Seq(new_seq, IUPAC.protein)
-        rec.seq = new_seq
+        rec.seq = Seq(_translate_seq(str(rec.seq), table), IUPAC.protein)
         rec.features = []
 
     map_features_nucl2prot(seqbuddy, translated_sb, mode="list", quiet=quiet)
-    for indx, rec in enumerate(translated_sb.records):
-        seqbuddy.records[indx] = rec
+    seqbuddy.records = translated_sb.records
     seqbuddy.alpha = IUPAC.protein
     return seqbuddy
 
@@ -3498,13 +4301,14 @@ def transmembrane_domains(seqbuddy, job_ids=None, quiet=False, keep_temp=None):
 
     # Need to match up all hashed ids in seqbuddy_copy for downstream stuff
     records = []
+    records_by_id = OrderedDict()
+    for rec in seqbuddy_copy.records:
+        records_by_id.setdefault(rec.id, []).append(rec)
     for _hash, rec_id in hash_map.items():
-        for indx, rec in enumerate(seqbuddy_copy.records):
-            if rec.id == rec_id:
-                rec.id = _hash
-                records.append(rec)
-                del seqbuddy_copy.records[indx]
-                break
+        if records_by_id.get(rec_id):
+            rec = records_by_id[rec_id].pop(0)
+            rec.id = _hash
+            records.append(rec)
     seqbuddy_copy.records = records
 
     # Stops are converted to Xs by TOPCONS, so find them now for later replacement
@@ -3630,12 +4434,12 @@ def transmembrane_domains(seqbuddy, job_ids=None, quiet=False, keep_temp=None):
 
     if keep_temp:
         printer.write("Preparing TOPCONS files to be saved")
+        restore = br.bulk_replacer(hash_map, substrings=True)
         for _root, dirs, files in br.walklevel(temp_dir.path):
             for file in files:
                 with open("%s%s%s" % (_root, os.path.sep, file), "r", encoding="utf-8") as ifile:
                     contents = ifile.read()
-                for _hash, _id in hash_map.items():
-                    contents = re.sub(_hash, _id, contents)
+                contents = restore(contents)
                 with open("%s%s%s" % (_root, os.path.sep, file), "w", encoding="utf-8") as ofile:
                     ofile.write(contents)
 
@@ -3659,8 +4463,7 @@ def transmembrane_domains(seqbuddy, job_ids=None, quiet=False, keep_temp=None):
 
         seqbuddy = merge(seqbuddy_copy, seqbuddy)
 
-    for _hash, seq_id in hash_map.items():
-        rename(seqbuddy, _hash, seq_id)
+    bulk_rename(seqbuddy, hash_map, substrings=True)
 
     printer.write("************** Complete **************")
     printer.new_line(2)
@@ -3735,6 +4538,22 @@ def argparse_init():
     if in_args.guess_alphabet or in_args.guess_format:
         return in_args, SeqBuddy
 
+    if in_args.stream:
+        if len(in_args.sequence) > 1:
+            br._stderr("Error: Only a single input can be processed in --stream mode.\n")
+            sys.exit()
+        seq_set = in_args.sequence[0]
+        if isinstance(seq_set, TextIOWrapper) and seq_set.buffer.raw.isatty():
+            br._stderr("Warning: No input detected so SeqBuddy is aborting...\n"
+                       "For more information, try:\n%s --help\n" % sys.argv[0])
+            sys.exit()
+        try:
+            seqbuddy = SeqBuddyStream(seq_set, in_args.in_format, in_args.out_format, in_args.alpha)
+        except (br.GuessError, TypeError) as e:
+            br._stderr("%s: %s\n" % (e.__class__.__name__, e), in_args.quiet)
+            sys.exit()
+        return in_args, seqbuddy
+
     try:
         for seq_set in in_args.sequence:
             if isinstance(seq_set, TextIOWrapper) and seq_set.buffer.raw.isatty():
@@ -3760,10 +4579,11 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
             pass
 
         elif in_args.in_place:
+            # Build the full output before touching the input file, so a failure can't leave it truncated
             _in_place(str(_seqbuddy), in_args.sequence[0])
 
         else:
-            br._stdout("{0}\n".format(str(_seqbuddy).rstrip()))
+            _seqbuddy.write_to(sys.stdout)
 
     def _in_place(_output, file_path):
         if not os.path.exists(file_path):
@@ -3800,6 +4620,143 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
         usage.save()
         sys.exit()
 
+    # ################################################ STREAMING MODE ################################################ #
+    if type(seqbuddy) == SeqBuddyStream:
+        tools = [flag for flag in br.sb_flags if getattr(in_args, flag)]
+        tool = "stream" if not tools else tools[0]
+        unstreamable = [flag for flag in tools if flag not in STREAM_TOOLS]
+        if unstreamable:
+            _raise_error(AttributeError("'%s' cannot be run in --stream mode. Streamable tools: %s"
+                                        % (unstreamable[0], ", ".join(STREAM_TOOLS))), tool)
+            return
+        if in_args.in_place:
+            _raise_error(AttributeError("The -i flag cannot be used in --stream mode."), tool)
+            return
+
+        if in_args.clean_seq:
+            args = in_args.clean_seq[0]
+            ambig = True
+            rep_char = "N"
+            lower_args = [str(x).lower() for x in args]
+            if "strict" in lower_args:
+                ambig = False
+                del args[lower_args.index("strict")]
+            if args and args[0]:
+                rep_char = args[0][0]
+            seqbuddy.pipe(clean_seq, ambiguous=ambig, rep_char=rep_char)
+
+        if in_args.delete_large:
+            seqbuddy.pipe(delete_large, in_args.delete_large)
+
+        repeat_columns = 1
+        if in_args.delete_repeats:
+            scope = "all"
+            for arg in in_args.delete_repeats[0] or []:
+                try:
+                    repeat_columns = int(arg)
+                except ValueError:
+                    for scope_option in ["all", "ids", "seqs"]:
+                        scope = scope_option if scope_option.startswith(arg) else scope
+            seqbuddy.delete_repeats(scope)
+
+        if in_args.delete_small:
+            seqbuddy.pipe(delete_small, in_args.delete_small)
+
+        if in_args.lowercase:
+            seqbuddy.pipe(lowercase)
+
+        if in_args.pull_records:
+            description = "full" in in_args.pull_records
+            exact = "exact" in in_args.pull_records
+            search_terms = []
+            for arg in in_args.pull_records:
+                if arg in ["full", "exact"]:
+                    continue
+                if os.path.isfile(arg):
+                    with open(arg, "r", encoding="utf-8") as ifile:
+                        for line in ifile:
+                            search_terms.append(line.strip())
+                else:
+                    search_terms.append(arg)
+            search_terms = search_terms if exact else br.clean_regex(search_terms, in_args.quiet)
+            if search_terms:
+                seqbuddy.pipe(pull_recs, search_terms, description, exact)
+
+        if in_args.rename_ids:
+            args = in_args.rename_ids[0]
+            if args and os.path.isfile(args[0]) and all(arg == "store" for arg in args[1:]):
+                try:
+                    mapping = br.read_rename_table(args[0])
+                except ValueError as e:
+                    _raise_error(e, tool)
+                    return
+                seqbuddy.pipe(bulk_rename, mapping, store_old_id="store" in args)
+            else:
+                if len(args) < 2:
+                    _raise_error(AttributeError("Please provide at least a query and a replacement string"), tool)
+                    return
+                query, replace = args[0:2]
+                if not br.clean_regex(query, in_args.quiet):
+                    _raise_error(ValueError("Malformed regular expression."), tool)
+                    return
+                args = args[2:]
+                store = "store" in args
+                args = [arg for arg in args if arg != "store"]
+                try:
+                    num = 0 if not args else int(args[0])
+                except ValueError:
+                    _raise_error(ValueError("Max replacements argument must be an integer"), tool)
+                    return
+                seqbuddy.pipe(rename, query=query, replace=replace, num=num, store_old_id=store)
+
+        if in_args.screw_formats:
+            if in_args.screw_formats.lower() not in STREAM_OUT_FORMATS:
+                _raise_error(TypeError("Format '%s' cannot be streamed. Streaming supports: %s"
+                                       % (in_args.screw_formats, ", ".join(STREAM_OUT_FORMATS))), tool)
+                return
+            seqbuddy.out_format = in_args.screw_formats.lower()
+
+        if in_args.translate:
+            if seqbuddy.alpha == IUPAC.protein:
+                _raise_error(TypeError("Nucleic acid sequence required, not protein."), tool)
+                return
+            table = in_args.translate[0] if type(in_args.translate) == list and in_args.translate[0] else 1
+            try:
+                _codon_lookup(table)
+            except ValueError as e:
+                _raise_error(e, tool)
+                return
+            seqbuddy.pipe(translate_cds, quiet=in_args.quiet, table=table)
+
+        if in_args.uppercase:
+            seqbuddy.pipe(uppercase)
+
+        try:
+            if in_args.test:
+                for _ in seqbuddy.chunks():
+                    pass
+                br._stderr("*** Test passed ***\n", in_args.quiet)
+            else:
+                seqbuddy.write_to(sys.stdout)
+        except TypeError as e:
+            _raise_error(e, tool, ["cannot be streamed", "Record .* is protein."])
+
+        if in_args.delete_repeats:
+            if seqbuddy.repeat_ids or seqbuddy.repeat_seqs:
+                br._stderr("# ################################################################ #\n", in_args.quiet)
+                for label, rep_ids in [("ids", seqbuddy.repeat_ids), ("sequence", seqbuddy.repeat_seqs)]:
+                    if rep_ids:
+                        br._stderr("# Records with duplicate %s deleted\n" % label, in_args.quiet)
+                        for indx in range(0, len(rep_ids), repeat_columns):
+                            br._stderr("%s\n" % "\t".join(rep_ids[indx:indx + repeat_columns]), in_args.quiet)
+                        br._stderr("\n", in_args.quiet)
+                br._stderr("# ################################################################ #\n\n",
+                           in_args.quiet)
+            else:
+                br._stderr("No duplicate records found\n", in_args.quiet)
+        _exit(tool)
+        return
+
     # ############################################## COMMAND LINE LOGIC ############################################## #
     # Add feature
     if in_args.annotate:
@@ -3870,11 +4827,11 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
     if in_args.back_translate:
         if in_args.back_translate[0]:  # All this logic is to determine what mode is being used by the UI
             in_args.back_translate = in_args.back_translate[0]
-            in_args.back_translate = [i.upper() for i in in_args.back_translate]
-            mode = [i for i in in_args.back_translate if i in ['RANDOM', 'R', "OPTIMIZED", "O"]]
+            mode = [i.upper() for i in in_args.back_translate if i.upper() in ['RANDOM', 'R', "OPTIMIZED", "O"]]
             mode = "RANDOM" if len(mode) == 0 else mode[0]
-            species = [i for i in in_args.back_translate if i in ['HUMAN', 'H', "MOUSE", "M",
-                                                                  "YEAST", "Y", "ECOLI", "E"]]
+            # Species can also be the path to a custom codon usage table, so don't change its case
+            species = [i for i in in_args.back_translate if i.upper() in ['HUMAN', 'H', "MOUSE", "M", "YEAST", "Y",
+                                                                          "ECOLI", "E"] or os.path.isfile(i)]
             species = None if len(species) == 0 else species[0]
         else:
             mode = "RANDOM"
@@ -3932,6 +4889,35 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
             _raise_error(e, "blast")
         _exit("blast")
 
+    # CD-HIT
+    if in_args.cd_hit:
+        args = in_args.cd_hit[0]
+        threshold, word_size = 0, None
+        try:
+            threshold = float(args[0])
+            word_size = int(args[1]) if len(args) > 1 else None
+        except ValueError:
+            _raise_error(ValueError("The cd_hit threshold must be a number, and the word size an integer."),
+                         "cd_hit")
+            return
+        try:
+            cd_hit(seqbuddy, threshold, word_size=word_size)
+        except ValueError as e:
+            _raise_error(e, "cd_hit", "must be between 0 and 1")
+            return
+
+        br._stderr("### Cluster membership ###\n", in_args.quiet)
+        for indx, rec in enumerate(seqbuddy.records):
+            br._stderr("%s\n" % rec.id, in_args.quiet)
+            if rec.buddy_data["cluster"]:
+                br._stderr("%s\n" % ", ".join(rec.buddy_data["cluster"]), in_args.quiet)
+            if indx + 1 != len(seqbuddy.records):
+                br._stderr("\n", in_args.quiet)
+        br._stderr("##########################\n\n", in_args.quiet)
+
+        _print_recs(seqbuddy)
+        _exit("cd_hit")
+
     # Clean Seq
     if in_args.clean_seq:
         args = in_args.clean_seq[0]
@@ -4016,6 +5002,9 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
 
     # Delete records
     if in_args.delete_records:
+        exact = "exact" in in_args.delete_records
+        if exact:
+            del in_args.delete_records[in_args.delete_records.index("exact")]
         try:  # Check to see if the last argument is an integer, which will set number of columns
             if len(in_args.delete_records) == 1:
                 columns = 1
@@ -4034,16 +5023,27 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
             else:
                 search_terms.append(arg)
 
-        search_terms = br.clean_regex(search_terms, in_args.quiet)
+        search_terms = search_terms if exact else br.clean_regex(search_terms, in_args.quiet)
         if not search_terms:  # If all regular expression are malformed, exit out gracefully
             _print_recs(seqbuddy)
             _exit("delete_records")
 
+        # Deleted records are reported pattern by pattern
         deleted_seqs = []
-        for next_pattern in search_terms:
-            deleted_seqs += pull_recs(make_copy(seqbuddy), next_pattern).records
+        if exact:
+            recs_by_id = OrderedDict()
+            for rec in seqbuddy.records:
+                recs_by_id.setdefault(rec.id, []).append(rec)
+                if rec.name != rec.id:
+                    recs_by_id.setdefault(rec.name, []).append(rec)
+            for next_id in search_terms:
+                deleted_seqs += recs_by_id.get(next_id, [])
+        else:
+            for next_pattern in search_terms:
+                matcher = br.record_matcher(next_pattern)
+                deleted_seqs += [rec for rec in seqbuddy.records if matcher(rec.id, rec.name)]
 
-        seqbuddy = delete_records(seqbuddy, search_terms)
+        seqbuddy = delete_records(seqbuddy, search_terms, exact)
 
         if len(deleted_seqs) > 0 and not in_args.quiet:
             counter = 1
@@ -4180,8 +5180,16 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
 
     # Find CpG
     if in_args.find_CpG:
+        args = in_args.find_CpG[0] if type(in_args.find_CpG) == list and in_args.find_CpG[0] else []
+        try:
+            window_size = 200 if not args else int(args[0])
+            cg_threshold, oe_threshold = [float(x) for x in (list(args[1:3]) + [0.5, 0.6][len(args[1:3]):])]
+        except ValueError:
+            _raise_error(ValueError("The find_CpG window size must be an integer, and the thresholds numbers."),
+                         "find_CpG")
+            return
         try:
-            find_cpg(seqbuddy)
+            find_cpg(seqbuddy, window_size, cg_threshold, oe_threshold)
             islands = False
             for rec in seqbuddy.records:
                 if rec.buddy_data["cpgs"]:
@@ -4203,8 +5211,8 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
             _print_recs(seqbuddy)
             _exit("find_CpG")
 
-        except TypeError as e:
-            _raise_error(e, "find_CpG", "DNA sequence required, not protein or RNA.")
+        except (TypeError, ValueError) as e:
+            _raise_error(e, "find_CpG", ["DNA sequence required, not protein or RNA.", "must be positive integers"])
 
     # Find orfs
     if in_args.find_orfs:
@@ -4302,7 +5310,7 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
 
     # Find restriction sites
     if in_args.find_restriction_sites:
-        min_cuts, max_cuts, _enzymes, order = None, None, [], 'position'
+        min_cuts, max_cuts, _enzymes, order, table_only = None, None, [], 'position', False
         if not in_args.out_format:
             seqbuddy.out_format = "gb"
 
@@ -4325,6 +5333,8 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
 
             elif param in ['alpha', 'position']:
                 order = param
+            elif param == 'table':
+                table_only = True
             else:
                 _enzymes.append(param)
 
@@ -4334,13 +5344,17 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
 
         clean_seq(seqbuddy)
         try:
-            find_restriction_sites(seqbuddy, tuple(_enzymes), min_cuts, max_cuts, quiet=in_args.quiet)
+            find_restriction_sites(seqbuddy, tuple(_enzymes), min_cuts, max_cuts, quiet=in_args.quiet,
+                                   include_feature=not table_only)
         except TypeError as e:
             _raise_error(e, "find_restriction_sites")
 
-        br._stderr('# ### Restriction Sites (indexed at cut-site) ### #\n', in_args.quiet)
+        # When only the table is requested it becomes the main output, so send it to stdout instead of stderr
+        write, quiet = (br._stdout, False) if table_only else (br._stderr, in_args.quiet)
+
+        write('# ### Restriction Sites (indexed at cut-site) ### #\n', quiet)
         for tup in seqbuddy.restriction_sites:
-            br._stderr("{0}\n".format(tup[0]), in_args.quiet)
+            write("{0}\n".format(tup[0]), quiet)
             restriction_list = tup[1]
             restriction_list = [[key, value] for key, value in restriction_list.items()]
             restriction_list = sorted(restriction_list, key=lambda l: str(l[0])) if order == 'alpha' else \
@@ -4348,11 +5362,12 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
 
             for _enzyme in restriction_list:
                 cut_sites = [str(x) for x in _enzyme[1]]
-                br._stderr("{0}\t{1}\n".format(_enzyme[0], ", ".join(cut_sites)), in_args.quiet)
+                write("{0}\t{1}\n".format(_enzyme[0], ", ".join(cut_sites)), quiet)
             if tup != seqbuddy.restriction_sites[-1]:
-                br._stderr("\n", in_args.quiet)
-        br._stderr("# ############################################### #\n\n", in_args.quiet)
-        _print_recs(seqbuddy)
+                write("\n", quiet)
+        write("# ############################################### #\n\n", quiet)
+        if not table_only:
+            _print_recs(seqbuddy)
         _exit("find_restriction_sites")
 
     # Group sequences by prefix. I might want to delete this in favour of group_by_regex... Keep them both for now.
@@ -4757,6 +5772,10 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
         else:
             description = False
 
+        exact = "exact" in in_args.pull_records
+        if exact:
+            del in_args.pull_records[in_args.pull_records.index("exact")]
+
         search_terms = []
         for arg in in_args.pull_records:
             if os.path.isfile(arg):
@@ -4766,9 +5785,9 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
             else:
                 search_terms.append(arg)
 
-        search_terms = br.clean_regex(search_terms, in_args.quiet)
+        search_terms = search_terms if exact else br.clean_regex(search_terms, in_args.quiet)
         if search_terms:
-            seqbuddy = pull_recs(seqbuddy, search_terms, description)
+            seqbuddy = pull_recs(seqbuddy, search_terms, description, exact)
         _print_recs(seqbuddy)
         _exit("pull_records")
 
@@ -4791,7 +5810,11 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
 
     # Purge
     if in_args.purge:
-        purge(seqbuddy, in_args.purge)
+        blast_bin = "blastp" if seqbuddy.alpha == IUPAC.protein else "blastn"
+        backend = "blast" if _check_for_blast_bin(blast_bin) and _check_for_blast_bin("makeblastdb") else "python"
+        if backend == "python":
+            br._stderr("BLAST+ not found, so scores are from the built-in pairwise aligner.\n", in_args.quiet)
+        purge(seqbuddy, in_args.purge, backend=backend)
         br._stderr("### Deleted record mapping ###\n", in_args.quiet)
         for indx1, rec in enumerate(seqbuddy.records):
             br._stderr("%s\n" % rec.id, in_args.quiet)
@@ -4812,30 +5835,38 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
     # Renaming
     if in_args.rename_ids:
         args = in_args.rename_ids[0]
-        if len(args) < 2:
-            _raise_error(AttributeError("Please provide at least a query and a replacement string"), "rename_ids")
+        if args and os.path.isfile(args[0]) and all(arg == "store" for arg in args[1:]):
+            try:
+                _print_recs(bulk_rename(seqbuddy, br.read_rename_table(args[0]), store_old_id="store" in args))
+            except ValueError as e:
+                _raise_error(e, "rename_ids", "as a rename table")
+            _exit("rename_ids")
+
+        else:
+            if len(args) < 2:
+                _raise_error(AttributeError("Please provide at least a query and a replacement string"), "rename_ids")
 
-        query, replace = args[0:2]
-        if not br.clean_regex(query, in_args.quiet):
-            _raise_error(ValueError("Malformed regular expression."), "rename_ids")
-        num = 0
-        store = False
+            query, replace = args[0:2]
+            if not br.clean_regex(query, in_args.quiet):
+                _raise_error(ValueError("Malformed regular expression."), "rename_ids")
+            num = 0
+            store = False
 
-        if len(args) > 2:
-            args = args[2:]
-            if "store" in args:
-                store = True
-                del args[args.index("store")]
+            if len(args) > 2:
+                args = args[2:]
+                if "store" in args:
+                    store = True
+                    del args[args.index("store")]
 
+                try:
+                    num = num if not len(args) else int(args[0])
+                except ValueError:
+                    _raise_error(ValueError("Max replacements argument must be an integer"), "rename_ids")
             try:
-                num = num if not len(args) else int(args[0])
-            except ValueError:
-                _raise_error(ValueError("Max replacements argument must be an integer"), "rename_ids")
-        try:
-            _print_recs(rename(seqbuddy, query=query, replace=replace, num=num, store_old_id=store))
-        except AttributeError as e:
-            _raise_error(e, "rename_ids", "There are more replacement")
-        _exit("rename_ids")
+                _print_recs(rename(seqbuddy, query=query, replace=replace, num=num, store_old_id=store))
+            except AttributeError as e:
+                _raise_error(e, "rename_ids", "There are more replacement")
+            _exit("rename_ids")
 
     # Replace sub-sequences
     if in_args.replace_subseq:
@@ -4905,20 +5936,25 @@ def command_line_ui(in_args, seqbuddy, skip_exit=False, pass_through=False):  #
     if in_args.translate:
         if seqbuddy.alpha == IUPAC.protein:
             _raise_error(TypeError("Nucleic acid sequence required, not protein."), "translate")
+        table = in_args.translate[0] if type(in_args.translate) == list and in_args.translate[0] else 1
         try:
-            _print_recs(translate_cds(seqbuddy, quiet=in_args.quiet))
-        except TypeError as e:
-            _raise_error(e, "translate", ["Nucleic acid sequence required, not protein.", "Record .* is protein."])
+            _print_recs(translate_cds(seqbuddy, quiet=in_args.quiet, table=table))
+        except (TypeError, ValueError) as e:
+            _raise_error(e, "translate", ["Nucleic acid sequence required, not protein.", "Record .* is protein.",
+                                          "Unknown genetic code table"])
         _exit("translate")
 
     # Translate 6 reading frames
     if in_args.translate6frames:
         if seqbuddy.alpha == IUPAC.protein:
             _raise_error(TypeError("You need to supply DNA or RNA sequences to translate"), "translate6frames")
+        table = in_args.translate6frames[0] if type(in_args.translate6frames) == list and \
+            in_args.translate6frames[0] else 1
         try:
-            seqbuddy = translate6frames(seqbuddy)
-        except TypeError as e:
-            _raise_error(e, "translate6frames", ["Nucleic acid sequence required, not protein.", " is protein."])
+            seqbuddy = translate6frames(seqbuddy, table=table)
+        except (TypeError, ValueError) as e:
+            _raise_error(e, "translate6frames", ["Nucleic acid sequence required, not protein.", " is protein.",
+                                                 "Unknown genetic code table"])
         if in_args.out_format:
             seqbuddy.out_format = in_args.out_format
         _print_recs(seqbuddy)
@@ -39,16 +39,21 @@ from ftplib import FTP, all_errors
 from hashlib import md5
 from urllib import request
 from urllib.error import URLError, HTTPError, ContentTooShortError
-from multiprocessing import Process, cpu_count
+from multiprocessing import Process, cpu_count, get_context
+from multiprocessing.pool import ThreadPool
 from time import time, sleep
 from math import floor
 from tempfile import TemporaryDirectory
 from shutil import copytree, rmtree, copyfile
+from copy import copy
+from functools import lru_cache
+from io import TextIOBase, StringIO
 import string
 from random import choice
 import signal
 from pkg_resources import Requirement, resource_filename, DistributionNotFound
 
+import numpy as np
 from Bio import AlignIO
 from Bio.SeqFeature import SeqFeature, FeatureLocation, CompoundLocation
 from Bio.Alphabet import IUPAC
@@ -232,99 +237,96 @@ def usable_cpu_count():
     return max_processes
 
 
-def run_multicore_function(iterable, function, func_args=False, max_processes=0, quiet=False, out_type=sys.stdout):
-        # fun little piece of abstraction here... directly pass in a function that is going to be looped over, and
-        # fork those loops onto independent processes. Any arguments the function needs must be provided as a list.
-        if func_args and not isinstance(func_args, list):
-            raise AttributeError("The arguments passed into the multi-thread function must be provided as a list")
+# Worker function and arguments for run_multicore_function(). Pool initializer arguments are not pickled when the
+# workers are forked, so the function can be a closure or bound method and only the individual items are pickled.
+_POOL_FUNCTION = None
+_POOL_ARGS = False
 
-        d_print = DynamicPrint(out_type)
-        if max_processes == 0:
-            max_processes = usable_cpu_count()
 
-        else:
-            cpus = cpu_count()
-            if max_processes > cpus:
-                max_processes = cpus
-            elif max_processes < 1:
-                max_processes = 1
+def _pool_init(function, func_args):
+    global _POOL_FUNCTION, _POOL_ARGS
+    _POOL_FUNCTION, _POOL_ARGS = function, func_args
+    return
 
-        max_processes = max_processes if max_processes < len(iterable) else len(iterable)
 
-        running_processes = 0
-        child_list = []
-        start_time = round(time())
-        elapsed = 0
-        counter = 0
-        if not quiet:
-            d_print.write("Running function %s() on %s cores\n" % (function.__name__, max_processes))
-        # fire up the multi-core!!
-        if not quiet:
-            d_print.write("\tJob 0 of %s" % len(iterable))
-
-        for next_iter in iterable:
-            if type(iterable) is dict:
-                next_iter = iterable[next_iter]
-            if os.name == "nt":  # Multicore doesn't work well on Windows, so for now just run serial
-                function(next_iter, func_args)
-                continue
-            while 1:     # Only fork a new process when there is a free processor.
-                if running_processes < max_processes:
-                    # Start new process
-                    if not quiet:
-                        d_print.write("\tJob %s of %s (%s)" % (counter, len(iterable), pretty_time(elapsed)))
-
-                    if func_args:
-                        p = Process(target=function, args=(next_iter, func_args))
-                    else:
-                        p = Process(target=function, args=(next_iter,))
-                    p.start()
-                    child_list.append(p)
-                    running_processes += 1
-                    counter += 1
-                    break
-                else:
-                    # processor wait loop
-                    while 1:
-                        for i in range(len(child_list)):
-                            if child_list[i].is_alive():
-                                continue
-                            else:
-                                child_list.pop(i)
-                                running_processes -= 1
-                                break
-
-                        if not quiet:
-                            if (start_time + elapsed) < round(time()):
-                                elapsed = round(time()) - start_time
-                                d_print.write("\tJob %s of %s (%s)" % (counter, len(iterable), pretty_time(elapsed)))
-
-                        if running_processes < max_processes:
-                            break
-
-        # wait for remaining processes to complete --> this is the same code as the processor wait loop above
-        if not quiet:
-            d_print.write("\tJob %s of %s (%s)" % (counter, len(iterable), pretty_time(elapsed)))
-
-        while len(child_list) > 0:
-            for i in range(len(child_list)):
-                if child_list[i].is_alive():
-                    continue
-                else:
-                    child_list.pop(i)
-                    running_processes -= 1
-                    break  # need to break out of the for-loop, because the child_list index is changed by pop
+def _pool_worker(next_iter):
+    if _POOL_ARGS:
+        return _POOL_FUNCTION(next_iter, _POOL_ARGS)
+    return _POOL_FUNCTION(next_iter)
 
-            if not quiet:
-                if (start_time + elapsed) < round(time()):
-                    elapsed = round(time()) - start_time
-                    d_print.write("\t%s total jobs (%s, %s jobs remaining)" % (len(iterable), pretty_time(elapsed),
-                                                                               len(child_list)))
 
-        if not quiet:
-            d_print.write("\tDONE: %s jobs in %s\n" % (len(iterable), pretty_time(elapsed)))
-        # func_args = []  # This may be necessary because of weirdness in assignment of incoming arguments
-        return
+def run_multicore_function(iterable, function, func_args=False, max_processes=0, quiet=False, out_type=sys.stdout,
+                           pool="process", chunksize=0):
+    """
+    Map a function over an iterable with a persistent pool of workers, and return the results in input order.
+    The function is called as function(item, func_args), or function(item) if func_args is False.
+    :param iterable: Items to process (if a dict is passed in, its values are used)
+    :param function: Does not need to be picklable (process workers are forked), but its return values do
+    :param func_args: Extra arguments, provided as a list
+    :param max_processes: Number of workers (0 = usable_cpu_count())
+    :param quiet: Suppress progress output
+    :param out_type: Where progress is written
+    :param pool: "process" for CPU-bound work, or "thread" for I/O-bound work (e.g., web requests)
+    :param chunksize: Number of items sent to a worker at a time (0 = chosen automatically)
+    :return: list of function return values
+    """
+    if func_args and not isinstance(func_args, list):
+        raise AttributeError("The arguments passed into the multi-thread function must be provided as a list")
+    if pool not in ["process", "thread"]:
+        raise ValueError("The 'pool' argument must be either 'process' or 'thread'")
+
+    items = list(iterable.values()) if isinstance(iterable, dict) else list(iterable)
+    if not items:
+        return []
+
+    d_print = DynamicPrint(out_type, quiet=quiet)
+    if max_processes == 0:
+        max_processes = usable_cpu_count()
+
+    else:
+        cpus = cpu_count()
+        if max_processes > cpus and pool == "process":
+            max_processes = cpus
+        elif max_processes < 1:
+            max_processes = 1
+
+    max_processes = max_processes if max_processes < len(items) else len(items)
+    if not chunksize:
+        chunksize = max(1, len(items) // (max_processes * 4))
+
+    start_time = round(time())
+    d_print.write("Running function %s() on %s cores\n" % (function.__name__, max_processes))
+    d_print.write("\tJob 0 of %s" % len(items))
+
+    def worker(next_iter):
+        return function(next_iter, func_args) if func_args else function(next_iter)
+
+    workers = None
+    if os.name == "nt":  # Multicore doesn't work well on Windows, so for now just run serial
+        pass
+    elif pool == "thread":
+        workers = ThreadPool(max_processes)
+    else:
+        try:
+            workers = get_context("fork").Pool(max_processes, initializer=_pool_init,
+                                               initargs=(function, func_args))
+            worker = _pool_worker
+        except ValueError:  # No fork on this platform, and the function may not be picklable, so run serial
+            pass
+
+    results = []
+    try:
+        job_iter = workers.imap(worker, items, chunksize) if workers is not None else map(worker, items)
+        for result in job_iter:
+            results.append(result)
+            d_print.write("\tJob %s of %s (%s)" % (len(results), len(items), pretty_time(round(time()) - start_time)))
+    finally:
+        if workers is not None:
+            workers.terminate()
+            workers.join()
+
+    d_print.write("\tDONE: %s jobs in %s\n" % (len(items), pretty_time(round(time()) - start_time)))
+    return results
 
 
 class TempDir(object):
@@ -454,6 +456,47 @@ class TempFile(object):
         return
 
 
+class RStripWriter(TextIOBase):
+    """
+    Wrap an output handle so that trailing whitespace is held back until more content arrives. Calling close() then
+    caps the output with 'ending', giving the same result as writing "%s\n" % output.rstrip() but without ever
+    holding the full output in memory. Subclassing TextIOBase lets writers that sniff their handle (e.g., the SeqXML
+    writer) treat it as a text stream. With strip_lines, spaces at the end of every line are dropped as well.
+    """
+    def __init__(self, handle, strip_lines=False):
+        self.handle = handle
+        self.strip_lines = strip_lines
+        self._pending = ""
+
+    def writable(self):
+        return True
+
+    def write(self, content):
+        content = self._pending + content
+        if self.strip_lines:
+            content = re.sub(" +\n", "\n", content)
+        stripped = content.rstrip()
+        if stripped:
+            self.handle.write(stripped)
+        self._pending = content[len(stripped):]
+        return len(content)
+
+    def flush(self):
+        return
+
+    def close(self, ending="\n"):
+        if self.closed:
+            return
+        self._pending = ""
+        self.handle.write(ending)
+        TextIOBase.close(self)
+        return
+
+    def __del__(self):
+        # Never write the ending from the garbage collector; only an explicit close() does that
+        return
+
+
 class SafetyValve(object):  # Use this class if you're afraid of an infinite loop
     def __init__(self, global_reps=1000, state_reps=10, counter=0):
         self.counter = counter
@@ -1034,16 +1077,17 @@ def phylip_sequential_read(sequence, relaxed=True):
 
 
 def phylip_guess(next_format, _input):
+    # Read the handle once and work from the string, rather than going back to the handle for every parse
+    contents = _input.read()
+    _input.seek(0)
     if next_format == "phylip":
-        sequence = "\n %s" % _input.read().strip()
-        _input.seek(0)
+        sequence = "\n %s" % contents.strip()
         alignments = re.split("\n ([0-9]+) ([0-9]+)\n", sequence)[1:]
         align_sizes = []
         for indx in range(int(len(alignments) / 3)):
             align_sizes.append((int(alignments[indx * 3]), int(alignments[indx * 3 + 1])))
 
-        phy = list(AlignIO.parse(_input, "phylip"))
-        _input.seek(0)
+        phy = list(AlignIO.parse(StringIO(contents), "phylip"))
 
         indx = 0
         phy_ids = []
@@ -1054,8 +1098,7 @@ def phylip_guess(next_format, _input):
                 phy_ids[-1].append(rec.id)
             indx += 1
 
-        phy_rel = list(AlignIO.parse(_input, "phylip-relaxed"))
-        _input.seek(0)
+        phy_rel = list(AlignIO.parse(StringIO(contents), "phylip-relaxed"))
         if phy_rel:
             for indx, aln in enumerate(phy_rel):
                 for rec in aln:
@@ -1068,19 +1111,74 @@ def phylip_guess(next_format, _input):
         return parse_format("phylip")
 
     if next_format == "phylipss":
-        if phylip_sequential_read(_input.read(), relaxed=False):
-            _input.seek(0)
+        if phylip_sequential_read(contents, relaxed=False):
             return parse_format(next_format)
         else:
             return
     if next_format == "phylipsr":
-        if phylip_sequential_read(_input.read()):
-            _input.seek(0)
+        if phylip_sequential_read(contents):
             return parse_format(next_format)
         else:
             return
 
 
+def sniff_signatures(head):
+    """
+    Identify candidate formats from the signature at the very top of a file (leading '>', 'LOCUS', 'ID   ',
+    '# STOCKHOLM', '#NEXUS', '<?xml', '@'/'+' quartets, the phylip header line, etc.)
+    :param head: The first few KB of the input
+    :return: List of candidate formats, best first. Empty if the head is not recognized.
+    """
+    head = head.lstrip()
+    lines = head.splitlines()
+    if not lines:
+        return []
+    first_line = lines[0].rstrip()
+
+    if first_line.startswith("# STOCKHOLM"):
+        return ["stockholm"]
+    if first_line.upper().startswith("#NEXUS"):
+        return ["nexus"]
+    if first_line.startswith("LOCUS"):
+        return ["gb"]
+    if first_line.startswith("ID   "):
+        # SwissProt and EMBL share the ID line, but SwissProt reports the length in amino acids
+        return ["swiss", "embl"] if re.search(" AA\.$", first_line) else ["embl", "swiss"]
+    if first_line.startswith("<"):
+        return ["nexml"] if "nexml" in head.lower() else ["seqxml"]
+    if first_line.startswith(">"):
+        return ["fasta"]
+    if first_line.startswith("@"):
+        # FASTQ records are quartets, with the third line starting with '+'
+        if len(lines) < 3 or lines[2].startswith("+"):
+            return ["fastq"]
+        return []
+    if re.match("(CLUSTAL|MUSCLE|PROBCONS|MSAPROBS|Kalign)", first_line):
+        return ["clustal"]
+    if re.match("[0-9]+[ \t]+[0-9]+$", first_line):
+        return ["phylipss", "phylipsr", "phylip", "phylip-relaxed"]
+    if first_line.startswith("("):
+        return ["newick"]
+    return []
+
+
+def sniff_format(_input, possible_formats, size=4096):
+    """
+    Order the trial parses in the guess_format() functions so that any format matching the head of the input is
+    attempted first. Everything else is kept, in its original order, as a fallback for when the sniff is ambiguous
+    or wrong.
+    :param _input: Seekable file-like object. It is read from the start, and rewound before returning.
+    :param possible_formats: All formats that may be tried, in order of preference
+    :param size: Number of characters to look at
+    :return: Reordered list of formats
+    """
+    _input.seek(0)
+    head = _input.read(size)
+    _input.seek(0)
+    candidates = [next_format for next_format in sniff_signatures(head) if next_format in possible_formats]
+    return candidates + [next_format for next_format in possible_formats if next_format not in candidates]
+
+
 def replacements(input_str, query, replace="", num=0):
     """
     This will allow fancy positional regular expression replacements from right-to-left, as well as normal left-to-right
@@ -1117,6 +1215,87 @@ def replacements(input_str, query, replace="", num=0):
     return input_str
 
 
+@lru_cache(maxsize=8)
+def _mapping_regex(keys):
+    """
+    Compile a set of literal strings into one regular expression. The alternation is laid out as a prefix tree, so
+    each position in the searched text only ever tries a handful of branches no matter how many strings there are.
+    Where one string is a prefix of another, the longer one wins.
+    :param keys: frozenset of strings
+    :return: Compiled regular expression
+    """
+    trie = {}
+    for key in keys:
+        node = trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[""] = {}  # End of a key
+
+    def build(node):
+        branches, chars = [], []
+        for char in sorted(char for char in node if char):
+            sub_pattern = build(node[char])
+            if sub_pattern:
+                branches.append(re.escape(char) + sub_pattern)
+            else:
+                chars.append(re.escape(char))
+        if chars:
+            branches.append(chars[0] if len(chars) == 1 else "[%s]" % "".join(chars))
+        if not branches:
+            return ""
+        if "" in node:  # A key ends here, so everything after it is optional
+            return "(?:%s)?" % "|".join(branches)
+        return branches[0] if len(branches) == 1 else "(?:%s)" % "|".join(branches)
+
+    return re.compile(build(trie))
+
+
+def bulk_replacer(mapping, substrings=False):
+    """
+    Build a function that makes every replacement in mapping at once. By default only whole strings are swapped
+    (e.g., IDs), so 'Panx1' in the mapping leaves 'Panx10' alone. With substrings=True, every occurrence of every key
+    is replaced in a single pass over the string instead, for free text like tree labels, descriptions, or the
+    contents of a third party output file (which is what restores hashed IDs, for example).
+    Keys are literal strings, not regular expressions.
+    :param mapping: {old: new} dictionary
+    :param substrings: Replace keys wherever they occur in the string, not just whole string matches
+    :return: Function that takes a string and returns it with all replacements made
+    """
+    if not substrings:
+        return lambda text: mapping.get(text, text)
+
+    keys = frozenset(key for key in mapping if key)
+
+    def replace(text):
+        if text in mapping:  # Whole string matches are the common case (e.g., a hashed ID)
+            return mapping[text]
+        if not keys:
+            return text
+        return _mapping_regex(keys).sub(lambda match: mapping[match.group(0)], text)
+    return replace
+
+
+def read_rename_table(table):
+    """
+    Read a two column file of {old: new} replacements. Columns are tab separated, or split on the first run of
+    white space if the file has no tabs. Blank lines and lines starting with '#' are skipped.
+    :param table: Path to the file
+    :return: OrderedDict
+    """
+    mapping = OrderedDict()
+    with open(table, "r", encoding="utf-8") as ifile:
+        lines = ifile.read().splitlines()
+    separator = "\t" if any("\t" in line for line in lines) else None
+    for line in lines:
+        if not line.strip() or line.startswith("#"):
+            continue
+        line = line.strip("\r\n").split(separator, 1)
+        if len(line) != 2:
+            raise ValueError("Unable to read '%s' as a rename table. Each line needs an old and a new value." % table)
+        mapping[line[0].strip()] = line[1].strip()
+    return mapping
+
+
 def send_traceback(tool, function, e, version):
     now = datetime.datetime.now()
     config = config_values()
@@ -1190,6 +1369,40 @@ def shift_features(features, shift, full_seq_len):
     return shifted_features
 
 
+def copy_feature(feature):
+    """
+    Copy a SeqFeature along with its location and qualifiers dict (the parts that get edited in place), without the
+    overhead of deepcopy.
+    :param feature: SeqFeature object
+    :return: New SeqFeature object
+    """
+    new_feature = copy(feature)
+    location = copy(feature.location)
+    if type(location) == CompoundLocation:
+        location.parts = [copy(part) for part in location.parts]
+    new_feature.location = location
+    new_feature.qualifiers = copy(feature.qualifiers)
+    return new_feature
+
+
+def copy_record(rec):
+    """
+    A much cheaper alternative to deepcopy for SeqRecords. Seq objects are immutable, so the sequence payload is shared
+    with the original; the features, annotations, dbxrefs and letter annotations are given fresh containers, so
+    re-assigning or editing them on the copy leaves the original alone.
+    :param rec: SeqRecord object
+    :return: New SeqRecord object
+    """
+    new_rec = copy(rec)
+    new_rec.features = [copy_feature(feat) for feat in rec.features]
+    new_rec.annotations = copy(rec.annotations)
+    new_rec.dbxrefs = list(rec.dbxrefs)
+    new_rec.letter_annotations = dict(rec.letter_annotations)
+    if hasattr(rec, "buddy_data"):
+        new_rec.buddy_data = copy(rec.buddy_data)
+    return new_rec
+
+
 def ungap_feature_ends(feat, rec):
     """
     If a feature begins or ends on a gap, it makes it much harder to track changes, so force the feature onto actual
@@ -1240,11 +1453,79 @@ def ungap_feature_ends(feat, rec):
     return feat
 
 
-def _old2new(feat, old_rec, new_rec):
+def _gap_index(old_rec, new_rec):
+    """
+    Coordinate index for moving features from one gap pattern to another, built once per record pair
+    :param old_rec: Starting SeqRecord
+    :param new_rec: SeqRecord with the same residues, but a different gap pattern
+    :return: tuple of np.arrays --> number of residues in old_rec before each position (one extra value at the end for
+    the full length), gapped position of each residue in new_rec. None if the ungapped sequences do not match.
+    """
+    old_seq, new_seq = str(old_rec.seq).lower(), str(new_rec.seq).lower()
+    if old_seq.replace("-", "") != new_seq.replace("-", ""):
+        return None
+    old_seq, new_seq = old_seq.encode(), new_seq.encode()
+    old_residues = np.frombuffer(old_seq, dtype=np.uint8) != ord("-")
+    new_residues = np.frombuffer(new_seq, dtype=np.uint8) != ord("-")
+    if len(old_residues) != len(old_rec.seq) or len(new_residues) != len(new_rec.seq):
+        return None  # Multi-byte characters throw the byte offsets off
+    old_counts = np.zeros(len(old_residues) + 1, dtype=np.int64)
+    np.cumsum(old_residues, out=old_counts[1:])
+    return old_counts, np.flatnonzero(new_residues)
+
+
+def _old2new_by_residue(start, end, old_rec, new_rec):
+    """
+    Residue-by-residue walk used when the old and new sequences do not share the same residues
+    :return: New (start, end) tuple, or None
+    """
+    old_seq = str(old_rec.seq).lower()
+    new_seq = str(new_rec.seq).lower()
+    old_front_seq = old_seq[:start]
+    old_front_seq = re.sub("-", "", old_front_seq)
+    old_feat_seq = old_seq[start:end]
+    old_feat_seq = re.sub("-", "", old_feat_seq)
+    start, end = 0, 0
+    new_front_seq, new_feat_seq = "", ""
+    for indx, residue in enumerate(new_seq):
+        if residue == "-":
+            continue
+
+        if not start:
+            if old_front_seq in ["", new_front_seq]:
+                start = indx + 1
+                new_feat_seq += residue
+                if new_feat_seq == old_feat_seq:
+                    end = indx + 1
+                    break
+            else:
+                new_front_seq += residue
+        else:
+            new_feat_seq += residue
+            if new_feat_seq == old_feat_seq:
+                end = indx + 1
+                break
+    start -= 1
+    if start == -1:
+        return None  # I don't think this should ever be hit
+    end = end if end != 0 else len(new_seq)
+    return start, end
+
+
+def _old2new(feat, old_rec, new_rec, index=False):
+    """
+    Move a feature from the gap pattern of old_rec onto the gap pattern of new_rec
+    :param feat: SeqFeature object
+    :param old_rec: SeqRecord the feature currently belongs to
+    :param new_rec: SeqRecord with the same residues, but different gaps
+    :param index: Output from _gap_index(), if already built for this pair of records
+    :return: The modified feature, or None if it can't be placed
+    """
     if type(feat.location) == CompoundLocation:
+        index = _gap_index(old_rec, new_rec) if index is False else index
         parts = []
         for part in feat.location.parts:
-            new_part = _old2new(SeqFeature(part), old_rec, new_rec)
+            new_part = _old2new(SeqFeature(part), old_rec, new_rec, index)
             if new_part:
                 parts.append(new_part.location)
         if len(parts) == 1:
@@ -1260,62 +1541,64 @@ def _old2new(feat, old_rec, new_rec):
             start, end = feat.location.end, feat.location.start
         else:
             start, end = feat.location.start, feat.location.end
-        old_seq = str(old_rec.seq).lower()
-        new_seq = str(new_rec.seq).lower()
-        old_front_seq = old_seq[:start]
-        old_front_seq = re.sub("-", "", old_front_seq)
-        old_feat_seq = old_seq[start:end]
-        old_feat_seq = re.sub("-", "", old_feat_seq)
-        start, end = 0, 0
-        new_front_seq, new_feat_seq = "", ""
-        for indx, residue in enumerate(new_seq):
-            if residue == "-":
-                continue
 
-            if not start:
-                if old_front_seq in ["", new_front_seq]:
-                    start = indx + 1
-                    new_feat_seq += residue
-                    if new_feat_seq == old_feat_seq:
-                        end = indx + 1
-                        break
-                else:
-                    new_front_seq += residue
-            else:
-                new_feat_seq += residue
-                if new_feat_seq == old_feat_seq:
-                    end = indx + 1
-                    break
-        start -= 1
-        if start == -1:
-            return None  # I don't think this should ever be hit
-        end = end if end != 0 else len(new_seq)
+        index = _gap_index(old_rec, new_rec) if index is False else index
+        if index is None:
+            new_location = _old2new_by_residue(start, end, old_rec, new_rec)
+            if not new_location:
+                return None
+            start, end = new_location
+        else:
+            # The feature starts on residue number <front> of the ungapped sequence, and spans <length> residues
+            old_counts, new_positions = index
+            front = int(old_counts[min(int(start), len(old_counts) - 1)])
+            length = int(old_counts[min(int(end), len(old_counts) - 1)]) - front
+            if front >= len(new_positions):
+                return None
+            start = int(new_positions[front])
+            end = int(new_positions[front + length - 1]) + 1 if length else len(new_rec.seq)
         feat.location = FeatureLocation(start, end, feat.location.strand)
     else:
         raise TypeError("FeatureLocation or CompoundLocation object required.")
     return feat
 
 
-def remap_gapped_features(old_records, new_records):
+def _remap_record_features(old_rec, new_rec):
+    if not old_rec.features:
+        return []
+    # Start by forcing feature start-end positions onto actual residues, in cases were they fall on gaps. Both steps
+    # edit features in place, so work on copies and leave old_rec alone.
+    old_features = [ungap_feature_ends(copy_feature(feat), old_rec) for feat in old_rec.features]
+    index = _gap_index(old_rec, new_rec)
+    features = []
+    for feat in old_features:
+        feat = _old2new(feat, old_rec, new_rec, index)
+        if feat:
+            features.append(feat)
+    return features
+
+
+def remap_gapped_features(old_records, new_records, max_processes=1):
     """
     If adding, subtracting, or moving around in a sequence, the features need to be shifted to accomodate.
-    This only works if all of the original non-gap residues are present in the new record
+    This only works if all of the original non-gap residues are present in the new record.
+    A residue coordinate index is built once for each pair of records, so every feature is placed with a couple of
+    array look-ups instead of walking the sequence.
     :param old_records: Starting sequence (can be gapped as well)
     :param new_records: New sequence with different gap pattern
+    :param max_processes: Spread the records over this many processes (only worth it for heavily annotated records)
     :return:
     """
-    # Start by forcing feature start-end positions onto actual residues, in cases were they fall on gaps
-    for old_rec, new_rec in zip(old_records, new_records):
-        features = []
-        for feat in old_rec.features:
-            features.append(ungap_feature_ends(feat, old_rec))
-        old_rec.features = features
-        features = []
-        for feat in old_rec.features:
-            feat = _old2new(feat, old_rec, new_rec)
-            if feat:
-                features.append(feat)
-        new_rec.features = features
+    pairs = list(zip(old_records, new_records))
+    if max_processes > 1 and len(pairs) > 1:
+        def remap(indx):
+            return _remap_record_features(*pairs[indx])
+        features = run_multicore_function(list(range(len(pairs))), remap, max_processes=max_processes, quiet=True)
+    else:
+        features = [_remap_record_features(old_rec, new_rec) for old_rec, new_rec in pairs]
+
+    for (old_rec, new_rec), new_features in zip(pairs, features):
+        new_rec.features = new_features
         new_rec.annotations = old_rec.annotations
         new_rec.dbxrefs = old_rec.dbxrefs
     return new_records
@@ -1412,6 +1695,23 @@ def clean_regex(patterns, quiet=False):
     _stderr(failure_str, quiet)
     return patterns
 
+
+def record_matcher(patterns, exact=False):
+    """
+    Compile search patterns once, for selecting records/taxa by name. All patterns are joined into a single
+    alternation, or with exact=True they are treated as literal IDs and looked up in a set instead.
+    :param patterns: Regular expression or list of regular expressions ("*" matches everything)
+    :param exact: Only match whole strings that are in patterns
+    :return: Function that takes one or more strings and returns True if any of them match
+    """
+    patterns = [patterns] if type(patterns) == str else list(patterns)
+    if exact:
+        id_set = set(patterns)
+        return lambda *names: any(name in id_set for name in names)
+
+    regex = re.compile("|".join([".*" if pattern == "*" else pattern for pattern in patterns]))
+    return lambda *names: any(regex.search(name) for name in names)
+
 # #################################################### VARIABLES ##################################################### #
 
 contributors = [Contributor("Stephen", "Bond", commits=1055, github="https://github.com/biologyguy"),
@@ -1457,7 +1757,7 @@ sb_flags = {"annotate": {"flag": "ano",
                                "metavar": 'arg',
                                "help": "Convert amino acid sequences into codons. Optionally, "
                                        "select mode by passing in [{random, r, optimized, o}] "
-                                       "[{human, h, mouse, m, yeast, y, ecoli, e}]"},
+                                       "[{human, h, mouse, m, yeast, y, ecoli, e, <codon usage file>}]"},
             "bl2seq": {"flag": "bl2s",
                        "action": "store_true",
                        "help": "All-by-all blast among sequences using bl2seq. "
@@ -1468,6 +1768,12 @@ sb_flags = {"annotate": {"flag": "ano",
                       "metavar": ("subject", "<blast params>"),
                       "help": "Search a BLAST database or subject sequence file with your query sequence file, "
                               "returning the full hits"},
+            "cd_hit": {"flag": "cdh",
+                       "action": "append",
+                       "nargs": "+",
+                       "metavar": "args",
+                       "help": "Greedy clustering of similar sequences (like CD-HIT), keeping one representative per "
+                               "cluster. Pass in the identity threshold (e.g., 0.9), and optionally a word size"},
             "clean_seq": {"flag": "cs",
                           "action": "append",
                           "nargs": "*",
@@ -1519,7 +1825,8 @@ sb_flags = {"annotate": {"flag": "ano",
                                "metavar": "args",
                                "help": "Remove records from a file (deleted IDs are sent to stderr). "
                                        "Regular expressions are understood, and an int as the final argument will"
-                                       "specify number of columns for deleted IDs"},
+                                       "specify number of columns for deleted IDs. Add 'exact' to match whole IDs "
+                                       "only (e.g., from a file of IDs)"},
             "delete_repeats": {"flag": "drp",
                                "action": "append",
                                "nargs": "*",
@@ -1543,8 +1850,12 @@ sb_flags = {"annotate": {"flag": "ano",
                                 "metavar": "positions",
                                 "help": "Pull out specific residues"},
             "find_CpG": {"flag": "fcpg",
-                         "action": "store_true",
-                         "help": "Predict regions under strong purifying selection based on high CpG content"},
+                         "action": "append",
+                         "nargs": "*",
+                         "metavar": "args",
+                         "help": "Predict regions under strong purifying selection based on high CpG content. "
+                                 "Args: [window size (int)] [CG fraction threshold] [obs/exp threshold]. "
+                                 "Defaults: 200 0.5 0.6"},
             "find_orfs": {"flag": "orf",
                           "action": "store_true",
                           "help": "Finds all the open reading frames in the sequences and their reverse complements."},
@@ -1568,7 +1879,7 @@ sb_flags = {"annotate": {"flag": "ano",
                                        "metavar": "",
                                        "help": "Identify restriction sites. Args: [enzymes "
                                                "{specific enzymes, commercial, all}], [Num cuts (int) [num cuts]], "
-                                               "[order {alpha, position}]"},
+                                               "[order {alpha, position}], ['table' (only output the cut sites)]"},
             "group_by_prefix": {"flag": "gbp",
                                 "action": "append",
                                 "nargs": "*",
@@ -1681,7 +1992,9 @@ sb_flags = {"annotate": {"flag": "ano",
                              "action": "store",
                              "nargs": "+",
                              "metavar": "<regex>",
-                             "help": "Get all the records with ids containing a given string"},
+                             "help": "Get all the records with ids containing a given string. Add 'full' to also "
+                                     "search descriptions, or 'exact' to match whole IDs only (e.g., from a file of "
+                                     "IDs)"},
             "pull_records_with_feature": {"flag": "prf",
                                           "action": "store",
                                           "nargs": "+",
@@ -1697,7 +2010,9 @@ sb_flags = {"annotate": {"flag": "ano",
                            "metavar": "args",
                            "nargs": "*",
                            "help": "Replace some pattern in ids with something else. "
-                                   "args: <pattern>, <substitution>, [max replacements (int)], ['store']"},
+                                   "args: <pattern>, <substitution>, [max replacements (int)], ['store']. "
+                                   "Or provide a two column file of old/new IDs to rename many records at once: "
+                                   "<file>, ['store']"},
             "replace_subseq": {"flag": "rs",
                                "action": "append",
                                "metavar": "args",
@@ -1727,11 +2042,17 @@ sb_flags = {"annotate": {"flag": "ano",
                            "action": "store_true",
                            "help": "Convert DNA sequences to RNA"},
             "translate": {"flag": "tr",
-                          "action": "store_true",
-                          "help": "Convert coding sequences into amino acid sequences"},
+                          "action": "append",
+                          "nargs": "?",
+                          "metavar": "genetic code",
+                          "help": "Convert coding sequences into amino acid sequences. Optionally specify an NCBI "
+                                  "genetic code by id or name (default: 1, the standard code)"},
             "translate6frames": {"flag": "tr6",
-                                 "action": "store_true",
-                                 "help": "Translate nucleotide sequences into all six reading frames"},
+                                 "action": "append",
+                                 "nargs": "?",
+                                 "metavar": "genetic code",
+                                 "help": "Translate nucleotide sequences into all six reading frames. Optionally "
+                                         "specify an NCBI genetic code by id or name"},
             "transmembrane_domains": {"flag": "tmd",
                                       "nargs": "*",
                                       "action": "append",
@@ -1760,6 +2081,9 @@ sb_modifiers = {"alpha": {"flag": "a",
                 "quiet": {"flag": "q",
                           "action": "store_true",
                           "help": "Suppress stderr messages"},
+                "stream": {"flag": "s",
+                           "action": "store_true",
+                           "help": "Process records one at a time with constant memory (per-record tools only)"},
                 "test": {"flag": "t",
                          "action": "store_true",
                          "help": "Run the function and return any stderr/stdout other than sequences"}}
@@ -1786,15 +2110,21 @@ alb_flags = {"alignment_lengths": {"flag": "al",
                                    "nargs": "*",
                                    "metavar": "regex|int",
                                    "help": "Concatenates two or more alignments using a regex pattern or fixed length "
-                                           "prefix to group record ids."},
+                                           "prefix to group record ids. Directories of alignment files are read one "
+                                           "file at a time."},
              "consensus": {"flag": "con",
-                           "action": "store_true",
-                           "help": "Create majority-rule consensus sequences"},
+                           "action": "append",
+                           "nargs": "*",
+                           "metavar": "args",
+                           "help": "Create consensus sequences. Args: [majority|threshold|ambiguous] [frequency "
+                                   "(default=0.5)] ['gaps'] ['profile']. 'gaps' leaves gaps out of the residue "
+                                   "counts, and 'profile' returns the residue frequencies of every column instead"},
              "delete_records": {"flag": "dr",
                                 "nargs": "+",
                                 "action": "store",
                                 "metavar": "args",
-                                "help": "Remove alignment rows with IDs that contain matches to the provided patterns"},
+                                "help": "Remove alignment rows with IDs that contain matches to the provided patterns. "
+                                        "Add 'exact' to match whole IDs only"},
              "enforce_triplets": {"flag": "et",
                                   "action": "store_true",
                                   "help": "Shift gaps so sequences are organized in triplets"},
@@ -1849,13 +2179,16 @@ alb_flags = {"alignment_lengths": {"flag": "al",
                               "nargs": "+",
                               "action": "append",
                               "metavar": "regex",
-                              "help": "Keep alignment rows with IDs that contains matches to the provided patterns"},
+                              "help": "Keep alignment rows with IDs that contains matches to the provided patterns. "
+                                      "Add 'full' to also search descriptions, or 'exact' to match whole IDs only"},
              "rename_ids": {"flag": "ri",
                             "action": "append",
                             "metavar": "args",
                             "nargs": "*",
                             "help": "Replace some pattern in ids with something else. "
-                                    "args: <pattern>, <substitution>, [max replacements (int)]"},
+                                    "args: <pattern>, <substitution>, [max replacements (int)]. "
+                                    "Or provide a two column file of old/new IDs to rename many records at once: "
+                                    "<file>"},
              "reverse_transcribe": {"flag": "r2d",
                                     "action": "store_true",
                                     "help": "Convert RNA alignments to DNA"},
@@ -1874,7 +2207,8 @@ alb_flags = {"alignment_lengths": {"flag": "al",
              "trimal": {"flag": "trm",
                         "action": "append",
                         "nargs": "?",
-                        "help": "Delete columns with a certain percentage of gaps. Or auto-detect with 'gappyout'"},
+                        "help": "Delete columns with a certain percentage of gaps. Or use one of the trimAl methods: "
+                                "'gappyout' (default), 'strict', 'strictplus' or 'automated1'"},
              "transcribe": {"flag": "d2r",
                             "action": "store_true",
                             "help": "Convert DNA alignments to RNA"},
@@ -1895,6 +2229,11 @@ alb_modifiers = {"in_format": {"flag": "f",
                  "out_format": {"flag": "o",
                                 "action": "store",
                                 "help": "If you want a specific format output"},
+                 "partitions": {"flag": "prt",
+                                "action": "store",
+                                "metavar": "file",
+                                "help": "Save a RAxML style partition table (NEXUS if the file ends in .nex) when "
+                                        "concatenating alignments"},
                  "quiet": {"flag": "q",
                            "action": "store_true",
                            "help": "Suppress stderr messages"},
@@ -1952,7 +2291,7 @@ pb_flags = {"collapse_polytomies": {"flag": "cpt",
                            "action": "append",
                            "nargs": "+",
                            "metavar": "Regex",
-                           "help": "Remove taxa with matching labels/IDs"},
+                           "help": "Remove taxa with matching labels/IDs. Add 'exact' to match whole labels only"},
             "rename_ids": {"flag": "ri",
                            "action": "store",
                            "nargs": 2,
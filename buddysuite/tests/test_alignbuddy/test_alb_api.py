@@ -5,10 +5,13 @@
 import pytest
 import os
 import shutil
+import random
+from io import StringIO
 from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
 from Bio.AlignIO import MultipleSeqAlignment
 from Bio.Alphabet import IUPAC
+import numpy as np
 import AlignBuddy as Alb
 import SeqBuddy as Sb
 import buddy_resources as br
@@ -49,6 +52,36 @@ def test_bootstrap(alb_resources, hf):
     tester = Alb.bootstrap(alb_resources.get_one("m p py"), 3, r_seed=12345)
     assert hf.buddy2hash(tester) == "e6d5f30c3a7f53ec7899618a045b017d"
 
+    # Replicates built in parallel are the same as those built one at a time
+    tester = Alb.bootstrap(alb_resources.get_one("m p py"), 3, r_seed=12345, max_processes=2)
+    assert hf.buddy2hash(tester) == "e6d5f30c3a7f53ec7899618a045b017d"
+
+    # Stream the replicates out as they are built
+    for key in ["m p s", "m p py", "m p pr", "m p c"]:
+        out_handle = StringIO()
+        assert Alb.bootstrap(alb_resources.get_one(key), 3, r_seed=12345, out_handle=out_handle) is None
+        assert out_handle.getvalue() == str(Alb.bootstrap(alb_resources.get_one(key), 3, r_seed=12345)), key
+
+    with pytest.raises(ValueError) as e:
+        Alb.bootstrap(alb_resources.get_one("o p g"), 2, out_handle=StringIO())
+    assert "gb format does not support multiple alignments in one file" in str(e)
+
+
+def test_bootstrap_columns():
+    # Column draws match those of random.randint(), and leave the random stream in the same place
+    for num_columns in [1, 7, 100, 4097]:
+        rand_gen = random.Random(12345)
+        expected = [rand_gen.randint(0, num_columns - 1) for _ in range(num_columns)]
+        expected.append(rand_gen.random())
+
+        state = random.Random(12345).getstate()[1]
+        np_rand = np.random.RandomState()
+        np_rand.set_state(("MT19937", np.array(state[:624], dtype=np.uint32), state[624]))
+        columns = Alb._bootstrap_columns(np_rand, num_columns)
+        assert columns.tolist() == expected[:-1]
+        assert np_rand.random_sample() == expected[-1]
+    assert not len(Alb._bootstrap_columns(np.random.RandomState(), 0))
+
 
 # ##############################################  '-cs', '--clean_seqs' ############################################## #
 def test_clean_seqs(alb_resources, hf):
@@ -105,6 +138,37 @@ def test_concat_alignments(alb_resources, hf):
     assert hf.buddy2hash(Alb.concat_alignments(Alb.make_copy(tester))) == '685f24ee1fc88860dd9465035040c91e'
 
 
+def test_concat_alignment_files(alb_resources):
+    tmp_dir = br.TempDir()
+    alignbuddy = alb_resources.get_one("m p py")
+    for indx, alignment in enumerate(alignbuddy.alignments):
+        Alb.AlignBuddy([alignment], out_format="fasta").write(os.path.join(tmp_dir.path, "gene%s.fa" % (indx + 1)))
+
+    tester = Alb.concat_alignment_files(tmp_dir.path)
+    expected = Alb.concat_alignments(alb_resources.get_one("m p py"))
+    assert [(rec.id, str(rec.seq)) for rec in tester.records()] == \
+           [(rec.id, str(rec.seq)) for rec in expected.records()]
+    assert tester.out_format == "fasta"
+    assert list(tester.partitions.items()) == [("gene1", (1, 681)), ("gene2", (682, 1161))]
+    assert list(expected.partitions.items()) == [("Alignment_1", (1, 681)), ("Alignment_2", (682, 1161))]
+
+    tester = Alb.concat_alignment_files([os.path.join(tmp_dir.path, "gene2.fa"),
+                                         os.path.join(tmp_dir.path, "gene1.fa")], out_format="phylip-relaxed")
+    assert tester.out_format == "phylip-relaxed"
+    assert list(tester.partitions.items()) == [("gene2", (1, 480)), ("gene1", (481, 1161))]
+
+    with pytest.raises(AttributeError) as e:
+        Alb.concat_alignment_files(os.path.join(tmp_dir.path, "gene1.fa"))
+    assert "Please provide at least two alignments." in str(e)
+
+
+def test_concat_group_pattern():
+    assert Alb._concat_group_pattern([["Mle1", "Mle2", "Mle3"], ["Mle1", "Bab1"]]) == "...."
+    assert Alb._concat_group_pattern([["ab", "abc"]]) == "..."
+    assert Alb._concat_group_pattern([["a", "a", "abcd"]]) == "....."
+    assert Alb._concat_group_pattern([["foo"], []]) == "."
+
+
 # ###########################################  '-con', '--consensus' ############################################ #
 hashes = [('o d g', 'bbaf389701418177c41dea7d9696acea'), ('o d n', '560d4fc4be7af5d09eb57a9c78dcbccf'),
           ('o d py', '01f1181187ffdba4fb08f4011a962642'), ('o d s', '51b5cf4bb7d591c9d04c7f6b6bd70692'),
@@ -121,6 +185,32 @@ def test_consensus(alb_resources, hf, key, next_hash):
     assert hf.buddy2hash(tester) == next_hash
 
 
+def test_consensus_modes():
+    def consensus(seqs, *args):
+        alignment = MultipleSeqAlignment([SeqRecord(Seq(seq), id="s%s" % indx) for indx, seq in enumerate(seqs)])
+        return Alb.consensus_sequence(Alb.AlignBuddy([alignment]), *args).records()[0]
+
+    seqs = ["ACGTA-CA", "ACGAA-CA", "ATGA--CA", "ACCT--aT"]
+    assert str(consensus(seqs).seq) == "ACGNN-CA"
+    assert str(consensus(seqs, "threshold", 0.8).seq) == "ANNNN-NN"
+    assert str(consensus(seqs, "threshold", 75).seq) == "ACGNN-CA"
+    assert str(consensus(seqs, "ambiguous").seq) == "ACGWN-CA"
+    assert str(consensus(seqs, "ambiguous", 0.8).seq) == "AYSWN-MW"
+    assert str(consensus(seqs, "majority", 0.5, True).seq) == "ACGNA-CA"
+    assert str(consensus(seqs, "ambiguous", 0.5, True).seq) == "ACGWA-CA"
+    assert str(consensus(["acgu", "aguu", "acau"], "ambiguous", 1).seq) == "asdu"
+    assert str(consensus(["MDEIL*", "MNQLI-"], "ambiguous").seq) == "MBZJJX"
+
+    profile = consensus(seqs, "majority", 0.5, True).buddy_data["column_profile"]
+    assert list(profile) == ["A", "C", "G", "T", "a"]
+    assert profile["A"].tolist() == [1, 0, 0, 0.5, 1, 0, 0, 0.75]
+    assert profile["a"].tolist() == [0, 0, 0, 0, 0, 0, 0.25, 0]
+
+    with pytest.raises(NotImplementedError) as e:
+        consensus(seqs, "foo")
+    assert "'foo' is not an implemented consensus mode" in str(e)
+
+
 # ###########################################  '-dr', '--delete_records' ############################################ #
 hashes = [('o d g', 'c22d5cbef500d8baed8cead1d5fe9628'), ('o d n', '355a98dad5cf382797eb907e83940978'),
           ('o d py', 'fe9a2776558f3fe9a1732c777c4bc9ac'), ('o d s', '35dc92c4f4697fb508eb1feca43d9d75'),
@@ -389,7 +479,7 @@ def test_clustalomega(sb_resources, hf, monkeypatch):
     for file in sorted(files):
         with open("%s%s%s" % (root, os.path.sep, file), "r", encoding="utf-8") as ifile:
             kept_output += ifile.read()
-    assert hf.string2hash(kept_output) == "bad3a345e769d32672d39ee51df295f5"
+    assert hf.string2hash(kept_output) == "eae2d917c462b70253cb83af98bfb60b"
 
 
 def test_clustalw2(sb_resources, hf, monkeypatch):
@@ -429,7 +519,7 @@ def test_clustalw2(sb_resources, hf, monkeypatch):
     for file in sorted(files):
         with open("%s%s%s" % (root, os.path.sep, file), "r", encoding="utf-8") as ifile:
             kept_output += ifile.read()
-    assert hf.string2hash(kept_output) == "7c03d671198d4e6c4bb56c8fb5619fff"
+    assert hf.string2hash(kept_output) == "eb9ff56e71021ce9237aa592d4c9d686"
 
 
 def test_pagan(sb_resources, hf, monkeypatch):
@@ -472,7 +562,7 @@ def test_pagan(sb_resources, hf, monkeypatch):
     for file in sorted(files):
         with open("%s%s%s" % (root, os.path.sep, file), "r", encoding="utf-8") as ifile:
             kept_output += ifile.read()
-    assert hf.string2hash(kept_output) == "864112dafb4896ba25ece7929ca0a818"
+    assert hf.string2hash(kept_output) == "e6e34b6cc0a2de62be9e94c8917ad2fc"
 
 
 def test_prank(sb_resources, hf, monkeypatch):
@@ -512,7 +602,7 @@ def test_prank(sb_resources, hf, monkeypatch):
     for file in sorted(files):
         with open("%s%s%s" % (root, os.path.sep, file), "r", encoding="utf-8") as ifile:
             kept_output += ifile.read()
-    assert hf.string2hash(kept_output) == "d0564931e20a61b441fc60549f5560a0"
+    assert hf.string2hash(kept_output) == "4928df3557f29312d7b55166829eb477"
 
 
 def test_muscle(sb_resources, hf, monkeypatch):
@@ -543,7 +633,7 @@ def test_muscle(sb_resources, hf, monkeypatch):
     for file in sorted(files):
         with open("%s%s%s" % (root, os.path.sep, file), "r", encoding="utf-8") as ifile:
             kept_output += ifile.read()
-    assert hf.string2hash(kept_output) == "bd85c34b11261aef2d38c7a6a9d20bf9"
+    assert hf.string2hash(kept_output) == "e2f32ea93255937069bc172fbf7c354f"
 
 
 def test_mafft(sb_resources, hf, monkeypatch):
@@ -576,7 +666,7 @@ def test_mafft(sb_resources, hf, monkeypatch):
     for file in sorted(files):
         with open("%s%s%s" % (root, os.path.sep, file), "r", encoding="utf-8") as ifile:
             kept_output += ifile.read()
-    assert hf.string2hash(kept_output) == "6eaa7e087dd42a8d3ffe86d216b917d8"
+    assert hf.string2hash(kept_output) == "1a45f520c0df3670c93db90907ca3978"
 
 
 def test_alignment_edges(monkeypatch, sb_resources):
@@ -718,6 +808,15 @@ def test_pull_records(key, next_hash, alb_resources, hf):
     assert hf.buddy2hash(alignbuddy) == next_hash, alignbuddy.write("error_files%s%s" % (next_hash, os.path.sep))
 
 
+def test_pull_delete_records_exact(alb_resources):
+    ids = ["Mle-Panxα1", "Mle-Panxα2", "Mle-Panxα"]
+    alignbuddy = Alb.pull_records(alb_resources.get_one("o p g"), ids, exact=True)
+    assert [rec.id for rec in alignbuddy.records()] == ["Mle-Panxα1", "Mle-Panxα2"]
+
+    alignbuddy = Alb.delete_records(alb_resources.get_one("o p g"), ids, exact=True)
+    assert len(alignbuddy.records()) == 11
+
+
 # ###########################################  '-ri', '--rename_ids' ############################################ #
 hashes = [('o d g', '98f69c2d39c9a4ca0cb5f7da026095cd'), ('o d n', '243024bfd2f686e6a6e0ef65aa963494'),
           ('o d py', '98bb9b57f97555d863054ddb526055b4'), ('o p g', '7a72ab9a2ef49a97ee60862aab1c88c3'),
@@ -732,6 +831,12 @@ def test_rename_ids(key, next_hash, alb_resources, hf):
     assert hf.buddy2hash(alignbuddy) == next_hash, alignbuddy.write("error_files%s%s" % (next_hash, os.path.sep))
 
 
+def test_bulk_rename(alb_resources):
+    tester = Alb.bulk_rename(alb_resources.get_one("o p py"), {"Mle-Panxα1": "Panx_one", "Mle-Panxα2": "Panx_two"})
+    assert [rec.id for rec in tester.records()] == ["Mle-Panxα9", "Panx_one", "Mle-Panxα3", "Mle-Panxα4",
+                                                    "Mle-Panxα8", "Mle-Panxα6", "Mle-Panxα5", "Panx_two"]
+
+
 # ###########################################  'tr', '--translate' ############################################ #
 hashes = [('o d f', 'b7fe22a87fb78ce747d80e1d73e39c35'), ('o d g', '542794541324d74ff636eaf4ee5e6b1a'),
           ('o d n', 'a2586af672ad71f16bbd54f359b323ff'), ('o d py', 'd0d4dd408e559215b2780f4f0ae0c418'),
@@ -805,3 +910,55 @@ def test_trimal2(alb_resources, hf):
     tester = Alb.AlignBuddy([MultipleSeqAlignment(records)])
     Alb.trimal(tester, "gappyout")
     assert "".join([str(rec.seq) for rec in tester.records()]) == ""
+
+
+def test_trimal_strict(alb_resources):
+    gappyout = Alb.trimal(alb_resources.get_one("o p n"), "gappyout")
+    strict = Alb.trimal(alb_resources.get_one("o p n"), "strict")
+    strictplus = Alb.trimal(alb_resources.get_one("o p n"), "strictplus")
+    assert gappyout.lengths()[0] > strict.lengths()[0] > strictplus.lengths()[0] > 0
+    assert [rec.id for rec in strict.records()] == [rec.id for rec in gappyout.records()]
+
+    # Every column that strict keeps is also kept by gappyout, and strictplus only keeps a subset of those
+    gappyout_map = [present for pos, present in gappyout.alignments[0].position_map]
+    strict_map = [present for pos, present in strict.alignments[0].position_map]
+    strictplus_map = [present for pos, present in strictplus.alignments[0].position_map]
+    assert all(gappy for gappy, strict_col in zip(gappyout_map, strict_map) if strict_col)
+    assert all(strict_col for strict_col, plus_col in zip(strict_map, strictplus_map) if plus_col)
+
+    # automated1 picks strict for these divergent protein sequences, and gappyout for the (more similar) cds
+    automated1 = Alb.trimal(alb_resources.get_one("o p n"), "automated1")
+    assert str(automated1) == str(strict)
+    automated1 = Alb.trimal(alb_resources.get_one("o d n"), "automated1")
+    assert str(automated1) == str(Alb.trimal(alb_resources.get_one("o d n"), "gappyout"))
+
+    # Isolated columns and short blocks are dropped, even if they pass both cuts
+    records = [SeqRecord(Seq(seq), id="seq%s" % indx) for indx, seq in
+               enumerate(["MKVLA-WGHKLMPQRSTC", "MKVLAAWG-KLMPQRSTC", "MKVLA-WGHKLMPQRSTC", "MKVLA-WG-KLMPQRSTC"])]
+    keep = Alb._trimal_strict(np.array([True, False, True, False, False, True, True, True, False, True]))
+    assert keep.tolist() == [False, False, False, False, False, True, True, True, False, False]
+    tester = Alb.trimal(Alb.AlignBuddy([MultipleSeqAlignment(records)]), "strict")
+    assert str(tester.records()[0].seq) == "MKVLAWGKLMPQRSTC"
+    tester = Alb.trimal(Alb.AlignBuddy([MultipleSeqAlignment(records)]), "strictplus")
+    assert str(tester.records()[0].seq) == "MKVLAKLMPQRSTC"
+
+
+def test_trimal_similarity(alb_resources):
+    records = [SeqRecord(Seq(seq)) for seq in ["AAW-X", "AAW--", "ACF--", "AAF-A"]]
+    matrix = Alb.ColumnMatrix(MultipleSeqAlignment(records))
+    similarity = Alb._trimal_similarity(matrix, protein=True)
+    assert similarity[0] == 1
+    assert 1 > similarity[1] > similarity[2] > 0
+    assert similarity[3] == similarity[4] == 0  # Too few residues to pair up
+
+    assert Alb._trimal_similarity_cut(np.array([])) == 0
+    assert round(Alb._trimal_similarity_cut(np.array([1., 0.9, 0.5, 0.1, 0.01])), 4) == 0.0157
+    assert Alb._trimal_select_method(Alb.ColumnMatrix(MultipleSeqAlignment(records[:1])), True) == "gappyout"
+
+    # Rows of a Hadamard matrix agree at exactly half of their positions, so every pairwise identity is 0.5. Like
+    # trimAl, a max identity sitting on the edge of the 0.5-0.65 range goes to strict.
+    hadamard = np.array([[1]])
+    for _ in range(5):
+        hadamard = np.block([[hadamard, hadamard], [hadamard, -hadamard]])
+    records = [SeqRecord(Seq("".join("A" if val > 0 else "C" for val in row))) for row in hadamard[:22]]
+    assert Alb._trimal_select_method(Alb.ColumnMatrix(MultipleSeqAlignment(records)), False) == "strict"
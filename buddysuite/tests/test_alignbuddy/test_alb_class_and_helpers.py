@@ -8,8 +8,10 @@ from Bio.SeqRecord import SeqRecord
 from Bio.Seq import Seq
 from Bio.Alphabet import IUPAC
 from Bio import AlignIO
+from Bio.Align import MultipleSeqAlignment
 
 import buddy_resources as br
+import AlignBuddy as Alb
 from AlignBuddy import AlignBuddy, guess_alphabet, guess_format, make_copy
 from buddy_resources import GuessError, parse_format
 
@@ -248,6 +250,46 @@ def test_write3(alb_resources, hf):  # Unloopable components
     assert hf.buddy2hash(tester) == "16b3397d6315786e8ad8b66e0d9c798f"
 
 
+def test_write_to(alb_resources, hf):
+    for key in ["o d g", "m p py", "m p c", "o p n"]:
+        alignbuddy = alb_resources.get_one(key)
+        handle = io.StringIO()
+        alignbuddy.write_to(handle)
+        assert handle.getvalue() == str(alignbuddy)
+
+    alignbuddy = alb_resources.get_one("o p py")
+    out_format = alignbuddy.out_format
+    handle = io.StringIO()
+    alignbuddy.write_to(handle, out_format="fasta")
+    assert alignbuddy.out_format == out_format
+    alignbuddy.set_format("fasta")
+    assert handle.getvalue() == str(alignbuddy)
+
+    alignbuddy.alignments = []
+    handle = io.StringIO()
+    alignbuddy.write_to(handle)
+    assert handle.getvalue() == "AlignBuddy object contains no alignments.\n"
+
+
+def test_write_partitions(alb_resources):
+    tmp_dir = br.TempDir()
+    alignbuddy = Alb.concat_alignments(alb_resources.get_one("m d py"))
+    alignbuddy.write_partitions(os.path.join(tmp_dir.path, "partitions.txt"))
+    with open(os.path.join(tmp_dir.path, "partitions.txt"), "r") as ifile:
+        assert ifile.read() == "DNA, Alignment_1 = 1-2043\nDNA, Alignment_2 = 2044-3483\n"
+
+    alignbuddy.partitions["gene 2"] = alignbuddy.partitions.pop("Alignment_2")
+    alignbuddy.write_partitions(os.path.join(tmp_dir.path, "partitions.nex"))
+    with open(os.path.join(tmp_dir.path, "partitions.nex"), "r") as ifile:
+        assert ifile.read() == "#nexus\nbegin sets;\n    charset Alignment_1 = 1-2043;\n" \
+                               "    charset gene_2 = 2044-3483;\nend;\n"
+
+    alignbuddy = Alb.concat_alignments(alb_resources.get_one("m p py"))
+    alignbuddy.write_partitions(os.path.join(tmp_dir.path, "partitions.txt"))
+    with open(os.path.join(tmp_dir.path, "partitions.txt"), "r") as ifile:
+        assert ifile.read() == "LG, Alignment_1 = 1-681\nLG, Alignment_2 = 682-1161\n"
+
+
 # ################################################# HELPER FUNCTIONS ################################################# #
 def test_guess_error(alb_odd_resources):
     # File path
@@ -315,4 +357,65 @@ def test_make_copy(alb_resources, hf):
         tester = make_copy(alb)
         hf.buddy2hash(tester) == hf.buddy2hash(alb)
 
+
+def test_make_copy_shallow(alb_resources, hf):
+    for alb in alb_resources.get_list("m d g py"):
+        alb_hash = hf.buddy2hash(alb)
+        tester = make_copy(alb, shallow=True)
+        assert hf.buddy2hash(tester) == alb_hash
+        assert tester.alignments[0] is not alb.alignments[0]
+        assert tester.records()[0].seq is alb.records()[0].seq
+
+        Alb.trimal(tester, "clean")
+        Alb.rename(tester, "Mle", "Foo")
+        assert hf.buddy2hash(alb) == alb_hash
+
+
+def test_column_matrix(alb_resources):
+    alignment = alb_resources.get_one("o p g").alignments[0]
+    matrix = Alb.ColumnMatrix(alignment)
+    assert matrix.matrix.shape == (len(alignment), alignment.get_alignment_length())
+    assert matrix.num_columns == alignment.get_alignment_length()
+    assert matrix.codec == "ascii"
+    assert matrix.rows() == [str(rec.seq) for rec in alignment]
+    assert matrix.rows([0, 5, 5]) == [str(rec.seq[0] + rec.seq[5] + rec.seq[5]) for rec in alignment]
+    assert matrix.count("-").tolist() == [str(alignment[:, indx]).count("-") for indx in range(matrix.num_columns)]
+    assert matrix.count("-M").tolist()[:3] == [str(alignment[:, indx]).count("-") + str(alignment[:, indx]).count("M")
+                                              for indx in range(3)]
+    assert list(matrix.column_blocks(cells=len(alignment) * 100))[-1] == slice(600, 700)
+
+    residues, counts = matrix.histogram()
+    assert counts.shape == (len(residues), matrix.num_columns)
+    assert counts.sum(axis=0).tolist() == [len(alignment)] * matrix.num_columns
+    for indx in [0, 100, matrix.num_columns - 1]:
+        column = str(alignment[:, indx])
+        assert {chr(res): int(count) for res, count in zip(residues, counts[:, indx]) if count} == \
+            {res: column.count(res) for res in set(column)}
+
+    new_alignment = matrix.to_alignment(matrix.count("-") == 0)
+    assert [rec.id for rec in new_alignment] == [rec.id for rec in alignment]
+    assert new_alignment.get_alignment_length() == int((matrix.count("-") == 0).sum())
+    assert "-" not in str(new_alignment[0].seq)
+
+    records = [SeqRecord(Seq("AβC-"), id="a", letter_annotations={"phred_quality": [1, 2, 3, 4]}),
+               SeqRecord(Seq("A-Cα"), id="b", letter_annotations={"phred_quality": [5, 6, 7, 8]})]
+    matrix = Alb.ColumnMatrix(MultipleSeqAlignment(records))
+    assert matrix.codec == "utf-32-le"
+    assert matrix.count("-β").tolist() == [0, 2, 0, 1]
+    residues, counts = matrix.histogram()
+    assert "".join([chr(res) for res in residues]) == "-ACαβ"
+    assert counts.tolist() == [[0, 1, 0, 1], [2, 0, 0, 0], [0, 0, 2, 0], [0, 0, 0, 1], [0, 1, 0, 0]]
+    new_alignment = matrix.to_alignment([1, 3])
+    assert [str(rec.seq) for rec in new_alignment] == ["β-", "-α"]
+    assert new_alignment[1].letter_annotations["phred_quality"] == [6, 8]
+    assert Alb.decode_rows(matrix.matrix[:, :0], matrix.codec) == ["", ""]
+
+    alignment = MultipleSeqAlignment(records)
+    alignment[1].letter_annotations = {}
+    alignment[1].seq = Seq("A-C")
+    with pytest.raises(ValueError) as err:
+        Alb.ColumnMatrix(alignment)
+    assert "Sequences must all be the same length" in str(err)
+
+
 # ToDo: def test_feature_remapper()
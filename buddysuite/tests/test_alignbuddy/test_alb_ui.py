@@ -163,6 +163,12 @@ def test_bootstrap_ui(capsys, alb_resources):
     tester = Alb.AlignBuddy(out)
     assert tester.lengths() == [481, 481, 481, 683, 683, 683]
 
+    test_in_args.bootstrap = [2]
+    Alb.command_line_ui(test_in_args, alb_resources.get_one("o p g"), skip_exit=True)
+    out, err = capsys.readouterr()
+    assert not out
+    assert "ValueError: gb format does not support multiple alignments in one file." in err
+
 
 # ##################### '-cs', '--clean_seqs' ###################### ##
 def test_clean_seqs_ui(capsys, alb_resources, alb_odd_resources, hf):
@@ -179,6 +185,36 @@ def test_clean_seqs_ui(capsys, alb_resources, alb_odd_resources, hf):
 
 
 # ##################### '-cta', '--concat_alignments' ###################### ##
+def test_concat_alignment_files_ui(capsys, monkeypatch, alb_resources):
+    tmp_dir = br.TempDir()
+    tmp_dir.subdir("genes")
+    genes = os.path.join(tmp_dir.path, "genes")
+    for indx, alignment in enumerate(alb_resources.get_one("m p py").alignments):
+        Alb.AlignBuddy([alignment], out_format="fasta").write(os.path.join(genes, "gene%s.fa" % (indx + 1)))
+
+    # Directories are handed over to concat_alignment_files() without being read
+    monkeypatch.setattr(sys, 'argv', ['AlignBuddy.py', genes, "-cta"])
+    temp_in_args, alignbuddy = Alb.argparse_init()
+    assert alignbuddy == [genes]
+
+    test_in_args = deepcopy(in_args)
+    test_in_args.concat_alignments = [[]]
+    test_in_args.partitions = os.path.join(tmp_dir.path, "partitions.txt")
+    Alb.command_line_ui(test_in_args, [genes], skip_exit=True)
+    out, err = capsys.readouterr()
+    expected = Alb.concat_alignments(alb_resources.get_one("m p py"))
+    expected.set_format("fasta")
+    assert out == str(expected)
+    with open(test_in_args.partitions, "r") as ifile:
+        assert ifile.read() == "LG, gene1 = 1-681\nLG, gene2 = 682-1161\n"
+
+    with open(os.path.join(genes, "notes.txt"), "w") as ofile:
+        ofile.write("Not an alignment\n")
+    Alb.command_line_ui(test_in_args, [genes], skip_exit=True)
+    out, err = capsys.readouterr()
+    assert "GuessError: Could not determine format" in err
+
+
 def test_concat_alignments_ui(capsys, alb_resources, hf):
     test_in_args = deepcopy(in_args)
     test_in_args.concat_alignments = [[]]
@@ -235,7 +271,7 @@ def test_concat_alignments_ui(capsys, alb_resources, hf):
 # ##################### '-con', '--consensus' ###################### ##
 def test_consensus_ui(capsys, alb_resources, hf):
     test_in_args = deepcopy(in_args)
-    test_in_args.consensus = True
+    test_in_args.consensus = [[]]
     Alb.command_line_ui(test_in_args, alb_resources.get_one("m d s"), skip_exit=True)
     out, err = capsys.readouterr()
     assert hf.string2hash(out) == "7b0aa3cca159b276158cf98209be7dab"
@@ -244,6 +280,26 @@ def test_consensus_ui(capsys, alb_resources, hf):
     out, err = capsys.readouterr()
     assert hf.string2hash(out) == "89130797253646e61b78ab7d91ad3fd9"
 
+    test_in_args.consensus = [["ambiguous", "75", "gaps"]]
+    Alb.command_line_ui(test_in_args, alb_resources.get_one("o d f"), skip_exit=True)
+    out, err = capsys.readouterr()
+    tester = Alb.AlignBuddy(out)
+    assert len(tester.records()) == 1
+    assert tester.records()[0].seq == Alb.consensus_sequence(alb_resources.get_one("o d f"), "ambiguous", 75,
+                                                             True).records()[0].seq
+
+    test_in_args.consensus = [["profile"]]
+    Alb.command_line_ui(test_in_args, alb_resources.get_one("m p s"), skip_exit=True)
+    out, err = capsys.readouterr()
+    assert out.count("Position\t-\t") == 2
+    assert "# Alignment 2" in out
+    assert "\n1\t" in out
+
+    test_in_args.consensus = [["foo"]]
+    Alb.command_line_ui(test_in_args, alb_resources.get_one("o d f"), skip_exit=True)
+    out, err = capsys.readouterr()
+    assert "NotImplementedError: 'foo' is not an implemented consensus mode" in err
+
 
 # ##################### '-dr', '--delete_records' ###################### ##
 def test_delete_records_ui(capsys, alb_resources, hf):
@@ -519,6 +575,13 @@ def test_rename_ids_ui(capsys, alb_resources, hf):
         Alb.command_line_ui(test_in_args, tester, pass_through=True)
     assert "There are more replacement" in str(err)
 
+    temp_file = br.TempFile()
+    temp_file.write("Mle-Panxα1\tPanx_one\n")
+    test_in_args.rename_ids = [[temp_file.path]]
+    Alb.command_line_ui(test_in_args, alb_resources.get_one("o p g"), True)
+    out, err = capsys.readouterr()
+    assert "Panx_one" in out and "Mle-Panxα1 " not in out
+
 
 # ##################### '-r2d', '--reverse_transcribe' ###################### ##
 def test_reverse_transcribe_ui(capsys, alb_resources, hf):
@@ -678,6 +741,11 @@ def test_trimal_ui(capsys, alb_resources, hf):
     out, err = capsys.readouterr()
     assert hf.string2hash(out) == "5df948e4b2cb6c0d0740984445655135"
 
+    test_in_args.trimal = ["strict"]
+    Alb.command_line_ui(test_in_args, alb_resources.get_one("o p n"), skip_exit=True)
+    out, err = capsys.readouterr()
+    assert out == str(Alb.trimal(alb_resources.get_one("o p n"), "strict"))
+
     test_in_args.trimal = ["foo"]
     with pytest.raises(NotImplementedError) as err:
         Alb.command_line_ui(test_in_args, alb_resources.get_one("o p n"), pass_through=True)
@@ -14,11 +14,15 @@ import json
 from hashlib import md5
 from time import sleep
 import datetime
+from collections import OrderedDict
+from multiprocessing import Lock
 from unittest import mock
 import AlignBuddy as Alb
 import buddy_resources as br
 from pkg_resources import DistributionNotFound
 from configparser import ConfigParser
+from Bio.Seq import Seq
+from Bio.SeqFeature import SeqFeature, FeatureLocation
 if os.name == "nt":
     import msvcrt
 
@@ -216,21 +220,21 @@ def test_run_multicore_function(monkeypatch, hf):
                                   max_processes=0, quiet=False, out_type=output)
     with open(temp_path, "r") as out:
         output = out.read()
-        assert hf.string2hash(output) in ["107696d60ee9b932ecaffad7c97a609f", "c2adacdaf0de6526c707564068a3460a"]
+        assert hf.string2hash(output) == "01c08a947d156b37ed38a7b2387db887"
 
     with open(temp_path, "w") as output:
         br.run_multicore_function(nums, lambda *_: True, func_args=["Foo"],
                                   max_processes=5, quiet=False, out_type=output)
     with open(temp_path, "r") as out:
         output = out.read()
-        assert hf.string2hash(output) in ["107696d60ee9b932ecaffad7c97a609f", "c2adacdaf0de6526c707564068a3460a"]
+        assert hf.string2hash(output) == "01c08a947d156b37ed38a7b2387db887"
 
     with open(temp_path, "w") as output:
         br.run_multicore_function({"a": 1, "b": 2, "c": 3, "d": 4}, lambda *_: True, func_args=False,
                                   max_processes=-4, quiet=False, out_type=output)
     with open(temp_path, "r") as out:
         output = out.read()
-        assert hf.string2hash(output) in ["cf5afec941a4b854ed78f01d2753009d", "b9a2268fefae3786a611f5e699fd6200"]
+        assert hf.string2hash(output) == "a0a1d4535bb3ed0af6bf7e5b1bafd655"
 
     with pytest.raises(AttributeError) as err:
         br.run_multicore_function(nums, lambda *_: True, func_args="Foo", max_processes=4, quiet=False,
@@ -252,7 +256,7 @@ def test_run_multicore_function(monkeypatch, hf):
                                   max_processes=1, quiet=False, out_type=output)
     with open(temp_path, "r") as out:
         output = out.read()
-        assert hf.string2hash(output) in ["08f48aaa5d64ac48ea15a4aa63d75141", 'b9a2268fefae3786a611f5e699fd6200']
+        assert hf.string2hash(output) == "8ec9fbf5724978bbb99347dcf7b007c4"
 
     timer = MockTime()
     monkeypatch.setattr(br, "time", timer.time)
@@ -265,6 +269,24 @@ def test_run_multicore_function(monkeypatch, hf):
     assert "Running function <lambda>() on 4 cores" in output
     assert re.search("DONE: 4 jobs in [0-9]+ sec", output)
 
+    with pytest.raises(ValueError) as err:
+        br.run_multicore_function(nums, lambda *_: True, pool="Foo")
+    assert "The 'pool' argument must be either 'process' or 'thread'" in str(err)
+
+
+@pytest.mark.parametrize("pool", ["process", "thread"])
+def test_run_multicore_function_results(pool):
+    lock = Lock()  # Closures and unpicklable objects are fine, because process workers are forked
+
+    def multiply(num, args):
+        with lock:
+            return num * args[0]
+
+    assert br.run_multicore_function(range(20), multiply, func_args=[3], max_processes=4, quiet=True,
+                                     pool=pool) == [num * 3 for num in range(20)]
+    assert br.run_multicore_function({"a": 1, "b": 2}, lambda num: num + 1, quiet=True, pool=pool) == [2, 3]
+    assert br.run_multicore_function([], lambda num: num, quiet=True, pool=pool) == []
+
 
 # ######################################  TempDir  ###################################### #
 def test_tempdir_init():
@@ -360,6 +382,33 @@ def test_tempfile():
     assert open("{0}/temp".format(TEMP_DIR.path), 'r').read() == "hello world"
 
 
+def test_rstripwriter():
+    handle = io.StringIO()
+    ofile = br.RStripWriter(handle)
+    ofile.write(">seq1\nATGC\n")
+    assert handle.getvalue() == ">seq1\nATGC"
+    ofile.write("   \n\n")
+    assert handle.getvalue() == ">seq1\nATGC"
+    ofile.write(">seq2\nTTTT\n\n")
+    ofile.close()
+    assert handle.getvalue() == ">seq1\nATGC\n   \n\n>seq2\nTTTT\n"
+    ofile.close()
+    assert handle.getvalue() == ">seq1\nATGC\n   \n\n>seq2\nTTTT\n"
+
+    handle = io.StringIO()
+    ofile = br.RStripWriter(handle)
+    ofile.write("foo  \n")
+    ofile.close("\n\n")
+    assert handle.getvalue() == "foo\n\n"
+
+    handle = io.StringIO()
+    ofile = br.RStripWriter(handle, strip_lines=True)
+    ofile.write("LOCUS  foo  \nbar ")
+    ofile.write("  \n   \n\nbaz\n  ")
+    ofile.close()
+    assert handle.getvalue() == "LOCUS  foo\nbar\n\n\nbaz\n"
+
+
 def test_safetyvalve():
     valve = br.SafetyValve()
     with pytest.raises(RuntimeError):
@@ -877,6 +926,38 @@ Mle-Panxα8M--LLE--------A
     assert "Malformed Phylip --> Repeat id 'Mle-Panxα8' after strict truncation. " in str(err)
 
 
+def test_sniff_signatures():
+    assert br.sniff_signatures("") == []
+    assert br.sniff_signatures("\n\n>seq1\nATGC\n") == ["fasta"]
+    assert br.sniff_signatures("@seq1\nATGC\n+\nIIII\n") == ["fastq"]
+    assert br.sniff_signatures("@seq1\nATGC\nATGC\n") == []
+    assert br.sniff_signatures("LOCUS       Mle-Panxα1") == ["gb"]
+    assert br.sniff_signatures("ID   Mle-Panxα1; SV 1; linear; DNA; STD; UNC; 1341 BP.") == ["embl", "swiss"]
+    assert br.sniff_signatures("ID   A0A087WX72_HUMAN   Unreviewed;   268 AA.") == ["swiss", "embl"]
+    assert br.sniff_signatures("# STOCKHOLM 1.0\n") == ["stockholm"]
+    assert br.sniff_signatures("#nexus\nbegin data;") == ["nexus"]
+    assert br.sniff_signatures('<?xml version="1.0"?>\n<seqXML>') == ["seqxml"]
+    assert br.sniff_signatures('<?xml version="1.0"?>\n<nex:nexml>') == ["nexml"]
+    assert br.sniff_signatures("CLUSTAL W 2.1 multiple sequence alignment\n") == ["clustal"]
+    assert br.sniff_signatures(" 13 1510\nMle-Panxα9 ") == ["phylipss", "phylipsr", "phylip", "phylip-relaxed"]
+    assert br.sniff_signatures("((A,B),C);") == ["newick"]
+    assert br.sniff_signatures("Foo bar\n") == []
+
+
+def test_sniff_format():
+    possible_formats = ["stockholm", "fasta", "gb", "fastq", "embl", "swiss"]
+    handle = io.StringIO("LOCUS       Mle-Panxα1\n")
+    handle.read(5)
+    assert br.sniff_format(handle, possible_formats) == ["gb", "stockholm", "fasta", "fastq", "embl", "swiss"]
+    assert handle.tell() == 0
+
+    handle = io.StringIO("ID   A0A087WX72_HUMAN   Unreviewed;   268 AA.\n")
+    assert br.sniff_format(handle, possible_formats) == ["swiss", "embl", "stockholm", "fasta", "gb", "fastq"]
+
+    handle = io.StringIO("#NEXUS\n")
+    assert br.sniff_format(handle, possible_formats) == possible_formats
+
+
 def test_replacements():
     input_str = "This test is A string with numbers (12345) and This [CHARS] is a test"
     assert br.replacements(input_str, "numbers", "integers") == "This test is A string with integers (12345) and " \
@@ -903,6 +984,42 @@ def test_replacements():
     assert "There are more replacement match values specified than query parenthesized groups" in str(err)
 
 
+def test_bulk_replacer():
+    # Whole strings only by default
+    replace = br.bulk_replacer({"Mle-Panxα1": "Panx1", "xY9z0": r"Seq\1"})
+    assert replace("Mle-Panxα1") == "Panx1"
+    assert replace("xY9z0") == r"Seq\1"
+    assert replace("Mle-Panxα10B") == "Mle-Panxα10B"
+    assert replace("Mle-Panxα1 xY9z0") == "Mle-Panxα1 xY9z0"
+    assert br.bulk_replacer({})("Ab3dE") == "Ab3dE"
+
+    replace = br.bulk_replacer({"Ab3dE": "Mle-Panxα1", "xY9z0": r"Seq\1", "k2K2k2": "Long_id"}, substrings=True)
+    assert replace("Ab3dE") == "Mle-Panxα1"
+    assert replace(r"xY9z0") == r"Seq\1"
+    assert replace("Ab3dE_1 xY9z0:0.1,(k2K2k2)") == r"Mle-Panxα1_1 Seq\1:0.1,(Long_id)"
+    assert replace(">Ab3dEk2K2k2\nACGTAb3dE\n") == ">Mle-Panxα1Long_id\nACGTMle-Panxα1\n"
+    assert replace("Ab3d Ab3dF") == "Ab3d Ab3dF"
+    assert br.bulk_replacer({}, substrings=True)("Ab3dE") == "Ab3dE"
+
+    # Overlapping keys resolve to the longest match
+    replace = br.bulk_replacer({"Panx": "A", "Panxα1": "B", "Panxα10": "C", "x.": "D"}, substrings=True)
+    assert replace("Panxα1 Panxα10 Panxα2 Panxα100 x. xx") == "B C Aα2 C0 D xx"
+
+
+def test_read_rename_table():
+    tmp_file = br.TempFile()
+    tmp_file.write("# old\tnew\nMle-Panxα1\tPanx 1\n\nMle-Panxα2\tPanx2\n")
+    assert br.read_rename_table(tmp_file.path) == OrderedDict([("Mle-Panxα1", "Panx 1"), ("Mle-Panxα2", "Panx2")])
+
+    tmp_file.write("Mle-Panxα1  Panx1\r\nMle-Panxα2 Panx2\r\n", mode="w")
+    assert br.read_rename_table(tmp_file.path) == OrderedDict([("Mle-Panxα1", "Panx1"), ("Mle-Panxα2", "Panx2")])
+
+    tmp_file.write("Mle-Panxα1\tPanx1\nMle-Panxα2\n", mode="w")
+    with pytest.raises(ValueError) as err:
+        br.read_rename_table(tmp_file.path)
+    assert "as a rename table. Each line needs an old and a new value" in str(err)
+
+
 def test_send_traceback(capsys, monkeypatch):
     monkeypatch.setattr(br, "error_report", lambda *_: False)
     version = br.Version("Foo", 1, 2, [])
@@ -940,6 +1057,28 @@ RuntimeError: Something broke!
         assert "raise TypeError" in out
 
 
+def test_copy_record(sb_resources):
+    rec = sb_resources.get_one("d g").records[0]
+    rec_copy = br.copy_record(rec)
+    assert rec_copy.seq is rec.seq
+    assert rec_copy.id == rec.id
+    assert [str(feat.location) for feat in rec_copy.features] == [str(feat.location) for feat in rec.features]
+
+    rec_copy.features[0].location = br.FeatureLocation(0, 10)
+    rec_copy.features[0].qualifiers["foo"] = ["bar"]
+    rec_copy.features.pop()
+    rec_copy.annotations["organism"] = "Foo"
+    assert str(rec.features[0].location) != str(rec_copy.features[0].location)
+    assert "foo" not in rec.features[0].qualifiers
+    assert len(rec.features) == len(rec_copy.features) + 1
+    assert rec.annotations["organism"] != "Foo"
+
+    rec = sb_resources.get_one("d q").records[0]
+    rec_copy = br.copy_record(rec)
+    assert rec_copy.letter_annotations == rec.letter_annotations
+    assert rec_copy.letter_annotations is not rec.letter_annotations
+
+
 def test_shift_features(sb_resources, hf):
     buddy = sb_resources.get_one("d g")
     buddy.records = [buddy.records[0]]
@@ -1084,6 +1223,7 @@ def test_old2new_error(alb_resources):
 def test_remap_gapped_features(alb_resources, sb_resources):
     align_recs = alb_resources.get_one("o d g").records()
     seq_recs = sb_resources.get_one("d g").records
+    seq_str = "".join(["%s\n" % feat for seq_rec in seq_recs for feat in seq_rec.features])
 
     new_recs = br.remap_gapped_features(seq_recs, align_recs)
     align_str, new_str = "", ""
@@ -1092,6 +1232,32 @@ def test_remap_gapped_features(alb_resources, sb_resources):
             align_str += "%s\n" % align_feat
             new_str += "%s\n" % new_feat
     assert align_str == new_str
+    # The original records are left alone
+    assert seq_str == "".join(["%s\n" % feat for seq_rec in seq_recs for feat in seq_rec.features])
+
+    # Records spread over several processes
+    align_recs = alb_resources.get_one("o d g").records()
+    seq_recs = sb_resources.get_one("d g").records
+    new_recs = br.remap_gapped_features(seq_recs, align_recs, max_processes=2)
+    assert new_str == "".join(["%s\n" % feat for new_rec, align_rec in zip(new_recs, align_recs)
+                               for feat in new_rec.features[:len(align_rec.features)]])
+
+
+def test_old2new_mismatched_residues(sb_resources):
+    # Falls back on walking the residues when the sequences don't match up
+    seq_rec = sb_resources.get_one("d f").records[0]
+    new_rec = seq_rec[:]
+    new_rec.seq = Seq("--" + str(seq_rec.seq)[:10] + "-x" + str(seq_rec.seq)[11:], alphabet=seq_rec.seq.alphabet)
+    assert br._gap_index(seq_rec, new_rec) is None
+    feature = br._old2new(SeqFeature(FeatureLocation(2, 8)), seq_rec, new_rec)
+    assert str(feature.location) == "[4:10]"
+    feature = br._old2new(SeqFeature(FeatureLocation(2, 20)), seq_rec, new_rec)
+    assert str(feature.location) == "[4:%s]" % len(new_rec.seq)
+
+    new_rec.seq = Seq("--" + str(seq_rec.seq)[:10] + "-" + str(seq_rec.seq)[10:], alphabet=seq_rec.seq.alphabet)
+    assert br._gap_index(seq_rec, new_rec) is not None
+    feature = br._old2new(SeqFeature(FeatureLocation(2, 20)), seq_rec, new_rec)
+    assert str(feature.location) == "[4:23]"
 
 
 def test_stderr(capsys):
@@ -1144,3 +1310,17 @@ def test_clean_regex(capsys):
     assert br.clean_regex(patterns, quiet=True) == ["[1-4]This is fine"]
     out, err = capsys.readouterr()
     assert err == ""
+
+
+def test_record_matcher():
+    matcher = br.record_matcher(["α1$", "β"])
+    assert matcher("Mle-Panxα1")
+    assert not matcher("Mle-Panxα10A")
+    assert matcher("foo", "Mle-Panxβ2")
+    assert br.record_matcher("*")("anything")
+
+    matcher = br.record_matcher(["Mle-Panxα1", "Mle-Panxβ2"], exact=True)
+    assert matcher("Mle-Panxα1")
+    assert not matcher("Mle-Panxα10A")
+    assert matcher("foo", "Mle-Panxβ2")
+    assert not br.record_matcher("*", exact=True)("anything")
@@ -451,6 +451,14 @@ def test_prune_taxa_edge(pb_resources, hf):
     assert hf.buddy2hash(mix) == "6dd711f4330e7f088563045616085ba5"
 
 
+def test_prune_taxa_exact(pb_resources):
+    tester = pb_resources.get_one("o k")
+    labels = [node.taxon.label for node in tester.trees[0].leaf_node_iter()]
+    Pb.prune_taxa(tester, labels[0], labels[1][:-1], exact=True)
+    remaining = [node.taxon.label for node in tester.trees[0].leaf_node_iter()]
+    assert remaining == labels[1:]
+
+
 # ######################  'ri', '--rename_ids' ###################### #
 hashes = [('m k', '6843a620b725a3a0e0940d4352f2036f'), ('m n', '543d2fc90ca1f391312d6b8fe896c59c'),
           ('m l', '6ce146e635c20ad62e21a1ed6fddbd3a'), ('o k', '4dfed97b2a23b8957ee5141bf4681fe4'),
@@ -464,6 +472,19 @@ def test_rename_ids(key, next_hash, pb_resources, hf):
     assert hf.buddy2hash(tester) == next_hash
 
 
+def test_bulk_rename(pb_resources):
+    tester = Pb.bulk_rename(pb_resources.get_one("o k"), {"penHA34": "Pen34", "penHA34a": "Pen34A"})
+    assert "(((Pen34A:1.0,penHA34b:1.0,penHA32b:1.0" in str(tester)
+
+    tester = Pb.bulk_rename(pb_resources.get_one("o k"), {"penHA34": "Pen34", "penHA34a": "Pen34A"}, substrings=True)
+    assert "(((Pen34A:1.0,Pen34b:1.0,penHA32b:1.0" in str(tester)
+
+    tmp_file = br.TempFile()
+    tmp_file.write("penHA34a\tPen34A\n")
+    tester = Pb.bulk_rename(pb_resources.get_one("o k"), tmp_file.path)
+    assert "(((Pen34A:1.0,penHA34b:1.0" in str(tester)
+
+
 def test_rename_nodes(pb_odd_resources, hf):
     tester = Pb.PhyloBuddy(pb_odd_resources["node_lables"])
     Pb.rename(tester, "Equus|Ruminantiamorpha|Canis", "Family")
@@ -3,8 +3,10 @@
 
 """ tests basic functionality of AlignBuddy class """
 import pytest
-from Bio.SeqFeature import FeatureLocation, CompoundLocation
+from Bio.SeqFeature import SeqFeature, FeatureLocation, CompoundLocation
+from Bio.SeqRecord import SeqRecord
 from Bio.Seq import Seq
+from Bio.Alphabet import IUPAC
 from unittest import mock
 import os
 import re
@@ -185,6 +187,47 @@ def test_back_translate(key, organism, opt_hash, rand_hash, sb_resources, hf):
     assert hf.buddy2hash(tester) == rand_hash
 
 
+def test_back_translate_codon_usage_file(sb_resources):
+    # Kazusa style table, where GCG is the preferred alanine codon and CTA is never used for leucine
+    temp_file = br.TempFile()
+    temp_file.write("""UUU 17.6(714298)  UCU 15.2(618711)  UAU 12.2(495699)  UGU 10.6(430311)
+UUC 20.3(824692)  UCC 17.7(718892)  UAC 15.3(622407)  UGC 12.6(513028)
+UUA  7.7(311881)  UCA 12.2(496448)  UAA  1.0( 40285)  UGA  1.6( 63237)
+UUG 12.9(525688)  UCG  4.4(179419)  UAG  0.8( 32109)  UGG 13.2(535595)
+
+CUU 13.2(536515)  CCU 17.5(713233)  CAU 10.9(441711)  CGU  4.5(184609)
+CUC 19.6(796638)  CCC 19.8(804620)  CAC 15.1(613713)  CGC 10.4(423516)
+CUA  0.0(     0)  CCA 16.9(688038)  CAA 12.3(501911)  CGA  6.2(250760)
+CUG 39.6(1611801) CCG  6.9(281570)  CAG 34.2(1391973) CGG 11.4(464485)
+
+AUU 16.0(650473)  ACU 13.1(533609)  AAU 17.0(689701)  AGU 12.1(493429)
+AUC 20.8(846466)  ACC 18.9(768147)  AAC 19.1(776603)  AGC 19.5(791383)
+AUA  7.5(304565)  ACA 15.1(614523)  AAA 24.4(993621)  AGA 12.2(494682)
+AUG 22.0(896005)  ACG  6.1(246105)  AAG 31.9(1295568) AGG 12.0(486463)
+
+GUU 11.0(448607)  GCU 18.4(750096)  GAU 21.8(885429)  GGU 10.8(437126)
+GUC 14.5(588138)  GCC 27.7(1127679) GAC 25.1(1020595) GGC 22.2(903565)
+GUA  7.1(287712)  GCA 15.8(643471)  GAA 29.0(1177632) GGA 16.5(669873)
+GUG 28.1(1143534) GCG 37.4(301696)  GAG 39.6(1609975) GGG 16.5(669768)
+""")
+    tester = Sb.back_translate(sb_resources.get_one("p f"), mode="o", species=temp_file.path)
+    codons = [str(rec.seq)[i:i + 3] for rec in tester.records for i in range(0, len(rec), 3)]
+    assert "GCG" in codons and not {"GCT", "GCC", "GCA"} & set(codons)
+    # translate_cds() reads the NNN codons from X residues as N
+    proteins = [str(rec.seq).upper().rstrip("*").replace("X", "N") for rec in sb_resources.get_one("p f").records]
+    assert [str(rec.seq).rstrip("*") for rec in Sb.translate_cds(tester, quiet=True).records] == proteins
+
+    tester = Sb.back_translate(sb_resources.get_one("p f"), species=temp_file.path, r_seed=12345)
+    assert "CTA" not in [str(rec.seq)[i:i + 3] for rec in tester.records for i in range(0, len(rec), 3)]
+    assert str(tester) == str(Sb.back_translate(sb_resources.get_one("p f"), species=temp_file.path, r_seed=12345))
+
+    temp_file.clear()
+    temp_file.write("Not a codon usage table")
+    with pytest.raises(ValueError) as e:
+        Sb.back_translate(sb_resources.get_one("p f"), species=temp_file.path)
+    assert "Unable to find any codon frequencies" in str(e.value)
+
+
 def test_back_translate_nucleotide_exception(sb_resources):
     with pytest.raises(TypeError):
         Sb.back_translate(sb_resources.get_one("d g"))
@@ -202,9 +245,39 @@ def test_back_translate_bad_organism(sb_resources):
 
 
 # ######################  '-bl2s', '--bl2seq' ###################### #
-# ToDo: Mock output data
-def test_bl2seq():
-    pass
+def test_bl2seq(monkeypatch, sb_resources):
+    commands = []
+
+    class MockBl2seqPopen(object):
+        def __init__(self, command, **_):
+            commands.append(command)
+            self.command = command
+
+        def communicate(self):
+            if self.command.startswith("blastp"):
+                out_file = re.search("-out '(.*?)'", self.command).group(1)
+                with open(out_file, "w", encoding="utf-8") as ofile:
+                    ofile.write("seq0\tseq0\t100.000\t300\t0.0\t600\n"
+                                "seq1\tseq0\t75.000\t280\t1e-50\t300\n"
+                                "seq1\tseq0\t50.000\t20\t0.5\t20\n"  # Lower scoring HSP is ignored
+                                "seq0\tseq1\t74.000\t281\t1e-49\t299\n"  # Reverse search is only a fallback
+                                "seq0\tseq2\t40.000\t100\t0.0\t150\n")
+            return ["".encode(), "".encode()]
+
+    monkeypatch.setattr(Sb, "_check_for_blast_bin", lambda _: True)
+    monkeypatch.setattr(Sb, "Popen", MockBl2seqPopen)
+    seqbuddy = Sb.pull_recs(sb_resources.get_one("p f"), "Mle-Panxα[123]$")
+    result = Sb.bl2seq(seqbuddy, num_threads=3)
+    assert len(commands) == 2
+    assert commands[0].startswith("makeblastdb -dbtype prot")
+    assert "-num_threads 3 -max_target_seqs 3" in commands[1]
+
+    ids = [rec.id for rec in seqbuddy.records]
+    assert list(result) == sorted(ids)
+    assert result[ids[1]][ids[0]] == [75.0, 280, 1e-50, 300.0]
+    assert result[ids[0]][ids[1]] == [75.0, 280, 1e-50, 300.0]
+    assert result[ids[0]][ids[2]] == [40.0, 100, 1e-180, 150.0]
+    assert result[ids[1]][ids[2]] == [0.0, 0, 0.0, 0.0]
 
 
 def test_bl2_no_binary(sb_resources):
@@ -218,6 +291,16 @@ def test_bl2_no_binary(sb_resources):
                 Sb.bl2seq(sb_resources.get_one("p f"))
 
 
+def test_bl2seq_python_backend(sb_resources, hf):
+    tester = Sb.pull_recs(sb_resources.get_one("d f"), "α1[02]")
+    result = Sb.bl2seq(tester, backend="python")
+    assert hf.string2hash(str(result)) == "7e8a7a8bdc78e5aa15b9b22b1c9c5a83", print(result)
+
+    with pytest.raises(ValueError) as err:
+        Sb.bl2seq(tester, backend="foo")
+    assert "The bl2seq backend must be either 'blast' or 'python'" in str(err)
+
+
 # ######################  '-bl', '--blast' ###################### #
 class MockPopen(object):
     def __init__(self, command, shell, stdout=None, stderr=None):
@@ -458,6 +541,34 @@ def test_blast_errors(monkeypatch, capsys, sb_resources, hf):
     assert "blastn not found in system path." in str(err)
 
 
+# ######################  '-cdh', '--cd_hit'  ###################### #
+def test_cd_hit(sb_resources, hf):
+    tester = Sb.cd_hit(sb_resources.get_one("p f"), 0.5)
+    assert [rec.id for rec in tester.records] == ['Mle-Panxα7A', 'Mle-Panxα8', 'Mle-Panxα1', 'Mle-Panxα2',
+                                                  'Mle-Panxα5', 'Mle-Panxα4', 'Mle-Panxα3', 'Mle-Panxα6',
+                                                  'Mle-Panxα11', 'Mle-Panxα10A']
+    assert tester.records[-1].buddy_data["cluster"] == ['Mle-Panxα12', 'Mle-Panxα9', 'Mle-Panxα10B']
+    assert tester.records[0].buddy_data["cluster"] is None
+
+    # Percentages work too, and small batches get the same answer as one big batch
+    tester = Sb.cd_hit(sb_resources.get_one("p f"), 40, batch_size=3)
+    assert hf.buddy2hash(tester) == "414cbc0df95f6d80fb9d25075175d088", print(tester)
+    assert hf.buddy2hash(Sb.cd_hit(sb_resources.get_one("p f"), 40)) == hf.buddy2hash(tester)
+    assert tester.records[-1].buddy_data["cluster"] == ['Mle-Panxα8', 'Mle-Panxα3', 'Mle-Panxα6', 'Mle-Panxα12',
+                                                        'Mle-Panxα9', 'Mle-Panxα10B']
+
+    tester = Sb.cd_hit(sb_resources.get_one("d f"), 0.5, word_size=5)
+    assert hf.buddy2hash(tester) == "e70cb429c1234b9d4df0b564d0146e5f", print(tester)
+    assert tester.records[-1].buddy_data["cluster"] == ['Mle-Panxα9', 'Mle-Panxα10B']
+
+    tester = Sb.cd_hit(sb_resources.get_one("d f"), 0.99)
+    assert len(tester.records) == 13
+
+    with pytest.raises(ValueError) as err:
+        Sb.cd_hit(sb_resources.get_one("d f"), 101)
+    assert "The cd_hit threshold must be between 0 and 1 (or a percentage)." in str(err)
+
+
 # ######################  '-cs', '--clean_seq'  ###################### #
 def test_clean_seq_prot(sb_resources, hf):
     # Protein
@@ -566,6 +677,15 @@ def test_count_codons_pep_exception(sb_resources):
         Sb.count_codons(tester)
 
 
+def test_count_codons_long_seq(capsys):
+    tester = Sb.SeqBuddy(">seq1\n%sat-g.ccc%sPPPcg\n" % ("ATG" * 100000, "TAA" * 50000), in_format="fasta")
+    counts = Sb.count_codons(tester)[1]["seq1"]
+    assert list(counts.items()) == [("ATG", ["M", 100001, 66.666]), ("CCC", ["P", 1, 0.001]),
+                                    ("TAA", ["*", 50000, 33.333])]
+    out, err = capsys.readouterr()
+    assert err == "Warning: Codon 'PPP' is invalid. Codon will be skipped.\n"
+
+
 # ######################  '-cr', '--count_residues' ###################### #
 def test_count_residues_unambig_dna(sb_resources):
     tester = Sb.SeqBuddy(">seq1\nACGCGAAGCGAACGCGCAGACGACGCGACGACGACGACGCA", in_format="fasta")
@@ -706,6 +826,10 @@ def test_delete_records2(sb_resources, hf):
     tester = Sb.delete_records(sb_resources.get_one("d f"), 'α1|α2')
     assert hf.buddy2hash(tester) == "eca4f181dae3d7998464ff71e277128f"
 
+    tester = Sb.delete_records(sb_resources.get_one("d f"), ['Mle-Panxα1', 'Mle-Panxα2', 'α3'], exact=True)
+    assert len(tester) == 11
+    assert 'Mle-Panxα3' in [rec.id for rec in tester.records]
+
     with pytest.raises(ValueError) as e:
         Sb.delete_records(sb_resources.get_one("d f"), dict)
     assert "'patterns' must be a list or a string." in str(e.value)
@@ -718,6 +842,10 @@ def test_delete_repeats(sb_odd_resources):
     tester = Sb.find_repeats(tester)
     assert len(tester.repeat_ids) == 0
     assert len(tester.repeat_seqs) == 0
+    assert [rec.id for rec in tester.records][-4:] == ["Seq10B", "Seq11", "Seq14", "Seq12"]
+
+    tester = Sb.delete_repeats(Sb.SeqBuddy(sb_odd_resources["duplicate"]), scope="seqs")
+    assert [rec.id for rec in tester.records][-3:] == ["Seq10B", "Seq11", "Seq14"]
 
 
 # ######################  '-ds', '--delete_small' ###################### #
@@ -888,6 +1016,21 @@ def test_extract_regions_fastq(sb_resources, hf):
     assert hf.buddy2hash(tester) == "4258dfc66a07e849ac9c396aa2763c71", print(tester)
 
 
+def test_extract_regions_features():
+    rec = SeqRecord(Seq("ACGTACGTACGTACGTACGT", alphabet=IUPAC.ambiguous_dna), id="Seq1",
+                    features=[SeqFeature(FeatureLocation(2, 8, strand=1), type="gene"),
+                              SeqFeature(CompoundLocation([FeatureLocation(0, 3), FeatureLocation(12, 16)]),
+                                         type="CDS"),
+                              SeqFeature(FeatureLocation(16, 20), type="misc")])
+    seqbuddy = Sb.SeqBuddy([rec])
+    tester = Sb.extract_regions(seqbuddy, "5:14")
+    assert str(tester.records[0].seq) == "ACGTACGTAC"
+    assert [(feat.type, str(feat.location)) for feat in tester.records[0].features] == \
+        [("gene", "[0:4](+)"), ("CDS", "[8:10]")]
+    # The original record is left as it was
+    assert [str(feat.location) for feat in rec.features] == ["[2:8](+)", "join{[0:3], [12:16]}", "[16:20]"]
+
+
 def test_extract_regions_edges(sb_resources):
     with pytest.raises(ValueError) as err:
         Sb.extract_regions(sb_resources.get_one("p g"), "foo")
@@ -900,6 +1043,26 @@ def test_find_cpg(sb_resources, hf):
     tester = Sb.find_cpg(tester)
     assert hf.buddy2hash(tester) == "9499f524da0c35a60502031e94864928"
 
+    # Scanning in small chunks gives the same islands
+    tester = Sb.find_cpg(sb_resources.get_one("d g"), chunk_size=50)
+    assert hf.buddy2hash(tester) == "9499f524da0c35a60502031e94864928"
+
+    tester = Sb.find_cpg(sb_resources.get_one("d g"), window_size=100, cg_threshold=0.55, oe_threshold=0.7)
+    assert tester.records[9].buddy_data["cpgs"] == [(873, 1077)]
+
+    # Positions sitting exactly on both thresholds (CG fraction 0.5, obs/exp 4.0) are part of an island
+    tester = Sb.find_cpg(Sb.SeqBuddy(">seq1\nCGAA\n", in_format="fasta"), window_size=4, oe_threshold=4.0)
+    assert tester.records[0].buddy_data["cpgs"] == [(0, 1)]
+    tester = Sb.find_cpg(Sb.SeqBuddy(">seq1\nCGAA\n", in_format="fasta"), window_size=4, oe_threshold=4.01)
+    assert tester.records[0].buddy_data["cpgs"] is None
+    tester = Sb.find_cpg(Sb.SeqBuddy(">seq1\nCGAA\n", in_format="fasta"), window_size=4, cg_threshold=0.51,
+                         oe_threshold=4.0)
+    assert tester.records[0].buddy_data["cpgs"] is None
+
+    with pytest.raises(ValueError) as err:
+        Sb.find_cpg(sb_resources.get_one("d g"), window_size=0)
+    assert "must be positive integers" in str(err)
+
 
 # #####################  '-orf', '--find_orf' ###################### ##
 def test_find_orf(sb_resources, hf):
@@ -915,6 +1078,7 @@ def test_find_orf(sb_resources, hf):
 
     tester = Sb.find_orfs(sb_resources.get_one("d g"), include_feature=False)
     assert hf.buddy2hash(tester) == "908744b00d9f3392a64b4b18f0db9fee"
+    assert tester.records[0].buddy_data["find_orfs"]["-"][:3] == [(1001, 1139), (731, 977), (566, 644)]
 
     tester = Sb.find_orfs(sb_resources.get_one("r f"))
     assert hf.buddy2hash(tester) == "d2db9b02485e80323c487c1dd6f1425b"
@@ -951,6 +1115,11 @@ def test_find_pattern(sb_resources, hf):
     tester = Sb.find_pattern(sb_resources.get_one("r f"), "AUGGN{6}", ambig=True)
     assert hf.buddy2hash(tester) == "b7abcb4334232e38dfbac9f46234501a"
 
+    # Patterns that can't be lowercased safely are searched case-insensitively instead, with the same result
+    tester = Sb.find_pattern(sb_resources.get_one("d f"), "atgg[gt]", "(?i)ATGG[GT]", "ATGG[G-T]")
+    indices = tester.records[0].buddy_data["find_patterns"]
+    assert indices["atgg[gt]"] == indices["(?i)ATGG[GT]"] == indices["ATGG[G-T]"] == [111, 386, 468, 642, 810]
+
 
 # #####################  '-frp', '--find_repeats' ###################### ##
 def test_find_repeats(sb_odd_resources):
@@ -963,6 +1132,12 @@ def test_find_repeats(sb_odd_resources):
     for key in tester.repeat_seqs:
         assert 'Seq12' in tester.repeat_seqs[key] or 'Seq10A' in tester.repeat_seqs[key]
 
+    assert list(tester.repeat_seqs.values()) == [["Seq10B", "Seq10A"], ["Seq14", "Seq13", "Seq12", "Seq12"],
+                                                 ["Seq12", "Seq12"]]
+    assert "8d84f77411c3942dfac9fa4769aecbb0" in tester.repeat_seqs
+    assert len(tester.repeat_ids["Seq12"]) == 5
+    assert "Seq10A" not in tester.unique_seqs
+
 
 # ######################  '-frs', '--find_restriction_sites' ###################### #
 def test_restriction_sites_no_args(sb_resources, hf):
@@ -1014,6 +1189,18 @@ def test_restriction_sites_limit_cuts(capsys, sb_resources, hf):
     assert "Warning: No-cutters not supported." in err
 
 
+def test_restriction_sites_table_only(sb_resources, hf):
+    # include_feature=False should populate restriction_sites without touching the records
+    with_features = Sb.find_restriction_sites(sb_resources.get_one("d g"), min_cuts=2, max_cuts=4,
+                                              enzyme_group=["EcoRI", "KspI", "TasI", "Bme1390I"])
+    tester = sb_resources.get_one("d g")
+    before = hf.buddy2hash(tester)
+    Sb.find_restriction_sites(tester, min_cuts=2, max_cuts=4, include_feature=False,
+                              enzyme_group=["EcoRI", "KspI", "TasI", "Bme1390I"])
+    assert hf.buddy2hash(tester) == before
+    assert str(tester.restriction_sites) == str(with_features.restriction_sites)
+
+
 # ######################  '-hsi', '--hash_sequence_ids' ###################### #
 def test_hash_seq_ids(sb_resources):
     tester = sb_resources.get_one("d f")
@@ -1396,6 +1583,21 @@ def test_order_ids_randomly2(sb_resources, hf):
     assert hf.buddy2hash(tester) == "bb75e7fc15f131e31271ea5006241615", print(tester)
 
 
+# #####################  'pairwise_identity' ###################### ##
+def test_pairwise_identity(sb_resources, hf):
+    tester = Sb.pull_recs(sb_resources.get_one("p f"), "α1[02]")
+    result = Sb.pairwise_identity(tester)
+    assert hf.string2hash(str(result)) == "1b49769b56411f34b887ca24145fc3d3", print(result)
+    assert result["Mle-Panxα10A"]["Mle-Panxα10B"] == [100.0, 235, 3.1e-137, 470.7]
+
+    # Nothing gets through a prefilter that demands more shared k-mers than there are
+    result = Sb.pairwise_identity(tester, min_hits=1000)
+    assert result["Mle-Panxα10A"]["Mle-Panxα10B"] == [0.0, 0, 0.0, 0.0]
+
+    tester = Sb.pull_recs(sb_resources.get_one("p f"), "α10A")
+    assert Sb.pairwise_identity(tester) == OrderedDict()
+
+
 # #####################  '-psc', '--prosite_scan' ###################### ##
 def test_prosite_scan_init(sb_resources):
     seqbuddy = sb_resources.get_one("d f")
@@ -1467,27 +1669,22 @@ def test_prosite_scan_mc_run_prosite(sb_resources, hf, monkeypatch):
 
     monkeypatch.setattr(Sb.PrositeScan, "_rest_request", mock_rest_request)
     monkeypatch.setattr(Sb.time, "sleep", lambda _: True)
-    out_file = br.TempFile()
     seqbuddy = sb_resources.get_one("d f")
     Sb.pull_recs(seqbuddy, "Mle-Panxα10B")
     ps_scan = Sb.PrositeScan(seqbuddy)
-    ps_scan._mc_run_prosite(seqbuddy.records[0], [out_file.path, Sb.Lock()])
-    with open(out_file.path, "r", encoding="utf-8") as ifile:
-        output = ifile.read()
+    output = ps_scan._mc_run_prosite(seqbuddy.records[0])
     assert hf.string2hash(output) == "e76ec3879d9366a1d19e1f9e88edb4d9", print(output)
 
 
 def test_prosite_scan_run(sb_resources, hf, monkeypatch):
-    def mock_mc_run_prosite(self, _rec, args):
+    def mock_mc_run_prosite(self, _rec):
         print(self)
-        out_file_path, lock = args
         temp_seq = Sb.SeqBuddy([_rec], out_format="gb")
         Sb.annotate(temp_seq, "Foo", "1-100")
-        with lock:
-            with open(out_file_path, "a") as out_file:
-                out_file.write("%s\n" % str(temp_seq))
+        return "%s\n" % str(temp_seq)
 
     monkeypatch.setattr(Sb.PrositeScan, "_mc_run_prosite", mock_mc_run_prosite)
+    monkeypatch.setattr(Sb.PrositeScan, "_rest_request", lambda *_: True)
     seqbuddy = sb_resources.get_one("d g")
     Sb.delete_features(seqbuddy, "splice")
     ps_scan = Sb.PrositeScan(seqbuddy)
@@ -1550,6 +1747,10 @@ def test_pull_recs2(sb_resources, hf):
     tester = Sb.pull_recs(sb_resources.get_one("p g"), 'ML2', description=True)
     assert hf.buddy2hash(tester) == "f879d0a65b73cce2a4ab26c5ffe9f35a"
 
+    tester = Sb.pull_recs(sb_resources.get_one("d f"), ['Mle-Panxα2', 'Mle-Panxα1', 'Mle-Panxα'], exact=True)
+    assert [rec.id for rec in tester.records] == ['Mle-Panxα1', 'Mle-Panxα2']
+
+
 # ######################  '-pr', '--pull_records_with_feature' ###################### #
 hashes = [('p g', '83d15851d489e89761c8faa31e5263f2'), ('d g', '36757409966ede91ab19deb56045d584')]
 
@@ -1574,6 +1775,16 @@ def test_purge(sb_resources, hf, monkeypatch):
     Sb.purge(tester, 200)
     assert hf.buddy2hash(tester) == '256681ed87c67f8f3a8c5771572767f1'
 
+    tester = sb_resources.get_one("p f")
+    Sb.pull_recs(tester, "α1[02]")
+    Sb.purge(tester, 200, backend="python")
+    assert hf.buddy2hash(tester) == '256681ed87c67f8f3a8c5771572767f1'
+    assert tester.records[0].buddy_data["purge_set"] == ["Mle-Panxα10B", "Mle-Panxα12"]
+
+    with pytest.raises(ValueError) as err:
+        Sb.purge(tester, 200, backend="foo")
+    assert "The purge backend must be either 'blast' or 'python'" in str(err)
+
 
 # ######################  '-ri', '--rename_ids' ###################### #
 hashes = [('d f', '8b4a9e3d3bb58cf8530ee18b9df67ff1'), ('d g', '78c73f97117bd937fd5cf52f4bd6c26e'),
@@ -1617,6 +1828,34 @@ def test_rename_ids2(sb_resources, hf):
     assert "There are more replacement match" in str(e)
 
 
+def test_bulk_rename(sb_resources):
+    mapping = {"Mle-Panxα%s" % i: "Panx%s" % i for i in range(1, 13)}
+    mapping["Mle-Panxα1"] = "Panx_one"
+    tester = Sb.bulk_rename(sb_resources.get_one("d f"), mapping)
+    assert [rec.id for rec in tester.records][:4] == ["Panx9", "Mle-Panxα7A", "Panx_one", "Panx3"]
+    assert tester.records[2].description == "cDNA - ML078817."
+    assert str(tester).count(">Panx") == 10
+    assert tester.records[2].name == "Panx_one"
+
+    tester = Sb.bulk_rename(sb_resources.get_one("d f"), {"Mle-Panxα1": "Panx1", "ML078817": "X"},
+                            store_old_id=True, descriptions=True)
+    assert tester.records[2].id == "Panx1"
+    assert tester.records[2].description == "Mle-Panxα1 cDNA - X."
+    assert tester.records[9].id == "Mle-Panxα10B"
+
+    tmp_file = br.TempFile()
+    tmp_file.write("Mle-Panxα1\tPanx_one\nMle-Panxα10\tPanx_ten\n")
+    tester = Sb.bulk_rename(sb_resources.get_one("d f"), tmp_file.path)
+    assert [rec.id for rec in tester.records][2] == "Panx_one"
+    assert [rec.id for rec in tester.records][9] == "Mle-Panxα10B"
+
+    # Replace within the IDs
+    tester = Sb.bulk_rename(sb_resources.get_one("d f"), mapping, substrings=True)
+    assert [rec.id for rec in tester.records][:4] == ["Panx9", "Panx7A", "Panx_one", "Panx3"]
+    assert str(tester).count(">Panx") == 13
+    assert tester.records[9].id == "Panx10B"
+
+
 # ##################### '-rs', 'replace_subseq' ###################### ##
 def test_replace_subsequence(sb_resources, hf):
     tester = sb_resources.get_one("d f")
@@ -1793,6 +2032,25 @@ def test_translate_edges_and_exceptions(capsys, sb_resources, hf):
     assert hf.string2hash(err) == "9e2a0b4b03f54c209d3a9111792762df"
 
 
+def test_translate_genetic_codes():
+    tester = Sb.SeqBuddy("ATGAGATGAATATTTAA", in_format="raw")
+    assert str(Sb.translate_cds(Sb.make_copy(tester), quiet=True)) == ">raw_input\nMR*IF\n"
+    assert str(Sb.translate_cds(Sb.make_copy(tester), quiet=True, table=2)) == ">raw_input\nM*WMF\n"
+    assert str(Sb.translate_cds(Sb.make_copy(tester), quiet=True, table="Vertebrate Mitochondrial")) == \
+        ">raw_input\nM*WMF\n"
+
+    tester = Sb.translate6frames(Sb.make_copy(tester), table=2)
+    assert [str(rec.seq) for rec in tester.records] == ["M*WMF", "WDEYL", "EMNI*", "LNIHL", "*MFIS", "KYSSH"]
+
+    with pytest.raises(ValueError) as err:
+        Sb.translate_cds(Sb.SeqBuddy("ATGAGATGA", in_format="raw"), table=99)
+    assert "Unknown genetic code table '99'" in str(err)
+
+    with pytest.raises(ValueError) as err:
+        Sb.translate6frames(Sb.SeqBuddy("ATGAGATGA", in_format="raw"), table="Foo")
+    assert "Unknown genetic code table 'Foo'" in str(err)
+
+
 # ######################  '-tmd', '--transmembrane_domains' ###################### #
 def test_transmembrane_domains_pep(sb_resources, hf, monkeypatch, capsys):
     def mock_runtimeerror(*args, **kwargs):
@@ -1903,7 +2161,7 @@ def test_transmembrane_domains_pep(sb_resources, hf, monkeypatch, capsys):
     _root, dirs, files = next(br.walklevel(keep_dir.path))
 
     assert sorted(dirs) == ['rst_MFhyxO', 'rst_lE27A5']
-    assert sorted(files) == sorted(['seqs.tmp', os.path.split(work_dir.path)[-1]])
+    assert sorted(files) == [os.path.split(work_dir.path)[-1]]
 
     with pytest.raises(FileNotFoundError) as err:
         Sb.transmembrane_domains(tester, job_ids=["rst_BLAHHH!!"])
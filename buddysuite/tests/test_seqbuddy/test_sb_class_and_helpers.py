@@ -2,8 +2,10 @@
 # coding=utf-8
 """ tests basic functionality of SeqBuddy class """
 import pytest
+import numpy as np
 from Bio.Alphabet import IUPAC
 from collections import OrderedDict
+from io import StringIO
 import os
 import buddy_resources as br
 import SeqBuddy as Sb
@@ -130,6 +132,30 @@ def test_write(sb_resources, hf):
         assert hf.string2hash(data) == "6a9b3b554aa9ddb90ea62967bd26d5b7"
 
 
+def test_write_to(sb_resources, hf):
+    for key in ["d f", "d g", "d e", "d q", "p s"]:
+        tester = sb_resources.get_one(key)
+        handle = StringIO()
+        tester.write_to(handle)
+        assert handle.getvalue() == str(tester)
+
+    tester = sb_resources.get_one("d g")
+    handle = StringIO()
+    tester.write_to(handle, out_format="fasta")
+    assert hf.string2hash(handle.getvalue()) == "6a9b3b554aa9ddb90ea62967bd26d5b7"
+    assert tester.out_format == "gb"
+
+    tester.out_format = "raw"
+    handle = StringIO()
+    tester.write_to(handle)
+    assert hf.string2hash(handle.getvalue()) == "5d00d481e586e287f32d2d29916374ca"
+
+    tester.records = []
+    handle = StringIO()
+    tester.write_to(handle)
+    assert handle.getvalue() == "Error: No sequences in object.\n"
+
+
 def test_print_hashmap(sb_resources, hf):
     tester = sb_resources.get_one("d f")
     Sb.hash_ids(tester)
@@ -149,8 +175,77 @@ def test_reverse_hashmap(sb_resources):
     assert tester_str == str(tester)
 
 
+# ##################### SeqBuddyStream ###################### ##
+def test_stream_matches_seqbuddy(sb_resources, hf):
+    for code in ["d f", "d g", "d e", "d q", "p f", "p g"]:
+        tester = Sb.SeqBuddy.stream(sb_resources.get_one(code, mode="paths"), chunk_size=3)
+        temp_file = br.TempFile()
+        tester.write(temp_file.path)
+        assert hf.string2hash(temp_file.read()) == hf.buddy2hash(sb_resources.get_one(code))
+
+
+def test_stream_pipeline(sb_resources, hf):
+    tester = Sb.SeqBuddy.stream(sb_resources.get_one("d g", mode="paths"), chunk_size=2)
+    tester.pipe(Sb.clean_seq).pipe(Sb.translate_cds, quiet=True).pipe(Sb.delete_small, 350)
+    assert tester.alpha == IUPAC.ambiguous_dna
+    temp_file = br.TempFile()
+    tester.write_to(temp_file.get_handle("w"))
+    temp_file.close()
+
+    seqbuddy = Sb.delete_small(Sb.translate_cds(Sb.clean_seq(sb_resources.get_one("d g")), quiet=True), 350)
+    assert hf.string2hash(temp_file.read()) == hf.buddy2hash(seqbuddy)
+
+
+def test_stream_delete_repeats(sb_odd_resources):
+    tester = Sb.SeqBuddy.stream(sb_odd_resources["duplicate"], chunk_size=3).delete_repeats()
+    assert [rec.id for rec in tester][-4:] == ["Seq10A", "Seq11", "Seq12", "Seq13"]
+    assert tester.repeat_ids == ["Seq12"] * 4
+    assert tester.repeat_seqs == ["Seq10B", "Seq14"]
+
+    # Running the stream again starts from a clean slate
+    assert len([rec for rec in tester]) == 13
+
+    tester = Sb.SeqBuddy.stream(sb_odd_resources["duplicate"]).delete_repeats("seqs")
+    assert len([rec for rec in tester]) == 14
+    assert tester.repeat_seqs == ["Seq10B", "Seq12", "Seq12", "Seq13", "Seq14"]
+
+    with pytest.raises(ValueError):
+        tester.delete_repeats("foo")
+
+
+def test_stream_handle(sb_resources, hf):
+    with open(sb_resources.get_one("d f", mode="paths"), "r", encoding="utf-8") as ifile:
+        tester = Sb.SeqBuddyStream(ifile, out_format="raw")
+        records = [rec.id for rec in tester]
+    assert records == [rec.id for rec in sb_resources.get_one("d f").records]
+    with pytest.raises(IOError) as err:
+        next(iter(tester))
+    assert "already been consumed" in str(err)
+
+
+def test_stream_errors(sb_resources, sb_odd_resources):
+    with pytest.raises(TypeError) as err:
+        Sb.SeqBuddyStream(sb_resources.get_one("d n", mode="paths"), in_format="nexus")
+    assert "Format 'nexus' cannot be streamed" in str(err)
+
+    with pytest.raises(br.GuessError) as err:
+        Sb.SeqBuddyStream(sb_resources.get_one("d n", mode="paths"))
+    assert "Could not determine a streamable format" in str(err)
+
+    with pytest.raises(FileNotFoundError):
+        Sb.SeqBuddyStream("/foo/bar/baz.fa")
+
+    with pytest.raises(ValueError):
+        Sb.SeqBuddyStream(sb_resources.get_one("d f", mode="paths"), chunk_size=0)
+
+    tester = Sb.SeqBuddyStream(sb_resources.get_one("d f", mode="paths"), out_format="phylip")
+    with pytest.raises(TypeError) as err:
+        tester.write_to(br.TempFile().get_handle())
+    assert "Format 'phylip' cannot be streamed" in str(err)
+
+
 # ################################################# HELPER FUNCTIONS ################################################# #
-# ToDo: Missing tests for --> _add_buddy_data, FeatureReMapper
+# ToDo: Missing tests for --> _add_buddy_data
 # ######################  '_check_for_blast_bin' ###################### #
 def test_check_blast_bin(monkeypatch, capsys):
     monkeypatch.setattr(Sb, "which", lambda *_: True)
@@ -286,8 +381,61 @@ def test_no__input():
         Sb.SeqBuddy()
 
 
+# ######################  '_banded_align' ###################### #
+def test_banded_align():
+    scoring = Sb._pairwise_scoring(protein=False)
+
+    def encode(seq):
+        return scoring["lookup"][np.frombuffer(seq.encode(), dtype=np.uint8)]
+
+    seq1 = "ACGTACGTTGCAAGCTTGCA"
+    seq2 = "ACGTACGTTGCAGGGAGCTTGCA"  # 3 residue insertion
+    seq3 = "ACGTACGTTTCAAGCTTGCA"  # Single mismatch
+    scores, identities, lengths = Sb._banded_align([encode(seq1)] * 3, [encode(seq1), encode(seq2), encode(seq3)],
+                                                   [0, 0, 0], 4, scoring, block_size=7)
+    assert scores.tolist() == [40, 29, 35]
+    assert identities.tolist() == [20, 20, 19]
+    assert lengths.tolist() == [20, 23, 20]
+
+    # Gaps in the other sequence, and a band that is too narrow to reach the second half of the alignment
+    assert [x.tolist() for x in Sb._banded_align([encode(seq2)], [encode(seq1)], [0], 4, scoring)] == [[29], [20], [23]]
+    assert [x.tolist() for x in Sb._banded_align([encode(seq2)], [encode(seq1)], [0], 1, scoring)] == [[24], [12], [12]]
+
+    # Pairs with different query sequences in the same batch
+    scores = Sb._banded_align([encode(seq1), encode(seq2), encode(seq3[5:])],
+                              [encode(seq3), encode(seq1), encode(seq3)], [0, 0, 5], 4, scoring)[0]
+    assert scores.tolist() == [35, 29, 30]
+
+
+def test_kmer_diagonal():
+    scoring = Sb._pairwise_scoring(protein=True)
+    seq1 = b"MSTAVLENPGLGRKLSDFGQETSYIEDNCNQNGAISLIFSLKEEVGALAKVLRLFEENDINLTHIESRPSR"
+    seq1 = scoring["lookup"][np.frombuffer(seq1, dtype=np.uint8)]
+    kmers1 = Sb._kmer_index(seq1, 3, 24)
+    kmers2 = Sb._kmer_index(seq1[5:], 3, 24)
+    assert Sb._kmer_diagonal(kmers1, kmers2, 16, 2) == -5
+    assert Sb._kmer_diagonal(kmers2, kmers1, 16, 2) == 5
+    assert Sb._kmer_diagonal(kmers1, Sb._kmer_index(seq1[:4], 3, 24), 16, 3) is None
+    assert len(Sb._kmer_index(seq1[:2], 3, 24)[0]) == 0
+
+
 # ######################  'make_copy' ###################### #
 def test_make_copy(sb_resources, hf):
     tester = Sb.SeqBuddy(sb_resources.get_one("d f", mode="paths"))
     tester_copy = Sb.make_copy(tester)
     assert hf.buddy2hash(tester) == hf.buddy2hash(tester_copy)
+
+
+def test_make_copy_shallow(sb_resources, hf):
+    tester = sb_resources.get_one("d g")
+    tester_hash = hf.buddy2hash(tester)
+    tester_copy = Sb.make_copy(tester, shallow=True)
+    assert hf.buddy2hash(tester_copy) == tester_hash
+    assert tester_copy.records[0] is not tester.records[0]
+    assert tester_copy.records[0].seq is tester.records[0].seq
+
+    # Edits to the copy, including in-place changes to features, don't leak back into the original
+    Sb.select_frame(tester_copy, 2)
+    Sb.delete_records(tester_copy, "α[1-5]")
+    tester_copy.records[0].annotations["organism"] = "Foo"
+    assert hf.buddy2hash(tester) == tester_hash
@@ -195,6 +195,14 @@ def test_back_translate_ui(capsys, sb_resources, hf):
     out, err = capsys.readouterr()
     assert hf.string2hash(out) == "b6bcb4e5104cb202db0ec4c9fc2eaed2"
 
+    # Custom codon usage table, where CTG is the only leucine codon
+    temp_file = br.TempFile()
+    temp_file.write("CTG\t1.0\nTTA\t0.0\nTTG\t0.0\nCTT\t0.0\nCTC\t0.0\nCTA\t0.0\n")
+    test_in_args.back_translate = [["o", temp_file.path]]
+    Sb.command_line_ui(test_in_args, Sb.SeqBuddy(">Seq1\nMLLKL\n", in_format="fasta"), True)
+    out, err = capsys.readouterr()
+    assert "ATGCTGCTGAAACTG" in out
+
     with pytest.raises(TypeError)as err:
         Sb.command_line_ui(test_in_args, sb_resources.get_one('d f'), pass_through=True)
     assert "The input sequence needs to be protein, not nucleotide" in str(err)
@@ -248,6 +256,31 @@ def test_blast_ui(capsys, sb_resources, sb_odd_resources, hf):
            "Ensure the -parse_seqids flag was used with makeblastdb." in str(err)
 
 
+# ######################  '-cdh', '--cd_hit' ###################### #
+def test_cd_hit_ui(capsys, sb_resources, hf):
+    test_in_args = deepcopy(in_args)
+    test_in_args.cd_hit = [["0.5"]]
+    Sb.command_line_ui(test_in_args, sb_resources.get_one("p f"), True)
+    out, err = capsys.readouterr()
+    assert hf.string2hash(out) == "8893354def92d4a570c14782a9c0f52b", print(out)
+    assert "Mle-Panxα10A\nMle-Panxα12, Mle-Panxα9, Mle-Panxα10B\n##########################" in err
+
+    test_in_args.cd_hit = [["0.5", "foo"]]
+    with pytest.raises(ValueError) as err:
+        Sb.command_line_ui(test_in_args, sb_resources.get_one("p f"), pass_through=True)
+    assert "The cd_hit threshold must be a number, and the word size an integer." in str(err)
+
+    test_in_args.cd_hit = [["-1"]]
+    with pytest.raises(ValueError) as err:
+        Sb.command_line_ui(test_in_args, sb_resources.get_one("p f"), pass_through=True)
+    assert "The cd_hit threshold must be between 0 and 1 (or a percentage)." in str(err)
+
+    Sb.command_line_ui(test_in_args, sb_resources.get_one("p f"), True)
+    out, err = capsys.readouterr()
+    assert "ValueError: The cd_hit threshold must be between 0 and 1 (or a percentage)." in err
+    assert "Cluster membership" not in err and not out
+
+
 # ######################  '-cs', '--clean_seq' ###################### #
 def test_clean_seq_ui(capsys, sb_resources, sb_odd_resources, hf):
     test_in_args = deepcopy(in_args)
@@ -414,6 +447,14 @@ def test_delete_records_ui(capsys, sb_resources, hf):
     assert hf.string2hash(out) == "eca4f181dae3d7998464ff71e277128f"
     assert hf.string2hash(err) == "7e0929af515502484feb4b1b2c35eaba"
 
+    with open(temp_file.path, "w", encoding="utf-8") as ofile:
+        ofile.write("Mle-Panxα1\nMle-Panxα2\nMle-Panxα")
+    test_in_args.delete_records = [temp_file.path, "exact", "3"]
+    Sb.command_line_ui(test_in_args, sb_resources.get_one('d f'), True)
+    out, err = capsys.readouterr()
+    assert out.count(">") == 11
+    assert "\nMle-Panxα1\tMle-Panxα2\n" in err
+
 
 # ######################  '-drp', '--delete_repeats' ###################### #
 def test_delete_repeats_ui(capsys, sb_resources, sb_odd_resources, hf):
@@ -496,6 +537,17 @@ def test_find_cpg_ui(capsys, sb_resources, hf):
     out, err = capsys.readouterr()
     assert err == "# No Islands identified\n\n"
 
+    test_in_args.find_CpG = [["100", "0.55", "0.7"]]
+    Sb.command_line_ui(test_in_args, sb_resources.get_one('d g'), True)
+    out, err = capsys.readouterr()
+    assert "Mle-Panxα10B: 873-1077\n" in err
+
+    test_in_args.find_CpG = [["foo"]]
+    with pytest.raises(ValueError) as err:
+        Sb.command_line_ui(test_in_args, sb_resources.get_one('d g'), pass_through=True)
+    assert "window size must be an integer" in str(err)
+    test_in_args.find_CpG = True
+
     with pytest.raises(TypeError) as err:
         Sb.command_line_ui(test_in_args, sb_resources.get_one('p g'), pass_through=True)
     assert "DNA sequence required, not protein or RNA" in str(err)
@@ -583,6 +635,14 @@ def test_find_restriction_sites_ui(capsys, sb_resources, hf):
         Sb.command_line_ui(test_in_args, sb_resources.get_one('p g'), pass_through=True)
     assert "Unable to identify restriction sites in protein sequences." in str(err)
 
+    # Only output the table
+    test_in_args.find_restriction_sites = [["EcoRI", "KspI", "TasI", 2, 4, "table"]]
+    Sb.command_line_ui(test_in_args, sb_resources.get_one('d g'), True)
+    out, err = capsys.readouterr()
+    assert out.startswith("# ### Restriction Sites (indexed at cut-site) ### #")
+    assert "LOCUS" not in out
+    assert not err
+
 
 # ######################  '-gbp', '--group_by_prefix' ###################### #
 def test_group_by_prefix_ui(capsys, sb_odd_resources):
@@ -1103,6 +1163,15 @@ def test_pull_records_ui(capsys, sb_resources, hf):
     out, err = capsys.readouterr()
     assert hf.string2hash(out) == "cd8d7284f039233e090c16e8aa6b5035"
 
+    # Exact IDs (the partial match 'Mle-Panxα' and the bad regex are ignored rather than searched)
+    with open(temp_file.path, "w", encoding="utf-8") as ofile:
+        ofile.write("Mle-Panxα1\nMle-Panxα2\nMle-Panxα\n[bad")
+    test_in_args.pull_records = [temp_file.path, "exact"]
+    Sb.command_line_ui(test_in_args, sb_resources.get_one('d f'), True)
+    out, err = capsys.readouterr()
+    assert out.count(">") == 2 and ">Mle-Panxα1 " in out and ">Mle-Panxα2 " in out
+    assert not err
+
 
 # ######################  '-prf', '--pull_records_with_feature' ###################### #
 def test_pull_records_with_feature_ui(capsys, sb_resources, hf):
@@ -1135,6 +1204,18 @@ def test_purge_ui(capsys, sb_resources, hf):
     assert hf.string2hash(err) == "fbfde496ae179f83e3d096da15d90920", print(err)
 
 
+def test_purge_ui_python_backend(capsys, sb_resources, hf, monkeypatch):
+    monkeypatch.setattr(Sb, "which", lambda *_: None)
+    test_in_args = deepcopy(in_args)
+    test_in_args.purge = 200
+    Sb.command_line_ui(test_in_args, Sb.pull_recs(sb_resources.get_one('p f'), "α1[02]"), True)
+    out, err = capsys.readouterr()
+    assert "blastp binary not found. Please install BLAST+ executables." in err
+    assert "BLAST+ not found, so scores are from the built-in pairwise aligner." in err
+    assert "Mle-Panxα10A\nMle-Panxα10B, Mle-Panxα12\n" in err
+    assert hf.string2hash(out) == "256681ed87c67f8f3a8c5771572767f1", print(out)
+
+
 # ######################  '-ri', '--rename_ids' ###################### #
 def test_rename_ids_ui(capsys, sb_resources, hf):
     test_in_args = deepcopy(in_args)
@@ -1173,6 +1254,19 @@ def test_rename_ids_ui(capsys, sb_resources, hf):
     out, err = capsys.readouterr()
     assert hf.string2hash(out) == "7e14a33700db6a32b1a99f0f9fd76f53"
 
+    temp_file = br.TempFile()
+    temp_file.write("Mle-Panxα1\tPanx_one\nMle-Panxα10\tPanx_ten\n")
+    test_in_args.rename_ids = [[temp_file.path, "store"]]
+    Sb.command_line_ui(test_in_args, sb_resources.get_one('d f'), True)
+    out, err = capsys.readouterr()
+    assert ">Panx_one Mle-Panxα1 cDNA" in out and ">Mle-Panxα10B " in out and "Panx_ten" not in out
+
+    temp_file.write("Mle-Panxα1\n", mode="w")
+    test_in_args.rename_ids = [[temp_file.path]]
+    with pytest.raises(ValueError) as err:
+        Sb.command_line_ui(test_in_args, sb_resources.get_one('d f'), pass_through=True)
+    assert "as a rename table" in str(err)
+
 
 # ######################  '-rs', '--replace_subseq' ###################### #
 def test_replace_subseq_ui(capsys, sb_resources, hf):
@@ -1258,6 +1352,56 @@ def test_screw_formats_ui2(sb_resources):
     assert os.path.isfile("%s/seq.gb" % TEMP_DIR.path)
 
 
+# ######################  '-s', '--stream' ###################### #
+def test_stream_ui(capsys, sb_resources, sb_odd_resources, hf):
+    test_in_args = deepcopy(in_args)
+    test_in_args.clean_seq = [["strict"]]
+    test_in_args.uppercase = True
+    tester = Sb.SeqBuddyStream(sb_resources.get_one("d g", mode="paths"), chunk_size=4)
+    Sb.command_line_ui(test_in_args, tester, True)
+    out, err = capsys.readouterr()
+    seqbuddy = Sb.uppercase(Sb.clean_seq(sb_resources.get_one("d g"), ambiguous=False))
+    assert hf.string2hash(out) == hf.buddy2hash(seqbuddy)
+
+    test_in_args = deepcopy(in_args)
+    test_in_args.screw_formats = "fasta"
+    Sb.command_line_ui(test_in_args, Sb.SeqBuddyStream(sb_resources.get_one("d g", mode="paths")), True)
+    out, err = capsys.readouterr()
+    assert hf.string2hash(out) == "6a9b3b554aa9ddb90ea62967bd26d5b7"
+
+    test_in_args = deepcopy(in_args)
+    test_in_args.num_seqs = True
+    with pytest.raises(AttributeError) as err:
+        Sb.command_line_ui(test_in_args, Sb.SeqBuddyStream(sb_resources.get_one("d f", mode="paths")),
+                           pass_through=True)
+    assert "'num_seqs' cannot be run in --stream mode" in str(err)
+
+    test_in_args = deepcopy(in_args)
+    test_in_args.delete_repeats = [[2, "seq"]]
+    Sb.command_line_ui(test_in_args, Sb.SeqBuddyStream(sb_odd_resources["duplicate"], chunk_size=4), True)
+    out, err = capsys.readouterr()
+    assert out.count(">") == 14
+    assert "# Records with duplicate sequence deleted\nSeq10B\tSeq12\nSeq12\tSeq13\nSeq14\n" in err
+
+    Sb.command_line_ui(test_in_args, Sb.SeqBuddyStream(sb_resources.get_one("d f", mode="paths")), True)
+    out, err = capsys.readouterr()
+    assert err == "No duplicate records found\n"
+
+    test_in_args = deepcopy(in_args)
+    test_in_args.translate = True
+    Sb.command_line_ui(test_in_args, Sb.SeqBuddyStream(sb_resources.get_one("p f", mode="paths")), True)
+    out, err = capsys.readouterr()
+    assert "Nucleic acid sequence required, not protein." in err
+
+    temp_file = br.TempFile()
+    temp_file.write("Mle-Panxα1\tPanx_one\n")
+    test_in_args = deepcopy(in_args)
+    test_in_args.rename_ids = [[temp_file.path]]
+    Sb.command_line_ui(test_in_args, Sb.SeqBuddyStream(sb_resources.get_one("d f", mode="paths"), chunk_size=4), True)
+    out, err = capsys.readouterr()
+    assert out == str(Sb.bulk_rename(sb_resources.get_one("d f"), {"Mle-Panxα1": "Panx_one"}))
+
+
 # ######################  '-sfr', '--select_frame' ###################### #
 def test_select_frame_ui(capsys, sb_resources, hf):
     test_in_args = deepcopy(in_args)
@@ -1333,6 +1477,16 @@ def test_translate_ui(capsys, sb_resources, sb_odd_resources, hf):
         Sb.command_line_ui(test_in_args, sb_resources.get_one('p f'), pass_through=True)
     assert "Nucleic acid sequence required, not protein." in str(err)
 
+    test_in_args.translate = ["2"]
+    Sb.command_line_ui(test_in_args, Sb.SeqBuddy("ATGAGATGAATATTTAA", in_format="raw"), True)
+    out, err = capsys.readouterr()
+    assert out == ">raw_input\nM*WMF\n"
+
+    test_in_args.translate = ["Foo"]
+    Sb.command_line_ui(test_in_args, Sb.SeqBuddy("ATGAGATGAATATTTAA", in_format="raw"), True)
+    out, err = capsys.readouterr()
+    assert err == "ValueError: Unknown genetic code table 'Foo'\n"
+
 
 # ######################  '-tr6', '--translate6frames' ###################### #
 def test_translate6frames_ui(capsys, sb_resources, sb_odd_resources, hf):
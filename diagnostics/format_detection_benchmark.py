@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Time format detection in SeqBuddy and AlignBuddy across file sizes and formats.
+
+Each reference file is converted into every format, scaled up by repeating the records, and then run through the
+sniff-based guess_format() functions and through a plain trial-parse loop (one BioPython parser after another,
+which is how detection used to work).
+"""
+import sys
+import argparse
+import timeit
+from io import StringIO
+from Bio import SeqIO, AlignIO
+from Bio.Nexus.Nexus import NexusError
+from Bio.Nexus.Trees import TreeError
+from xml.sax._exceptions import SAXParseException
+import buddysuite.SeqBuddy as Sb
+import buddysuite.AlignBuddy as Alb
+import buddysuite.buddy_resources as br
+
+SB_FORMATS = ["stockholm", "fasta", "gb", "phylipss", "phylipsr", "phylip", "phylip-relaxed",
+              "fastq", "embl", "nexus", "seqxml", "clustal", "swiss"]
+ALB_FORMATS = ["gb", "phylipss", "phylipsr", "phylip", "phylip-relaxed", "stockholm", "fasta", "nexus", "clustal"]
+
+
+def rewound(func, handle, *args, **kwargs):
+    handle.seek(0)
+    return func(handle, *args, **kwargs)
+
+
+def trial_parse(handle, possible_formats, alignment=False):
+    for next_format in possible_formats:
+        try:
+            handle.seek(0)
+            if next_format in ["phylip", "phylipsr", "phylipss"]:
+                if br.phylip_guess(next_format, handle):
+                    return next_format
+                continue
+            if alignment and list(AlignIO.parse(handle, next_format)):
+                return next_format
+            elif not alignment and next(SeqIO.parse(handle, next_format)):
+                return next_format
+        except (StopIteration, ValueError, AssertionError, SAXParseException, TreeError, NexusError, br.PhylipError):
+            continue
+    return None
+
+
+def scale(seqbuddy, copies):
+    scaled = Sb.make_copy(seqbuddy)
+    scaled.records = []
+    for indx in range(copies):
+        for rec in seqbuddy.records:
+            rec = rec[:]
+            rec.id = "%s_%s" % (rec.id, indx)
+            scaled.records.append(rec)
+    return scaled
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog="formatDetectionBenchmark", description="Time format detection",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument("sequences", help="Unaligned sequence file (e.g., All_pannexins_nuc.gb)")
+    parser.add_argument("-a", "--alignment", action="store", help="Alignment file to benchmark AlignBuddy with")
+    parser.add_argument("-s", "--scales", nargs="+", type=int, default=[1, 4, 16],
+                        help="Number of copies of the input records in each test file")
+    parser.add_argument("-f", "--formats", nargs="+", default=["fasta", "gb", "embl", "seqxml", "fastq"],
+                        help="Formats to benchmark SeqBuddy with")
+    parser.add_argument("-i", "--iterations", action='store', type=int, default=3,
+                        help="Specify number of timeit replicates")
+    in_args = parser.parse_args()
+
+    seqbuddy = Sb.SeqBuddy(in_args.sequences)
+    sys.stdout.write("%-15s %-8s %10s %10s %10s %s\n" % ("format", "copies", "size(KB)", "sniff(s)", "trial(s)",
+                                                         "guess"))
+    for copies in in_args.scales:
+        scaled = scale(seqbuddy, copies)
+        for out_format in in_args.formats:
+            if out_format == "fastq":
+                for rec in scaled.records:
+                    rec.letter_annotations["phred_quality"] = [40] * len(rec)
+            scaled.out_format = out_format
+            contents = str(scaled)
+            handle = StringIO(contents)
+            sniff = timeit.timeit(lambda: rewound(Sb._guess_format, handle), number=in_args.iterations)
+            trial = timeit.timeit(lambda: rewound(trial_parse, handle, SB_FORMATS), number=in_args.iterations)
+            sys.stdout.write("%-15s %-8s %10s %10.4f %10.4f %s\n" % (out_format, copies, round(len(contents) / 1024),
+                                                                     sniff / in_args.iterations,
+                                                                     trial / in_args.iterations,
+                                                                     rewound(Sb._guess_format, handle)))
+
+    if in_args.alignment:
+        alignbuddy = Alb.AlignBuddy(in_args.alignment)
+        for out_format in ["fasta", "gb", "phylip-relaxed", "phylipsr", "stockholm", "nexus", "clustal"]:
+            alignbuddy.set_format(out_format)
+            contents = str(alignbuddy)
+            handle = StringIO(contents)
+            sniff = timeit.timeit(lambda: rewound(Alb.guess_format, handle), number=in_args.iterations)
+            trial = timeit.timeit(lambda: rewound(trial_parse, handle, ALB_FORMATS, alignment=True),
+                                  number=in_args.iterations)
+            sys.stdout.write("%-15s %-8s %10s %10.4f %10.4f %s\n" % (out_format, "aln", round(len(contents) / 1024),
+                                                                     sniff / in_args.iterations,
+                                                                     trial / in_args.iterations,
+                                                                     rewound(Alb.guess_format, handle)))